@@ -0,0 +1,351 @@
+"""
+Benchmarks for the geometry package, the kd-tree, polar conversions, names and shapegraphs.
+
+Each benchmark is timed `--repeat` times, a repeat calls the benchmark
+as often as needed to take at least `--min-time` seconds.  The best
+time per call is reported.  Results can be saved as json, and compared
+with a saved baseline: the exit code is 1 when a benchmark became
+slower than the baseline by more than `--threshold`.
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json
+"""
+from __future__ import division, print_function
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from timeit import default_timer
+
+import numpy as np
+from geometry.base import Point, Line, LineSet, Parallelogram, Parallelepiped, intersectSubspaces
+from geometry import platonic, polar, stream, sampling
+from geometry.mesh import Mesh
+from geometry.graph import Graph
+from geometry.kdtree import KDTree
+from geometry.names import namednumber
+import shapegraphs
+
+
+# list of (name, function) pairs, filled by the @benchmarks decorated generators
+BENCHMARKS = []
+
+
+def benchmarks(gen):
+    """ register the (name, function) pairs yielded by gen """
+    BENCHMARKS.extend(gen())
+    return gen
+
+
+# dimensions used for the platonic classes, classes not listed are 3-d only
+PLATONIC_DIMS = {
+    'Tetraeder': (3, 4, 6),
+    'Cube': (3, 4, 6),
+    'Octaeder': (3, 4, 6),
+    'Cell24': (4,),
+    'Cell120': (4,),
+    'Cell600': (4,),
+}
+
+
+@benchmarks
+def pointBenchmarks():
+    p = Point(1.0, 2.0, 3.0)
+    q = Point(-2.0, 0.5, 4.0)
+    yield "point.add", lambda: p+q
+    yield "point.sub", lambda: p-q
+    yield "point.scale", lambda: p*2.5
+    yield "point.inner", lambda: p.inner(q)
+    yield "point.cross", lambda: p.cross(q)
+    yield "point.distance", lambda: p.distance(q)
+
+
+@benchmarks
+def parallelogramBenchmarks():
+    v = Parallelogram.fromPointAndVectors(Point(4,4,4), Point(-1,-1,2), Point(1,-1,0))
+    line = Line(Point(0,1,1), Point(8,8,8))
+    pt = Point(1,2,3)
+    yield "parallelogram.intersectionParams", lambda: v.intersectionParams(line)
+    yield "parallelogram.projectionParams", lambda: v.projectionParams(pt)
+    yield "parallelogram.paramsForPoint", lambda: v.paramsForPoint(v.pointForParams(0.3, 0.6))
+
+    rnd = np.random.RandomState(0)
+    p, q = rnd.normal(size=(2, 10000, 4))
+    u, w = rnd.normal(size=(2, 10000, 2, 4))
+    planes = [Parallelogram.fromPointAndVectors(Point(*p[i]), Point(*u[i, 0]), Point(*u[i, 1])) for i in range(2)]
+    yield "parallelogram.intersectWithPlane", lambda: planes[0].intersectWithPlane(planes[1])
+    yield "intersectSubspaces.planes4d.10000", lambda: intersectSubspaces(p, u, q, w)
+    lines = rnd.normal(size=(2, 10000, 3))
+    yield "parallelogram.lineParams.10000", lambda: v.lineParams(lines[0], lines[1])
+
+    box = Parallelepiped(Point(1,0,0,0), [Point(1,0.5,0,0), Point(0.3,1,0.2,0), Point(0,0.4,1,0.5)])
+    pts = np.random.RandomState(0).normal(size=(10000, 4))
+    yield "parallelepiped.paramsForPoint.10000", lambda: box.paramsForPoint(pts)
+    yield "parallelepiped.contains.10000", lambda: box.contains(pts)
+    yield "parallelepiped.distance.10000", lambda: box.distance(pts)
+
+
+@benchmarks
+def linesetBenchmarks():
+    cell = platonic.Cell600(Point(0.0, 0.0, 0.0, 0.0))
+    lines = [Line(cell.points[a], cell.points[b]) for a, b in cell.generateLines()]
+    ls = LineSet.fromLines(lines)
+    pt = Point(0.1, 0.2, 0.3, 0.4)
+    yield "line.length.cell600", lambda: [l.length() for l in lines]
+    yield "lineset.lengths.cell600", lambda: ls.lengths()
+    yield "line.projectionParams.cell600", lambda: [l.projectionParams(pt) for l in lines]
+    yield "lineset.distances.cell600", lambda: ls.distances(pt.coord)
+    yield "lineset.angles.cell600", lambda: ls.angles()
+    other = ls.take(np.roll(np.arange(len(ls)), 1))
+    yield "lineset.closestDistances.cell600", lambda: ls.closestDistances(other)
+
+
+@benchmarks
+def polarBenchmarks():
+    for dim in (2, 4, 8, 16):
+        phi = tuple(0.1*(i+1) for i in range(dim-1))
+        p = polar.fromNSpherical(1.0, *phi)
+        yield "polar.fromNSpherical.%d" % dim, lambda phi=phi: polar.fromNSpherical(1.0, *phi)
+        yield "polar.toNSpherical.%d" % dim, lambda p=p: polar.toNSpherical(p)
+
+
+def platonicClasses():
+    """ return the shape classes defined in geometry.platonic """
+    return [cls for name, cls in sorted(vars(platonic).items())
+            if inspect.isclass(cls) and cls.__module__ == platonic.__name__ and hasattr(cls, 'generateLines')]
+
+
+@benchmarks
+def platonicBenchmarks():
+    for cls in platonicClasses():
+        for dim in PLATONIC_DIMS.get(cls.__name__, (3,)):
+            p0 = Point([0.0]*dim)
+            shape = cls(p0)
+            yield "platonic.%s.%d.construct" % (cls.__name__, dim), lambda cls=cls, p0=p0: cls(p0)
+            yield "platonic.%s.%d.generateLines" % (cls.__name__, dim), lambda shape=shape: list(shape.generateLines())
+    packed = platonic.PackedCube(Point([0.0]*16))
+    matrix = np.random.RandomState(0).normal(size=(3, 16))
+    yield "platonic.PackedCube.16.project", lambda: packed.project(matrix)
+    yield "platonic.PackedCube.16.edgeBlocks", lambda: list(packed.edgeBlocks())
+
+
+@benchmarks
+def kdtreeBenchmarks():
+    # edge detection on the 120-cell, against the brute force distance loop
+    cell = platonic.Cell120(Point(0.0, 0.0, 0.0, 0.0))
+    coords = np.array([p.coord for p in cell.points])
+    edgelen = 3.0-np.sqrt(5.0)
+    def bruteforce():
+        return [(a, b) for a in range(1, 600) for b in range(a)
+                if abs(cell.points[a].distance(cell.points[b]) - edgelen) < 0.001]
+    yield "kdtree.Cell120.bruteforce", bruteforce
+    yield "kdtree.Cell120.queryPairs", lambda: KDTree(coords).queryPairs(edgelen+0.001)
+
+    # a random cloud of 10**6 points, only generated when these benchmarks run
+    cloud = {}
+    def data():
+        if not cloud:
+            rnd = np.random.RandomState(0)
+            cloud['points'] = rnd.rand(10**6, 3)
+            cloud['queries'] = rnd.rand(10**4, 3)
+            cloud['tree'] = KDTree(cloud['points'])
+        return cloud
+    def bruteforceKnn(queries, k):
+        d = ((queries[:, None, :]-data()['points'][None])**2).sum(axis=2)
+        return np.argpartition(d, k, axis=1)[:, :k]
+    yield "kdtree.random1e6.build", lambda: KDTree(data()['points'])
+    yield "kdtree.random1e6.query.10000x8", lambda: data()['tree'].query(data()['queries'], k=8)
+    yield "kdtree.random1e6.query.10x8", lambda: data()['tree'].query(data()['queries'][:10], k=8)
+    yield "kdtree.random1e6.bruteforce.10x8", lambda: bruteforceKnn(data()['queries'][:10], 8)
+    yield "kdtree.random1e6.queryRadius.10000", lambda: data()['tree'].queryRadius(data()['queries'], 0.01)
+    yield "kdtree.random1e6.queryPairs", lambda: data()['tree'].queryPairs(0.002)
+
+
+@benchmarks
+def graphBenchmarks():
+    for cls, dim in ((platonic.Cell120, 4), (platonic.Cube, 16)):
+        shape = cls(Point([0.0]*dim))
+        name = "graph.%s.%d" % (cls.__name__, dim)
+        yield name+".adjacency", lambda shape=shape: Graph.fromLines(np.concatenate(list(stream.lineBlocks(type(shape), shape.p0))), len(shape.points))
+        graph = shape.adjacency()
+        yield name+".bfs", lambda graph=graph: graph.bfs([0])
+        yield name+".components", graph.components
+        if len(graph) <= 4096:
+            yield name+".distanceMatrix", graph.distanceMatrix
+            yield name+".diameter", graph.diameter
+
+
+@benchmarks
+def samplingBenchmarks():
+    def consume(blocks):
+        for block in blocks:
+            pass
+    yield "sampling.sphere.4.100000", lambda: consume(sampling.sphereBlocks(4, 100000, seed=1))
+    cell = platonic.Cell120(Point(0.0, 0.0, 0.0, 0.0))
+    mesh = Mesh.fromShape(cell)
+    yield "sampling.Cell120.edges.100000", lambda: consume(sampling.edgeBlocks(mesh, 100000, seed=1))
+    yield "sampling.Cell120.faces.100000", lambda: consume(sampling.faceBlocks(mesh, 100000, seed=1))
+
+
+@benchmarks
+def namesBenchmarks():
+    # an early match, a late match, and no match at all
+    for label, value in (("one", 1.0), ("atan", np.arctan(1/np.sqrt(7))/2), ("none", 0.123456)):
+        yield "names.namednumber.%s" % label, lambda value=value: namednumber(value)
+
+
+@benchmarks
+def shapegraphBenchmarks():
+    def writedot(graph):
+        with contextlib.redirect_stdout(io.StringIO()):
+            graph.writedot()
+    for cls in (shapegraphs.ncubegraph, shapegraphs.ntetragraph, shapegraphs.noctagraph):
+        for n in (2, 3, 4, 5):
+            yield "shapegraphs.%s.%d" % (cls.__name__, n), lambda cls=cls, n=n: writedot(cls(n))
+
+
+@benchmarks
+def startupBenchmarks():
+    # time a fresh interpreter importing the package, compared with an empty one
+    here = os.path.dirname(os.path.abspath(__file__))
+    def run(code):
+        subprocess.check_call([sys.executable, "-c", code], cwd=here)
+    for name, code in (("python", "pass"),
+                       ("geometry", "import geometry"),
+                       ("geometry.base", "import geometry.base"),
+                       ("geometry.platonic", "import geometry.platonic"),
+                       ("shape-polar", "from geometry.base import Point; from geometry.names import namednumber; import geometry.platonic"),
+                       ("qtcube", "import qtcube")):
+        yield "startup.%s" % name, lambda code=code: run(code)
+
+
+def timeit(func, repeat=5, mintime=0.05):
+    """ return (best seconds per call, calls per repeat) """
+    # find the number of calls taking at least mintime
+    number = 1
+    while True:
+        t0 = default_timer()
+        for _ in range(number):
+            func()
+        elapsed = default_timer()-t0
+        if elapsed >= mintime:
+            break
+        number *= 10 if elapsed < mintime/10 else 2
+    best = elapsed
+    for _ in range(repeat-1):
+        t0 = default_timer()
+        for _ in range(number):
+            func()
+        best = min(best, default_timer()-t0)
+    return best/number, number
+
+
+def runBenchmarks(pattern=None, repeat=5, mintime=0.05, verbose=False):
+    """ run the benchmarks with a name matching the pattern, returns a dict of results """
+    results = {}
+    for name, func in BENCHMARKS:
+        if pattern and not re.search(pattern, name):
+            continue
+        seconds, calls = timeit(func, repeat, mintime)
+        results[name] = dict(seconds=seconds, calls=calls)
+        if verbose:
+            print("%-50s %12.3f us" % (name, 1e6*seconds), file=sys.stderr)
+    return dict(
+        python=platform.python_version(),
+        numpy=np.__version__,
+        machine=platform.machine(),
+        repeat=repeat,
+        results=results)
+
+
+def compareResults(results, baseline, threshold=0.2):
+    """
+    Compare with the baseline results, returns a list of (name, ratio, regressed) tuples,
+    the ratio is new time / baseline time.
+    """
+    compared = []
+    for name, r in sorted(results['results'].items()):
+        b = baseline['results'].get(name)
+        if not b or not b['seconds']:
+            continue
+        ratio = r['seconds']/b['seconds']
+        compared.append((name, ratio, ratio > 1+threshold))
+    return compared
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the geometry, polar, names and shapegraphs code.')
+    parser.add_argument('--filter', '-k', metavar='REGEX', help='only run benchmarks matching REGEX')
+    parser.add_argument('--list', action='store_true', help='list the benchmark names')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timings per benchmark, the best is kept')
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum duration of one timing, in seconds')
+    parser.add_argument('--json', metavar='FILE', help='write the results as json, - for stdout')
+    parser.add_argument('--save', metavar='FILE', help='save the results as the new baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='fraction a benchmark may be slower than the baseline')
+    parser.add_argument('--test', action='store_true', help='run the tests of the benchmark runner')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    args = parser.parse_args()
+
+    if args.test:
+        unittest.main(argv=sys.argv[:1], verbosity=2 if args.verbose else 1)
+
+    if args.list:
+        for name, func in BENCHMARKS:
+            if not args.filter or re.search(args.filter, name):
+                print(name)
+        return 0
+
+    results = runBenchmarks(args.filter, args.repeat, args.min_time, args.verbose)
+
+    for filename in (args.json, args.save):
+        if filename == '-':
+            json.dump(results, sys.stdout, indent=1, sort_keys=True)
+            print()
+        elif filename:
+            with open(filename, "w") as fh:
+                json.dump(results, fh, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        compared = compareResults(results, baseline, args.threshold)
+        for name, ratio, regressed in compared:
+            print("%-50s %6.2fx%s" % (name, ratio, "  REGRESSION" if regressed else ""))
+        if any(regressed for name, ratio, regressed in compared):
+            return 1
+    elif args.json != '-':
+        for name, r in sorted(results['results'].items()):
+            print("%-50s %12.3f us" % (name, 1e6*r['seconds']))
+    return 0
+
+
+import unittest
+class TestBenchmark(unittest.TestCase):
+    """ tests for the benchmark runner """
+    def test_classes(self):
+        """ all platonic classes are benchmarked """
+        names = [name for name, func in BENCHMARKS]
+        for cls in platonicClasses():
+            self.assertTrue(any(name.startswith("platonic.%s." % cls.__name__) for name in names))
+        self.assertTrue("platonic.Cell120.4.generateLines" in names)
+
+    def test_run(self):
+        """ benchmarks run, and are compared with the baseline """
+        results = runBenchmarks("point.add|shapegraphs.ncubegraph.2", repeat=1, mintime=0)
+        self.assertEqual(sorted(results['results']), ["point.add", "shapegraphs.ncubegraph.2"])
+        baseline = json.loads(json.dumps(results))
+        baseline['results']['point.add']['seconds'] /= 2
+        compared = compareResults(results, baseline)
+        self.assertEqual([(name, regressed) for name, ratio, regressed in compared],
+                         [("point.add", True), ("shapegraphs.ncubegraph.2", False)])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
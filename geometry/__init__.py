@@ -0,0 +1,80 @@
+"""
+Points, lines, planes and the platonic shapes in n dimensions.
+
+Submodules are only imported when first used, so the classes can be
+reached directly from the package without paying for all imports:
+
+    import geometry
+    cube = geometry.Cube(geometry.Point(0,0,0))
+    cls = geometry.shapeClass("cell120")
+"""
+import importlib
+
+
+class LazyModule(object):
+    """ stands in for a module, which is imported on first attribute access """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# public names, and the submodule defining them
+EXPORTS = {
+    'Point': 'geometry.base',
+    'Line': 'geometry.base',
+    'LineSet': 'geometry.base',
+    'Parallelogram': 'geometry.base',
+    'Hyperplane': 'geometry.base',
+    'Parallelepiped': 'geometry.base',
+    'Axis': 'geometry.base',
+    'Tetraeder': 'geometry.platonic',
+    'Cube': 'geometry.platonic',
+    'PackedCube': 'geometry.platonic',
+    'Octaeder': 'geometry.platonic',
+    'Dodecaeder': 'geometry.platonic',
+    'Icosaeder': 'geometry.platonic',
+    'Cell24': 'geometry.platonic',
+    'Cell120': 'geometry.platonic',
+    'Cell600': 'geometry.platonic',
+    'Sphere': 'geometry.sphere',
+    'Scene': 'geometry.scene',
+    'Transform': 'geometry.scene',
+    'Mesh': 'geometry.mesh',
+    'KDTree': 'geometry.kdtree',
+    'Graph': 'geometry.graph',
+    'shapeMesh': 'geometry.mesh',
+}
+
+# shape names, as used on the command line, and their class
+SHAPES = {
+    'axis': 'Axis',
+    'tetra': 'Tetraeder',
+    'cube': 'Cube',
+    'octa': 'Octaeder',
+    'dodeca': 'Dodecaeder',
+    'icosa': 'Icosaeder',
+    'cell24': 'Cell24',
+    'cell120': 'Cell120',
+    'cell600': 'Cell600',
+}
+
+
+def shapeClass(name):
+    """ return the shape class for a name from SHAPES, importing its module when needed """
+    return __getattr__(SHAPES[name])
+
+
+def __getattr__(name):
+    """ import the submodule defining `name` on first use """
+    if name not in EXPORTS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    return getattr(importlib.import_module(EXPORTS[name]), name)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(EXPORTS))
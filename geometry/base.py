@@ -2,8 +2,10 @@
 from __future__ import division, print_function
 import math
 from types import GeneratorType
-import numpy as np
-from geometry import polar
+from geometry import polar, LazyModule
+
+# numpy is only needed by LineSet, Parallelogram, Hyperplane and Parallelepiped, import it when first used
+np = LazyModule('numpy')
 
 
 class Point(object):
@@ -175,12 +177,11 @@ class Line(object):
         """ return params for point on line """
         v = self.p2-self.p1
         u = pt-self.p1
-        if v.x:
-            return u.x/v.x
-        elif v.y:
-            return u.y/v.y
-        else:
-            return None
+        # divide by the largest component of the direction
+        i = max(range(v.dim()), key=lambda i: abs(v.coord[i]))
+        if v.coord[i]:
+            return u.coord[i]/v.coord[i]
+        return None
 
     def vector(self):
         """ return the direction vector for this line """
@@ -199,6 +200,151 @@ class Line(object):
         return None
 
 
+class LineSet(object):
+    """
+    Many line segments, stored as two (N, dim) arrays of end points:
+    segment i is { p1[i]*(1-a)+p2[i]*a,  a in [0..1] }.
+
+    The methods taking points broadcast them against the segments: a (dim,) point
+    is used with every segment, (N, dim) points pair up with the segments, and
+    pts[:, None] with (M, dim) points gives (M, N) results for all combinations.
+    Degenerate segments of length 0 have nan params.
+    """
+    @staticmethod
+    def fromLines(lines):
+        """ construct from a sequence of Line objects """
+        lines = list(lines)
+        return LineSet([l.p1.coord for l in lines], [l.p2.coord for l in lines])
+
+    @staticmethod
+    def fromIndices(points, lines):
+        """ construct from (P, dim) points, or Point objects, and (N, 2) point index pairs """
+        points = np.asarray([getattr(p, 'coord', p) for p in points], dtype=float)
+        lines = np.asarray(lines, dtype=np.int64).reshape(-1, 2)
+        return LineSet(points[lines[:, 0]], points[lines[:, 1]])
+
+    @staticmethod
+    def fromShape(shape):
+        """ construct from the points and line segments of a shape """
+        return LineSet.fromIndices(shape.points, list(shape.generateLines()))
+
+    def __init__(self, p1, p2):
+        """ construct from two (N, dim) arrays of end points """
+        self.p1 = np.array(p1, dtype=float)
+        self.p2 = np.array(p2, dtype=float).reshape(self.p1.shape)
+
+    def __len__(self):
+        return len(self.p1)
+
+    def __getitem__(self, i):
+        """ return segment i as a Line """
+        return Line(self.p1[i].tolist(), self.p2[i].tolist())
+
+    def dim(self):
+        """ return dimension of our space """
+        return self.p1.shape[1]
+
+    def take(self, indices):
+        """ return a LineSet with the selected segments """
+        return LineSet(self.p1[indices], self.p2[indices])
+
+    def vectors(self):
+        """ return the (N, dim) direction vectors, p2-p1 """
+        return self.p2-self.p1
+
+    def lengths(self):
+        """ return the (N,) lengths of the segments """
+        v = self.vectors()
+        return np.sqrt((v*v).sum(axis=1))
+
+    def directions(self):
+        """ return the (N, dim) unit direction vectors, nan for degenerate segments """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.vectors()/self.lengths()[:, None]
+
+    def pointsForParams(self, a):
+        """ return the points on the segments for params a, a scalar or (N,) array """
+        a = np.asarray(a, dtype=float)
+        return self.p1+a[..., None]*self.vectors()
+
+    def paramsForPoints(self, pts):
+        """ return the params of points on the lines, divided by the largest component of each direction """
+        v = self.vectors()
+        i = np.argmax(np.abs(v), axis=1)
+        rows = np.arange(len(self))
+        u = np.asarray(pts, dtype=float)-self.p1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(v[rows, i] != 0, u[..., rows, i]/v[rows, i], np.nan)
+
+    def projectionParams(self, pts):
+        """ return the params of the projections of the points on the lines """
+        v = self.vectors()
+        u = np.asarray(pts, dtype=float)-self.p1
+        vv = (v*v).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(vv > 0, (u*v).sum(axis=-1)/vv, np.nan)
+
+    def distances(self, pts):
+        """ return the distances of the points to the segments """
+        a = np.clip(np.nan_to_num(self.projectionParams(pts)), 0, 1)
+        d = self.pointsForParams(a)-pts
+        return np.sqrt((d*d).sum(axis=-1))
+
+    def angles(self, other=None):
+        """ return the (N, M) angles between the directions of our segments and those of other, or our own """
+        u = self.directions()
+        w = u if other is None else other.directions()
+        return np.arccos(np.clip(u.dot(w.T), -1.0, 1.0))
+
+    def closestParams(self, other):
+        """
+        Return (a, b), the (N,) params of the closest points of segment i of
+        ourselves and segment i of other, both clamped to [0..1].
+        """
+        d1 = self.vectors()
+        d2 = other.vectors()
+        r = self.p1-other.p1
+        aa, bb, ab = (d1*d1).sum(axis=1), (d2*d2).sum(axis=1), (d1*d2).sum(axis=1)
+        c, f = (d1*r).sum(axis=1), (d2*r).sum(axis=1)
+        def ratio(x, y):
+            return np.where(y > 0, x/np.where(y > 0, y, 1), 0)
+        # the closest points of the infinite lines, a at 0 for parallel lines
+        a = np.clip(ratio(ab*f-c*bb, aa*bb-ab*ab), 0, 1)
+        b = ratio(ab*a+f, bb)
+        # when b is outside the other segment, clamp it, and find the closest a for that end
+        a = np.where(b < 0, np.clip(ratio(-c, aa), 0, 1), np.where(b > 1, np.clip(ratio(ab-c, aa), 0, 1), a))
+        b = np.clip(b, 0, 1)
+        # the other segment is a point
+        a = np.where(bb > 0, a, np.clip(ratio(-c, aa), 0, 1))
+        return a, b
+
+    def closestDistances(self, other):
+        """ return the (N,) distances between segment i of ourselves and segment i of other """
+        a, b = self.closestParams(other)
+        d = self.pointsForParams(a)-other.pointsForParams(b)
+        return np.sqrt((d*d).sum(axis=1))
+
+
+class Axis(object):
+    """ the coordinate axes, as line segments from -size to size """
+    def __init__(self, dim, size=10):
+        """ construct axes for a space of dimension dim """
+        self.points = []
+        self._dim = dim
+        for i in range(dim):
+            self.points.append(Point(-size if j==i else 0 for j in range(dim)))
+            self.points.append(Point(size if j==i else 0 for j in range(dim)))
+
+    def dim(self):
+        """ return dimension of our space """
+        return self._dim
+
+    def generateLines(self):
+        """ enumerate the line segments, one per axis """
+        for i in range(self.dim()):
+            yield 2*i, 2*i+1
+
+
 class Parallelogram(object):
     @staticmethod
     def fromPointAndVectors(pt, v1, v2):
@@ -291,11 +437,9 @@ class Parallelogram(object):
         if isinstance(obj, Line):
             if self.dim()==3:
                 return self.intersectWithLine(obj)
-            # todo: implement dim==4 -> result = line
+            return self.intersectWithLineND(obj)
         if isinstance(obj, Parallelogram):
-            if self.dim()==4:
-                return self.intersectWithPlane(obj)
-            # todo: implement dim==3 -> result = line
+            return self.intersectWithPlane(obj)
         raise Exception("not implemented")
 
     def intersectWithLine(self, line):
@@ -303,27 +447,60 @@ class Parallelogram(object):
         # from the equation
         #    self.p1+(self.p2-self.p1)*a+(self.p3-self.p1)*b == line.p1+(line.p2-line.p1)*c
 
-        # solve a,b,c
         #    { (self.p2-self.p1), (self.p3-self.p1),  -(line.p2-line.p1) } * { a,b,c } == {line.p1 - self.p1}
 
-        A = np.matrix([(self.p2-self.p1).coord, (self.p3-self.p1).coord, (line.p1-line.p2).coord]).transpose()
-        b = np.matrix((line.p1-self.p1).coord).transpose()
-
-        At = A.transpose()
-        AtA = At * A
-        Atb = At * b
-
+        # in 3-d this is a square system, a line parallel to the plane yields 0, 0.
+        # lineParams intersects many lines at once.
+        A = np.array([(self.p2-self.p1).coord, (self.p3-self.p1).coord, (line.p1-line.p2).coord], dtype=float).T
         try:
-            abc = np.linalg.solve(AtA, Atb)
+            abc = np.linalg.solve(A, np.array((line.p1-self.p1).coord, dtype=float))
             return abc[0], abc[1]
-        except:
+        except np.linalg.LinAlgError:
             return 0, 0
 
+    def intersectWithLineND(self, line):
+        """ return params of the intersection point of line and our plane, None when they do not meet in one point """
+        ab, c, rank, distance = self.lineParams([line.p1.coord], [line.p2.coord])
+        if rank[0] < 3 or distance[0] > 1e-9*max(1.0, self.circumfence()):
+            return None
+        return ab[0, 0], ab[0, 1]
+
+    def lineParams(self, p1, p2):
+        """
+        Intersect many lines with our plane at once.
+
+        p1, p2 are (E, dim) arrays with points on the lines.  Returns (ab, c, rank, distance):
+        the (E, 2) params of the intersection on our plane, the (E,) params on the lines,
+        the rank of the combined directions, 3 when the line crosses the plane in one point,
+        and the distance between the line and the plane.
+        """
+        p1 = np.asarray(p1, dtype=float).reshape(-1, self.dim())
+        p2 = np.asarray(p2, dtype=float).reshape(-1, self.dim())
+        spans = np.broadcast_to(self.directions(), (len(p1), 2, self.dim()))
+        ab, c, rank, distance = intersectSubspaces(np.broadcast_to(self.p1.coord, p1.shape), spans, p1, (p2-p1)[:, None, :])
+        return ab, c[:, 0], rank, distance
+
+    def directions(self):
+        """ return the (2, dim) array with the vectors spanning the parallelogram """
+        return np.array([(self.p2-self.p1).coord, (self.p3-self.p1).coord], dtype=float)
+
     def intersectWithPlane(self, plane):
-        """ calculate intersection point of plane with plane of parallelogram """
+        """
+        Calculate the intersection of plane with the plane of the parallelogram.
 
-        # todo
-        pass
+        Returns the params (a, b) of the intersection point, when the planes meet in a single
+        point, as is usual in 4-d.  When they meet in a line, as is usual in 3-d,
+        a Line through the params of two points on the intersection is returned.
+        Returns None for planes which do not meet, or which coincide.
+        """
+        ab, cd, rank, distance = intersectSubspaces([self.p1.coord], [self.directions()], [plane.p1.coord], [plane.directions()])
+        if distance[0] > 1e-9*max(1.0, self.circumfence()) or rank[0] < 3:
+            return None
+        if rank[0] == 4:
+            return ab[0, 0], ab[0, 1]
+        # the solutions are ab plus multiples of the null vector of the combined directions
+        null = np.linalg.svd(np.vstack([self.directions(), -plane.directions()]).T)[2][3]
+        return Line(Point(ab[0].tolist()), Point((ab[0]+null[:2]).tolist()))
 
     def projectionParams(self, obj):
         """ project object onto parallelogram, currently only points """
@@ -338,7 +515,243 @@ class Parallelogram(object):
         return self.intersectWithLine(Line(pt, pt+self.perpendicular()))
 
 
-# todo: add Parallelopiped
+class Hyperplane(object):
+    """ represents a Hyperplane: { p, normal*p == offset } """
+    @staticmethod
+    def fromPointAndNormal(pt, normal):
+        """ construct hyperplane through pt, perpendicular to normal """
+        if not isinstance(normal, Point):
+            normal = Point(normal)
+        return Hyperplane(normal, normal.inner(pt))
+
+    def __init__(self, normal, offset=0):
+        """ construct hyperplane from normal vector and offset """
+        if not isinstance(normal, Point):
+            normal = Point(normal)
+        self.normal = normal
+        self.offset = offset
+
+    def dim(self):
+        """ return dimension of our space """
+        return self.normal.dim()
+
+    def intersectionParams(self, obj):
+        """ Calculate intersection of object with the hyperplane, currently only for lines """
+        if isinstance(obj, Line):
+            return self.intersectWithLine(obj)
+        raise Exception("not implemented")
+
+    def intersectWithLine(self, line):
+        """ return line param of the intersection point, None when parallel """
+        #    normal*(p1+(p2-p1)*a) == offset
+        d = self.normal.inner(line.vector())
+        if d==0:
+            return None
+        return (self.offset-self.normal.inner(line.p1))/d
+
+    def segmentParams(self, p1, p2, offsets):
+        """
+        Intersect many line segments with many parallel hyperplanes at once.
+
+        p1, p2 are (E, dim) arrays with the segment endpoints, offsets a sequence of T offsets
+        replacing self.offset.  Returns a (T, E) array of segment params, NaN
+        where a segment does not cross the hyperplane.
+
+        Points exactly on the hyperplane count as lying above it,
+        so a segment touching the hyperplane with one end only crosses when
+        its other end is below.
+        """
+        n = np.array(self.normal.coord, dtype=float)
+        offsets = np.asarray(offsets, dtype=float)[:, None]
+        d1 = np.asarray(p1, dtype=float).dot(n)[None, :]-offsets
+        d2 = np.asarray(p2, dtype=float).dot(n)[None, :]-offsets
+        crossing = (d1 < 0) != (d2 < 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(crossing, d1/(d1-d2), np.nan)
+
+    def basis(self):
+        """ return a (dim-1, dim) array with an orthonormal basis of the hyperplane directions """
+        n = np.array(self.normal.coord, dtype=float)[None, :]
+        # the right singular vectors beyond the first span the orthogonal complement of n
+        return np.linalg.svd(n)[2][1:]
+
+
+def intersectSubspaces(p, u, q, v, rcond=1e-10):
+    """
+    Intersect many pairs of affine subspaces { p+a*u } and { q+b*v } at once.
+
+    p, q are (N, dim) base points, u is an (N, k, dim) array with k spanning vectors
+    for each pair, v an (N, m, dim) array.  Returns (a, b, rank, distance):
+
+      a, b       (N, k) and (N, m) params of the intersection, or when the subspaces do
+                 not meet, of the closest points.  when the intersection is not a single
+                 point, the params with the smallest norm are returned.
+      rank       (N,) rank of the combined spanning vectors, k+m when the subspaces
+                 meet in at most one point.
+      distance   (N,) distance between the subspaces, 0 when they intersect.
+    """
+    p = np.asarray(p, dtype=float)
+    q = np.asarray(q, dtype=float)
+    u = np.asarray(u, dtype=float)
+    v = np.asarray(v, dtype=float)
+    k = u.shape[1]
+
+    #    p + a*u == q + b*v   ->   [ u^T, -v^T ] * [a; b] == q-p
+    m = np.concatenate([u, -v], axis=1).transpose(0, 2, 1)
+    w, s, vt = np.linalg.svd(m, full_matrices=False)
+    nonzero = s > rcond*np.maximum(s[:, :1], 1e-300)
+    rank = nonzero.sum(axis=1)
+    inverse = np.where(nonzero, 1/np.where(nonzero, s, 1), 0)
+    x = np.einsum('nji,nj->ni', vt, inverse*np.einsum('ndj,nd->nj', w, q-p))
+    residual = np.einsum('ndi,ni->nd', m, x)-(q-p)
+    return x[:, :k], x[:, k:], rank, np.sqrt((residual*residual).sum(axis=1))
+
+
+class Parallelepiped(object):
+    """
+    k-dimensional parallelepiped in n dimensions: { p0+sum(vectors[i]*a[i]),  a[i] in [0..1] }
+
+    The methods taking points accept a single Point, or an (N, dim) array of points.
+    Vertex i is p0 plus the vectors for the bits set in i, so the vertices and
+    line segments are numbered like those of the n-cube.
+    """
+    @staticmethod
+    def fromPointAndVectors(pt, *vectors):
+        """ construct parallelepiped centered on pt, from the spanning vectors """
+        p = np.asarray(pt.coord, dtype=float)-0.5*np.sum([v.coord for v in vectors], axis=0)
+        return Parallelepiped(Point(p.tolist()), vectors)
+
+    def __init__(self, p0, vectors):
+        """ construct parallelepiped from a corner, and a sequence of k spanning vectors """
+        if not isinstance(p0, Point):
+            p0 = Point(p0)
+        self.p0 = p0
+        self.vectors = np.array([v.coord if isinstance(v, Point) else v for v in vectors], dtype=float).reshape(-1, p0.dim())
+        if self.rank() > self.dim():
+            raise ValueError("%d spanning vectors in %d dimensions are linearly dependent" % (self.rank(), self.dim()))
+        bits = (np.arange(1 << self.rank())[:, None] >> np.arange(self.rank())) & 1
+        self.points = [Point(row) for row in (bits.dot(self.vectors)+p0.coord).tolist()]
+        self._qr = None
+
+    def dim(self):
+        """ return dimension of our space """
+        return self.p0.dim()
+
+    def rank(self):
+        """ return the number of spanning vectors """
+        return len(self.vectors)
+
+    def generateLines(self):
+        """ enumerate the line segments, between vertices differing in one bit """
+        for a in range(1, 1 << self.rank()):
+            for j in reversed(range(self.rank())):
+                if a & (1 << j):
+                    yield a, a ^ (1 << j)
+
+    def factorization(self):
+        """ return the cached QR factorization of the (dim, k) matrix with the vectors as columns """
+        if self._qr is None:
+            self._qr = solver(self.vectors)
+        return self._qr
+
+    def pointArray(self, pts):
+        """ return pts as (N, dim) array relative to p0, and whether a single point was given """
+        single = isinstance(pts, Point)
+        a = np.asarray(pts.coord if single else pts, dtype=float).reshape(-1, self.dim())
+        return a-self.p0.coord, single
+
+    def pointForParams(self, params):
+        """ return the point for a sequence of k params, or the (N, dim) points for (N, k) params """
+        params = np.asarray(params, dtype=float)
+        points = params.dot(self.vectors)+self.p0.coord
+        return Point(points.tolist()) if params.ndim == 1 else points
+
+    def paramsForPoint(self, pts):
+        """ return the params of the projection of the point on our span, or (N, k) params for (N, dim) points """
+        u, single = self.pointArray(pts)
+        params = u.dot(self.factorization().T)
+        return tuple(params[0].tolist()) if single else params
+
+    def contains(self, pts, eps=1e-9):
+        """ return whether the point, or each of the (N, dim) points, is inside the parallelepiped """
+        u, single = self.pointArray(pts)
+        params = u.dot(self.factorization().T)
+        residual = u-params.dot(self.vectors)
+        inside = (params >= -eps).all(axis=1) & (params <= 1+eps).all(axis=1) & (np.sqrt((residual*residual).sum(axis=1)) <= eps)
+        return bool(inside[0]) if single else inside
+
+    def nearestParams(self, pts):
+        """
+        Return the params of the nearest point in the parallelepiped, for the point,
+        or (N, k) params for (N, dim) points.
+
+        This is a least squares problem for the params, bounded to [0..1], solved with
+        an active set method for all points at once: each step solves for the params not
+        fixed at a bound, then either fixes the first param leaving the box, or releases
+        the fixed param whose bound blocks the largest decrease of the distance.
+        """
+        u, single = self.pointArray(pts)
+        k = self.rank()
+        gram = self.vectors.dot(self.vectors.T)
+        b = u.dot(self.vectors.T)
+        identity = np.identity(k)
+        tolerance = 1e-12*max(1.0, np.abs(gram).max())
+
+        # start at the projection, clipped to the box, the clipped params are fixed
+        x = np.clip(u.dot(self.factorization().T), 0, 1)
+        free = (x > 0) & (x < 1)
+        todo = np.arange(len(u))
+        for _ in range(10*(k+1)):
+            if not len(todo):
+                break
+            X, F, B = x[todo], free[todo], b[todo]
+            # the rows for free params are the normal equations, fixed params keep their value
+            m = np.where(F[:, :, None], gram, identity)
+            y = np.where(F, np.linalg.solve(m, np.where(F, B, X)[:, :, None])[:, :, 0], X)
+            d = y-X
+            with np.errstate(divide='ignore', invalid='ignore'):
+                limit = np.where(F & (d < 0), -X/d, np.where(F & (d > 0), (1-X)/d, np.inf))
+            blocking = np.argmin(limit, axis=1)
+            rows = np.arange(len(todo))
+            step = limit[rows, blocking]
+            blocked = step < 1
+
+            # move towards the solution until the first param reaches its bound, and fix it
+            X = np.where(blocked[:, None], X+np.minimum(step, 1)[:, None]*d, np.clip(y, 0, 1))
+            r, j = rows[blocked], blocking[blocked]
+            X[r, j] = (d[r, j] > 0).astype(float)
+            F[r, j] = False
+
+            # at the solution, release the fixed param with the most negative multiplier
+            gradient = X.dot(gram)-B
+            violation = np.where(F, 0, np.where(X > 0.5, gradient, -gradient))
+            violation[blocked] = 0
+            release = np.argmax(violation, axis=1)
+            released = violation[rows, release] > tolerance
+            F[rows[released], release[released]] = True
+
+            x[todo], free[todo] = X, F
+            todo = todo[blocked | released]
+        return tuple(x[0].tolist()) if single else x
+
+    def distance(self, pts):
+        """ return the distance of the point, or each of the (N, dim) points, to the parallelepiped """
+        u, single = self.pointArray(pts)
+        v = u-np.asarray(self.nearestParams(pts)).reshape(-1, self.rank()).dot(self.vectors)
+        d = np.sqrt((v*v).sum(axis=1))
+        return float(d[0]) if single else d
+
+
+def solver(vectors):
+    """
+    Return the (k, dim) matrix mapping a point to the params of its projection
+    on the span of the k vectors, using a QR factorization.
+    """
+    q, r = np.linalg.qr(vectors.T)
+    diagonal = np.abs(np.diag(r))
+    if len(diagonal) and diagonal.min() <= 1e-12*diagonal.max():
+        raise ValueError("the spanning vectors are linearly dependent")
+    return np.linalg.solve(r, q.T)
 
 import unittest
 class TestPointMethods(unittest.TestCase):
@@ -382,6 +795,62 @@ class TestLineMethods(unittest.TestCase):
         self.assertEqual(p, Point(3.4, 2.2))
 
 
+class TestLineSet(unittest.TestCase):
+    """ tests for LineSet, against Line """
+    def setUp(self):
+        rnd = np.random.RandomState(6)
+        self.lines = LineSet(rnd.normal(size=(40, 3)), rnd.normal(size=(40, 3)))
+        self.pts = rnd.normal(size=(40, 3))
+
+    def test_params(self):
+        """ params, lengths and angles match those of the single lines """
+        ls = self.lines
+        a = np.linspace(-1, 2, len(ls))
+        pts = ls.pointsForParams(a)
+        self.assertTrue(np.allclose(ls.paramsForPoints(pts), a))
+        proj = ls.projectionParams(self.pts)
+        for i in range(len(ls)):
+            line = ls[i]
+            self.assertAlmostEqual(ls.lengths()[i], line.length())
+            self.assertAlmostEqual(proj[i], line.projectionParams(Point(*self.pts[i])))
+            self.assertAlmostEqual(line.paramsForPoint(Point(*pts[i])), a[i])
+            self.assertAlmostEqual(ls.angles()[i, 3], line.angle(ls[3]))
+        self.assertTrue(np.allclose(np.diag(ls.angles()), 0, atol=1e-6))
+
+        # only z varies, which Line.paramsForPoint used to miss
+        self.assertEqual(Line(Point(1,1,1), Point(1,1,3)).paramsForPoint(Point(1,1,2)), 0.5)
+        self.assertTrue(np.isnan(LineSet([[1, 1]], [[1, 1]]).paramsForPoints([1, 1])).all())
+
+    def test_distances(self):
+        """ point to segment and segment to segment distances, against dense sampling """
+        ls = self.lines
+        samples = ls.pointsForParams(np.linspace(0, 1, 2001)[:, None])
+        d = np.sqrt(((samples-self.pts)**2).sum(axis=2)).min(axis=0)
+        self.assertTrue(np.allclose(ls.distances(self.pts), d, atol=1e-5))
+        self.assertEqual(ls.distances(self.pts[:5, None]).shape, (5, 40))
+
+        other = LineSet(self.pts, self.pts[::-1])
+        found = ls.closestDistances(other)
+        osamples = other.pointsForParams(np.linspace(0, 1, 401)[:, None])
+        d = np.sqrt(((samples[::5, None]-osamples[None])**2).sum(axis=3)).min(axis=(0, 1))
+        self.assertTrue((found <= d+1e-9).all())
+        self.assertTrue(np.allclose(found, d, atol=1e-2))
+
+        # parallel, crossing, and degenerate segments
+        a = LineSet([[0, 0, 0], [0, 0, 0], [0, 0, 0], [1, 1, 1]], [[2, 0, 0], [2, 0, 0], [0, 0, 0], [1, 1, 1]])
+        b = LineSet([[1, 1, 0], [1, -1, 1], [1, 0, 0], [1, 1, 1]], [[5, 1, 0], [1, 1, 1], [2, 0, 0], [3, 3, 3]])
+        self.assertTrue(np.allclose(a.closestDistances(b), [1, 1, 1, 0]))
+        self.assertTrue(np.allclose(a.closestParams(b)[0][1], 0.5))
+
+    def test_shape(self):
+        """ the cube's edges all have length 1, and meet at right angles or are parallel """
+        from geometry.platonic import Cube
+        ls = LineSet.fromShape(Cube(Point(0, 0, 0, 0)))
+        self.assertEqual(len(ls), 32)
+        self.assertTrue(np.allclose(ls.lengths(), 1))
+        self.assertTrue(np.allclose(np.cos(ls.angles())*np.sin(ls.angles()), 0))
+
+
 class TestRectMethods(unittest.TestCase):
     """ tests for parallelogram """
     def test_params2d(self):
@@ -403,6 +872,143 @@ class TestRectMethods(unittest.TestCase):
         self.assertAlmostEqual(p1.distance(pgm.pointForParams(a, b)), 0)
 
 
+class TestIntersection(unittest.TestCase):
+    """ tests for intersections of lines and planes """
+    def test_planes(self):
+        """ planes meet in a point in 4-d, in a line in 3-d """
+        xy = Parallelogram(Point(0,0,0,0), Point(1,0,0,0), Point(0,1,0,0))
+        zw = Parallelogram(Point(0.3,0.4,0,0), Point(0.3,0.4,1,0), Point(0.3,0.4,0,1))
+        self.assertTrue(np.allclose(xy.intersectionParams(zw), (0.3, 0.4)))
+        shifted = Parallelogram(Point(0,0,1,0), Point(1,0,1,0), Point(0,1,1,0))
+        self.assertEqual(xy.intersectWithPlane(shifted), None)
+        self.assertEqual(xy.intersectWithPlane(xy), None)
+
+        xy = Parallelogram(Point(0,0,1), Point(2,0,1), Point(0,2,1))
+        xz = Parallelogram(Point(0,0.5,0), Point(1,0.5,0), Point(0,0.5,1))
+        line = xy.intersectWithPlane(xz)
+        self.assertTrue(isinstance(line, Line))
+        for a in (-1.0, 0.0, 2.0):
+            pt = xy.pointForParams(*line.pointForParams(a).coord)
+            self.assertAlmostEqual(pt.y, 0.5)
+            self.assertAlmostEqual(pt.z, 1.0)
+
+    def test_lines(self):
+        """ lines and planes in 4-d, and many lines at once """
+        xy = Parallelogram(Point(0,0,0,0), Point(1,0,0,0), Point(0,1,0,0))
+        self.assertTrue(np.allclose(xy.intersectionParams(Line(Point(0.2,0.5,-1,-1), Point(0.2,0.5,1,1))), (0.2, 0.5)))
+        self.assertEqual(xy.intersectionParams(Line(Point(0,0,1,0), Point(1,0,1,1))), None)
+
+        pgm = Parallelogram.fromPointAndVectors(Point(4,4,4), Point(-1,-1,2), Point(1,-1,0))
+        rnd = np.random.RandomState(4)
+        p1, p2 = rnd.normal(size=(2, 20, 3))
+        ab, c, rank, distance = pgm.lineParams(p1, p2)
+        self.assertTrue((rank == 3).all())
+        self.assertTrue(np.allclose(distance, 0))
+        for i in range(20):
+            self.assertTrue(np.allclose(ab[i], pgm.intersectWithLine(Line(Point(*p1[i]), Point(*p2[i])))))
+
+    def test_batch(self):
+        """ batched intersections of random 4-d planes, and of skew lines """
+        rnd = np.random.RandomState(5)
+        p, q = rnd.normal(size=(2, 50, 4))
+        u, v = rnd.normal(size=(2, 50, 2, 4))
+        a, b, rank, distance = intersectSubspaces(p, u, q, v)
+        self.assertTrue((rank == 4).all())
+        self.assertTrue(np.allclose(distance, 0))
+        self.assertTrue(np.allclose(p+np.einsum('ni,nid->nd', a, u), q+np.einsum('ni,nid->nd', b, v)))
+
+        # skew lines in 3-d, and parallel ones
+        a, b, rank, distance = intersectSubspaces([[0,0,0], [0,0,0]], [[[1,0,0]], [[1,0,0]]], [[0,0,2], [0,1,0]], [[[0,1,0]], [[2,0,0]]])
+        self.assertEqual(rank.tolist(), [2, 1])
+        self.assertTrue(np.allclose(distance, [2, 1]))
+        self.assertTrue(np.allclose(a[0], 0) and np.allclose(b[0], 0))
+
+
+class TestParallelepiped(unittest.TestCase):
+    """ tests for parallelepiped """
+    def test_cube(self):
+        """ the unit cube matches Cube, with distances to faces, edges and corners """
+        from geometry.platonic import Cube
+        box = Parallelepiped(Point(0,0,0), [Point(1,0,0), Point(0,1,0), Point(0,0,1)])
+        cube = Cube(Point(0.5,0.5,0.5))
+        self.assertEqual(len(box.points), 8)
+        self.assertEqual(list(box.generateLines()), list(cube.generateLines()))
+        self.assertEqual(sorted(p.coord for p in box.points), sorted(p.coord for p in cube.points))
+        pts = np.array([[0.5,0.5,0.5], [0.5,0.5,3], [2,2,0.5], [2,3,3], [1,1,1], [-1,0.5,0.5]])
+        self.assertTrue(np.allclose(box.distance(pts), [0, 2, math.sqrt(2), math.sqrt(9), 0, 1]))
+        self.assertEqual(box.contains(pts).tolist(), [True, False, False, False, True, False])
+        self.assertAlmostEqual(box.distance(Point(0.5,0.5,-2)), 2)
+
+    def test_params(self):
+        """ batched params, against Parallelogram and the points """
+        pgm = Parallelogram.fromPointAndVectors(Point(4,4,4), Point(-1,-1,2), Point(1,-1,0))
+        pp = Parallelepiped.fromPointAndVectors(Point(4,4,4), Point(-1,-1,2), Point(1,-1,0))
+        pt = Point(1,2,3)
+        self.assertTrue(np.allclose(pp.paramsForPoint(pt), pgm.paramsForPoint(pt)))
+        params = np.random.RandomState(2).uniform(-1, 2, size=(50, 2))
+        points = pp.pointForParams(params)
+        self.assertTrue(np.allclose(pp.paramsForPoint(points), params))
+        self.assertEqual(pp.contains(points).tolist(), ((params >= 0) & (params <= 1)).all(axis=1).tolist())
+        self.assertEqual(pp.pointForParams([0.5, 0.5]).coord, (4.0, 4.0, 4.0))
+        self.assertRaises(ValueError, Parallelepiped(Point(0,0,0), [Point(1,1,0), Point(2,2,0)]).paramsForPoint, pt)
+
+    def test_distance(self):
+        """ distance to a skewed 3-d parallelepiped in 4-d, against a dense sampling of it """
+        pp = Parallelepiped(Point(1,0,0,0), [Point(1,0.5,0,0), Point(0.3,1,0.2,0), Point(0,0.4,1,0.5)])
+        pts = np.random.RandomState(1).normal(size=(20, 4))*2
+        grid = np.linspace(0, 1, 41)
+        params = np.stack(np.meshgrid(grid, grid, grid), axis=-1).reshape(-1, 3)
+        samples = pp.pointForParams(params)
+        brute = np.sqrt(((pts[:, None, :]-samples[None])**2).sum(axis=2)).min(axis=1)
+        d = pp.distance(pts)
+        self.assertTrue((d <= brute+1e-12).all())
+        self.assertTrue(np.allclose(d, brute, atol=0.03))
+
+    def test_nearest(self):
+        """ the nearest params of a 10-d box satisfy the optimality conditions """
+        rnd = np.random.RandomState(7)
+        vectors = np.identity(10)+0.4*rnd.normal(size=(10, 10))
+        pp = Parallelepiped(Point([0.0]*10), vectors)
+        pts = rnd.normal(size=(200, 10))*3
+        params = pp.nearestParams(pts)
+        self.assertTrue(((params >= 0) & (params <= 1)).all())
+        # the gradient is zero for free params, and points out of the box for params at a bound
+        gradient = (params.dot(vectors)-pts).dot(vectors.T)
+        self.assertTrue(np.allclose(np.where((params > 0) & (params < 1), gradient, 0), 0, atol=1e-9))
+        self.assertTrue((gradient[params == 0] >= -1e-9).all() and (gradient[params == 1] <= 1e-9).all())
+        vertices = np.array([p.coord for p in pp.points])
+        self.assertTrue((pp.distance(pts) <= np.sqrt(((pts[:, None]-vertices)**2).sum(axis=2)).min(axis=1)+1e-12).all())
+        self.assertEqual(len(pp.nearestParams(Point([5.0]*10))), 10)
+
+        self.assertRaises(ValueError, Parallelepiped, Point(0,0), [Point(1,0), Point(0,1), Point(1,1)])
+
+
+class TestHyperplane(unittest.TestCase):
+    """ tests for hyperplane """
+    def test_line(self):
+        """ intersect hyperplane and line in 4d """
+        h = Hyperplane.fromPointAndNormal(Point(0,0,0,1), Point(0,0,1,1))
+        l = Line(Point(0,0,0,0), Point(1,1,1,1))
+        self.assertAlmostEqual(h.intersectionParams(l), 0.5)
+        self.assertEqual(h.intersectionParams(Line(Point(0,0,0,0), Point(0,0,1,-1))), None)
+
+    def test_segments(self):
+        """ intersect segments with a family of hyperplanes """
+        h = Hyperplane(Point(1,0,0))
+        a = h.segmentParams([[0,0,0], [0,0,0]], [[2,0,0], [0,1,0]], [-1, 0, 0.5, 2.5])
+        self.assertTrue(np.isnan(a[0]).all())
+        self.assertTrue(np.isnan(a[3]).all())
+        self.assertAlmostEqual(a[2][0], 0.25)
+        self.assertTrue(np.isnan(a[2][1]))
+
+    def test_basis(self):
+        """ basis vectors are perpendicular to the normal """
+        b = Hyperplane(Point(1,2,3,4)).basis()
+        self.assertEqual(b.shape, (3,4))
+        self.assertTrue(np.allclose(b.dot([1,2,3,4]), 0))
+        self.assertTrue(np.allclose(b.dot(b.T), np.identity(3)))
+
+
 if __name__ == '__main__':
     import sys
     sys.exit(unittest.main())
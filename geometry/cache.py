@@ -0,0 +1,174 @@
+"""
+Opt-in on-disk cache for the meshes of the platonic shapes.
+
+The cache is enabled by setting the GEOMETRY_CACHE environment variable
+to a directory, or by calling `setCacheDir`.  Each mesh is stored in the
+binary format of `Mesh.save`, in a file named after the shape, its
+dimension, the face option and a hash of the source of the modules
+generating the meshes, so editing a generator invalidates the cached meshes.
+
+Cached files are memory mapped read-only by `Mesh.load` on a hit.  On a
+miss the mesh is generated, and written to a temporary file which is then
+renamed into place, so concurrent processes sharing the directory never
+see partially written files.
+"""
+from __future__ import division, print_function
+import hashlib
+import os
+import struct
+import tempfile
+import numpy as np
+from geometry import polar, base, kdtree, platonic, mesh
+from geometry.mesh import Mesh, makeShape
+
+
+# the modules the cached meshes depend on
+SOURCES = (polar, base, kdtree, platonic, mesh)
+
+_cachedir = os.environ.get('GEOMETRY_CACHE') or None
+_sourcehash = None
+
+
+def setCacheDir(path):
+    """ use path as the cache directory, None disables the cache """
+    global _cachedir
+    _cachedir = path
+
+
+def cacheDir():
+    """ return the cache directory, None when caching is disabled """
+    return _cachedir
+
+
+def sourceHash():
+    """ return a hash of the source of the modules generating the meshes """
+    global _sourcehash
+    if _sourcehash is None:
+        h = hashlib.sha1()
+        for module in SOURCES:
+            with open(os.path.splitext(module.__file__)[0]+".py", "rb") as fh:
+                h.update(fh.read())
+        _sourcehash = h.hexdigest()[:16]
+    return _sourcehash
+
+
+def cacheKey(name, dim, faces):
+    """ return the file name for a mesh """
+    return "%s-%d-%s-%s.mesh" % (name, dim, "faces" if faces else "lines", sourceHash())
+
+
+def umask():
+    """ return the process umask """
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def saveAtomic(filename, mesh):
+    """ save mesh with Mesh.save, the file appears under its name only when complete """
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(filename), prefix=".tmp-", suffix=".mesh")
+    os.close(fd)
+    try:
+        mesh.save(tmpname)
+        # mkstemp creates the file readable by us only, the cache may be shared
+        os.chmod(tmpname, 0o666 & ~umask())
+        os.replace(tmpname, filename)
+    except BaseException:
+        os.remove(tmpname)
+        raise
+
+
+def cachedMesh(name, dim, faces=True, dtype=np.float64):
+    """
+    Return the Mesh for a shape from geometry.SHAPES, with points of the given dtype.
+
+    When the cache is enabled the arrays are memory mapped from the cache,
+    and written there when missing.  The cache holds float64 points, other
+    dtypes are converted after loading.
+    """
+    if _cachedir is None:
+        return generateMesh(name, dim, faces, dtype)
+
+    filename = os.path.join(_cachedir, cacheKey(name, dim, faces))
+    try:
+        mesh = Mesh.load(filename)
+    except (IOError, OSError, ValueError, struct.error):
+        mesh = generateMesh(name, dim, faces, np.float64)
+        os.makedirs(_cachedir, exist_ok=True)
+        saveAtomic(filename, mesh)
+    if mesh.points.dtype != dtype:
+        mesh.points = mesh.points.astype(dtype)
+    return mesh
+
+
+def generateMesh(name, dim, faces, dtype):
+    """ generate the mesh for a shape, with points of the given dtype """
+    mesh = Mesh.fromShape(makeShape(name, dim), faces)
+    mesh.points = mesh.points.astype(dtype)
+    return mesh
+
+
+import unittest
+class TestCache(unittest.TestCase):
+    """ tests for the mesh cache """
+    def setUp(self):
+        self.saved = cacheDir()
+        self.tmpdir = tempfile.mkdtemp()
+        setCacheDir(os.path.join(self.tmpdir, "cache"))
+
+    def tearDown(self):
+        import shutil
+        setCacheDir(self.saved)
+        shutil.rmtree(self.tmpdir)
+
+    def test_roundtrip(self):
+        """ the second lookup is memory mapped, and equal to the generated mesh """
+        first = cachedMesh("cell24", 4)
+        self.assertFalse(isinstance(first.points, np.memmap))
+        second = cachedMesh("cell24", 4)
+        self.assertTrue(isinstance(second.points, np.memmap))
+        self.assertTrue(np.array_equal(first.points, second.points))
+        self.assertTrue(np.array_equal(first.lines, second.lines))
+        self.assertEqual([f.tolist() for f in first.faces()], [f.tolist() for f in second.faces()])
+        self.assertRaises(ValueError, second.points.__setitem__, 0, 0)
+
+        # a damaged file is generated again
+        filename = os.path.join(cacheDir(), cacheKey("cell24", 4, True))
+        with open(filename, "r+b") as fh:
+            fh.truncate(100)
+        self.assertTrue(np.array_equal(first.lines, cachedMesh("cell24", 4).lines))
+        self.assertTrue(isinstance(cachedMesh("cell24", 4).points, np.memmap))
+
+    def test_keys(self):
+        """ face options are cached separately, dtypes are converted, no temporary files remain """
+        a = cachedMesh("cube", 5, faces=False, dtype=np.float32)
+        b = cachedMesh("cube", 5, faces=False, dtype=np.float32)
+        self.assertEqual(b.points.dtype, np.float32)
+        self.assertTrue(np.array_equal(a.points, b.points))
+        self.assertFalse(b.hasFaces())
+        self.assertTrue(cachedMesh("cube", 5).hasFaces())
+        self.assertTrue(isinstance(cachedMesh("cube", 5, faces=False).points, np.memmap))
+        names = os.listdir(cacheDir())
+        self.assertEqual(len(names), 2)
+        self.assertFalse(any(name.startswith(".tmp") for name in names))
+        self.assertTrue(all(sourceHash() in name for name in names))
+
+    def test_shared(self):
+        """ cache files get the permissions of normal files, the directory may already exist """
+        import stat
+        os.makedirs(cacheDir())
+        cachedMesh("tetra", 3)
+        mode = stat.S_IMODE(os.stat(os.path.join(cacheDir(), cacheKey("tetra", 3, True))).st_mode)
+        self.assertEqual(mode, 0o666 & ~umask())
+
+    def test_disabled(self):
+        """ without a cache directory nothing is written """
+        setCacheDir(None)
+        m = cachedMesh("octa", 3)
+        self.assertEqual(len(m.lines), 12)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, "cache")))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,194 @@
+"""
+Edge graphs of shapes, stored as CSR adjacency arrays.
+
+The neighbours of vertex v are `neighbours[offsets[v]:offsets[v+1]]`, in
+increasing order.  The algorithms work on whole frontiers at once:
+breadth first search expands all vertices at the current distance in
+one step, and the all-pairs distances run a breadth first search from
+every vertex at once, with the reached vertices stored as bitsets.
+
+    g = shape.adjacency()
+    g.checkDegree(4)
+    print(g.diameter(), g.components().max()+1)
+"""
+from __future__ import division, print_function
+import numpy as np
+
+
+class Graph(object):
+    """ undirected graph in CSR form """
+    @staticmethod
+    def fromLines(lines, npoints):
+        """ construct from an (E, 2) array of point index pairs """
+        lines = np.asarray(lines, dtype=np.int64).reshape(-1, 2)
+        src = np.concatenate([lines[:, 0], lines[:, 1]])
+        dst = np.concatenate([lines[:, 1], lines[:, 0]])
+        order = np.lexsort((dst, src))
+        offsets = np.zeros(npoints+1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=npoints), out=offsets[1:])
+        return Graph(offsets, dst[order])
+
+    def __init__(self, offsets, neighbours):
+        self.offsets = offsets
+        self.neighbours = neighbours
+
+    def __len__(self):
+        """ return the number of vertices """
+        return len(self.offsets)-1
+
+    def degrees(self):
+        """ return the number of neighbours of each vertex """
+        return np.diff(self.offsets)
+
+    def neighboursOf(self, vertices):
+        """ return the concatenated neighbours of the vertices """
+        vertices = np.asarray(vertices, dtype=np.int64)
+        counts = self.offsets[vertices+1]-self.offsets[vertices]
+        firsts = np.repeat(self.offsets[vertices]-np.cumsum(counts)+counts, counts)
+        return self.neighbours[firsts+np.arange(counts.sum())]
+
+    def checkDegree(self, degree):
+        """ raise ValueError when not all vertices have `degree` neighbours """
+        wrong = np.nonzero(self.degrees() != degree)[0]
+        if len(wrong):
+            raise ValueError("%d vertices do not have degree %d, first: vertex %d with degree %d"
+                             % (len(wrong), degree, wrong[0], self.degrees()[wrong[0]]))
+
+    def bfs(self, sources):
+        """ return the graph distance of every vertex to the nearest source, -1 when unreachable """
+        dist = np.full(len(self), -1, dtype=np.int64)
+        frontier = np.unique(np.asarray(sources, dtype=np.int64))
+        level = 0
+        while len(frontier):
+            dist[frontier] = level
+            level += 1
+            reached = self.neighboursOf(frontier)
+            frontier = np.unique(reached[dist[reached] < 0])
+        return dist
+
+    def eccentricity(self, vertex):
+        """ return the largest distance from vertex to another vertex, -1 when not connected """
+        dist = self.bfs([vertex])
+        return -1 if (dist < 0).any() else int(dist.max())
+
+    def reachBits(self, sources):
+        """
+        Yield (distance, bits) for the all-vertex bfs from the sources: bits is an (N, words) array,
+        bit s of row v is set when v is at the distance from source s.
+        """
+        nwords = (len(sources)+63)//64
+        reached = np.zeros((len(self), nwords), dtype=np.uint64)
+        s = np.arange(len(sources))
+        reached[sources, s//64] = np.uint64(1) << (s % 64).astype(np.uint64)
+        frontier = reached.copy()
+        hasneighbours = self.degrees() > 0
+        starts = self.offsets[:-1][hasneighbours]
+        level = 0
+        while frontier.any():
+            yield level, frontier
+            level += 1
+            grown = np.zeros_like(reached)
+            if len(starts):
+                grown[hasneighbours] = np.bitwise_or.reduceat(frontier[self.neighbours], starts, axis=0)
+            frontier = grown & ~reached
+            reached |= frontier
+
+    def distanceMatrix(self, block=4096):
+        """ return the (N, N) graph distances between all vertices, -1 when unreachable """
+        n = len(self)
+        dtype = np.int16 if n < 1<<15 else np.int32
+        dist = np.full((n, n), -1, dtype=dtype)
+        for start in range(0, n, block):
+            sources = np.arange(start, min(start+block, n))
+            rows = dist[start:start+len(sources)]
+            for level, bits in self.reachBits(sources):
+                unpacked = np.unpackbits(bits.view(np.uint8), axis=1, bitorder='little')[:, :len(sources)]
+                np.putmask(rows, unpacked.T, level)
+        return dist
+
+    def diameter(self, transitive=False, block=4096):
+        """
+        Return the largest graph distance between two vertices, -1 when not connected.
+
+        The edge graphs of the regular polytopes are vertex transitive: all vertices
+        have the same eccentricity, with transitive=True only one bfs is done.
+        """
+        if len(self) == 0:
+            return 0
+        if self.components().max() > 0:
+            return -1
+        if transitive:
+            return self.eccentricity(0)
+        diameter = 0
+        for start in range(0, len(self), block):
+            for level, bits in self.reachBits(np.arange(start, min(start+block, len(self)))):
+                diameter = max(diameter, level)
+        return diameter
+
+    def components(self):
+        """ return the component number of each vertex, components are numbered by their first vertex """
+        labels = np.arange(len(self))
+        hasneighbours = self.degrees() > 0
+        starts = self.offsets[:-1][hasneighbours]
+        while len(starts):
+            # each vertex takes the smallest label of its neighbours, then labels are followed to their root
+            smallest = labels.copy()
+            smallest[hasneighbours] = np.minimum.reduceat(labels[self.neighbours], starts)
+            updated = np.minimum(labels, smallest)
+            np.minimum.at(updated, labels, smallest)
+            while True:
+                jumped = updated[updated]
+                if (jumped == updated).all():
+                    break
+                updated = jumped
+            if (updated == labels).all():
+                break
+            labels = updated
+        return np.unique(labels, return_inverse=True)[1].reshape(-1)
+
+
+import unittest
+class TestGraph(unittest.TestCase):
+    """ tests for the graph algorithms """
+    def test_path(self):
+        """ a path and a separate triangle """
+        g = Graph.fromLines([(1, 0), (2, 1), (3, 2), (5, 4), (6, 5), (4, 6)], 8)
+        self.assertEqual(g.degrees().tolist(), [1, 2, 2, 1, 2, 2, 2, 0])
+        self.assertEqual(g.neighboursOf([1, 6]).tolist(), [0, 2, 4, 5])
+        self.assertEqual(g.bfs([0]).tolist(), [0, 1, 2, 3, -1, -1, -1, -1])
+        self.assertEqual(g.bfs([0, 3]).tolist(), [0, 1, 1, 0, -1, -1, -1, -1])
+        self.assertEqual(g.components().tolist(), [0, 0, 0, 0, 1, 1, 1, 2])
+        self.assertEqual(g.diameter(), -1)
+        self.assertEqual(g.eccentricity(4), -1)
+        d = g.distanceMatrix()
+        self.assertEqual(d[0].tolist(), [0, 1, 2, 3, -1, -1, -1, -1])
+        self.assertEqual(d[5].tolist(), [-1, -1, -1, -1, 1, 0, 1, -1])
+        self.assertRaises(ValueError, g.checkDegree, 2)
+
+        path = Graph.fromLines([(i+1, i) for i in range(99)], 100)
+        self.assertEqual(path.diameter(block=7), 99)
+        self.assertEqual(path.components().max(), 0)
+
+    def test_shapes(self):
+        """ the edge graphs of the shapes are regular, connected, with the known diameters """
+        from geometry.base import Point
+        from geometry import platonic
+        for cls, dim, degree, diameter in ((platonic.Tetraeder, 5, 5, 1), (platonic.Cube, 6, 6, 6), (platonic.Octaeder, 4, 6, 2),
+                                           (platonic.Dodecaeder, 3, 3, 5), (platonic.Icosaeder, 3, 5, 3),
+                                           (platonic.Cell24, 4, 8, 3), (platonic.Cell120, 4, 4, 15), (platonic.Cell600, 4, 12, 5)):
+            shape = cls(Point([0.0]*dim))
+            g = shape.adjacency()
+            self.assertTrue(g is shape.adjacency())
+            g.checkDegree(degree)
+            self.assertEqual(g.components().max(), 0)
+            self.assertEqual(g.diameter(transitive=True), diameter)
+            if len(g) <= 120:
+                self.assertEqual(g.diameter(), diameter)
+                d = g.distanceMatrix()
+                self.assertTrue((d == d.T).all())
+                self.assertEqual([[a, b] for a, b in zip(*np.nonzero(d == 1)) if b < a], sorted(sorted(l, reverse=True) for l in shape.generateLines()))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
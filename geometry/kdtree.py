@@ -0,0 +1,245 @@
+"""
+KD-tree over an array of n-dimensional points, for batched nearest
+neighbour and fixed radius queries.
+
+The tree is a complete binary tree stored in arrays: node i has children
+2i+1 and 2i+2, and all leaves are at the same depth.  Each node splits
+its points at the median of the axis with the largest spread, so the
+leaves hold equal numbers of points, at most `leafsize`.
+
+Queries are batched: the queries descend the tree one level at a time,
+as arrays of (query, node) pairs, dropping the pairs where the node's
+bounding box is out of reach of the query.  So the python overhead is per
+level, not per query or per node.
+
+    tree = KDTree(points)
+    dist, idx = tree.query(queries, k=4)
+    pairs = tree.queryPairs(0.5)
+"""
+from __future__ import division, print_function
+import numpy as np
+
+
+# number of query points handled at once, limits the size of the temporary arrays
+QUERYBLOCK = 4096
+
+
+class KDTree(object):
+    """ KD-tree over an (N, dim) array of points """
+    def __init__(self, points, leafsize=16):
+        """ construct the tree, the points are copied """
+        points = np.asarray(points, dtype=float)
+        npoints, dim = points.shape
+        self.npoints = npoints
+        self.depth = 0
+        while npoints >> self.depth > leafsize:
+            self.depth += 1
+        nleaves = 1 << self.depth
+        self.leafsize = max(1, -(-npoints//nleaves))
+        nnodes = 2*nleaves-1
+        self.axis = np.zeros(nnodes, dtype=np.int64)
+        self.split = np.zeros(nnodes)
+        self.lo = np.zeros((nnodes, dim))
+        self.hi = np.zeros((nnodes, dim))
+
+        # the points are padded with NaN points, so all nodes of a level have the same
+        # number of points, NaN compares false, sorts last and is skipped by fmin/fmax.
+        # each level partitions the points of every node at the median along the longest
+        # axis of its cell, the cells are the root's bounding box cut by the splits.
+        size = nleaves*self.leafsize
+        coords = np.full((dim, size), np.nan)
+        coords[:, :npoints] = points.T
+        order = np.arange(size)
+        celllo = np.fmin.reduce(coords, axis=1)[None]
+        cellhi = np.fmax.reduce(coords, axis=1)[None]
+        for level in range(self.depth):
+            nodes = np.arange((1 << level)-1, (2 << level)-1)
+            rows = np.arange(len(nodes))
+            axis = self.axis[nodes] = np.argmax(np.nan_to_num(cellhi-celllo), axis=1)
+            block = coords.reshape(dim, len(nodes), -1)
+            key = block[axis, rows]
+            mid = key.shape[1]//2
+            perm = np.argpartition(key, mid, axis=1)
+            split = self.split[nodes] = key[rows, perm[:, mid]]
+            coords = block[:, rows[:, None], perm].reshape(dim, size)
+            order = order.reshape(len(nodes), -1)[rows[:, None], perm].ravel()
+            celllo, cellhi = np.repeat(celllo, 2, axis=0), np.repeat(cellhi, 2, axis=0)
+            cellhi[2*rows, axis] = split
+            celllo[2*rows+1, axis] = split
+
+        # tight bounding boxes, from the leaves up
+        self.leafcoords = coords.reshape(dim, nleaves, self.leafsize)
+        self.lo[nleaves-1:] = np.fmin.reduce(self.leafcoords, axis=2).T
+        self.hi[nleaves-1:] = np.fmax.reduce(self.leafcoords, axis=2).T
+        for level in range(self.depth-1, -1, -1):
+            nodes = np.arange((1 << level)-1, (2 << level)-1)
+            self.lo[nodes] = np.fmin(self.lo[2*nodes+1], self.lo[2*nodes+2])
+            self.hi[nodes] = np.fmax(self.hi[2*nodes+1], self.hi[2*nodes+2])
+
+        # leaf slots holding a padding point have index npoints
+        self.order = np.where(order < npoints, order, npoints)
+        self.firstleaf = nleaves-1
+
+    def __len__(self):
+        return self.npoints
+
+    def dim(self):
+        """ return dimension of our space """
+        return self.lo.shape[1]
+
+    def leafPairs(self, lo, hi, bound2):
+        """
+        Return (query index, leaf number) arrays of the leaves with a bounding box within
+        sqrt(bound2) of the query boxes lo, hi.  For point queries lo and hi are the same.
+        """
+        qidx = np.arange(len(lo))
+        nodes = np.zeros(len(lo), dtype=np.int64)
+        for level in range(self.depth+1):
+            if level:
+                qidx = np.repeat(qidx, 2)
+                nodes = 2*np.repeat(nodes, 2)+np.tile([1, 2], len(nodes))
+            d = np.maximum(self.lo[nodes]-hi[qidx], 0) + np.maximum(lo[qidx]-self.hi[nodes], 0)
+            near = (d*d).sum(axis=1) <= bound2[qidx]
+            qidx, nodes = qidx[near], nodes[near]
+        return qidx, nodes-self.firstleaf
+
+    def candidates(self, queries, bound2):
+        """ yield (query index, leaf slot, squared distance) arrays of the points within sqrt(bound2) """
+        qidx, leaves = self.leafPairs(queries, queries, bound2)
+        step = max(1, (1 << 18)//self.leafsize)
+        for start in range(0, len(qidx), step):
+            q, leaf = qidx[start:start+step], leaves[start:start+step]
+            d = queries[q].T[:, :, None]-self.leafcoords[:, leaf]
+            d2 = (d*d).sum(axis=0)
+            rows, cols = np.nonzero(d2 <= bound2[q][:, None])
+            yield q[rows], leaf[rows]*self.leafsize+cols, d2[rows, cols]
+
+    def queries(self, queries):
+        """ return the queries as (Q, dim) array, and its blocks """
+        queries = np.asarray(queries, dtype=float).reshape(-1, self.dim())
+        return queries, range(0, len(queries), QUERYBLOCK)
+
+    def query(self, queries, k=1):
+        """
+        Return the distances and indices of the k nearest points for each of the (Q, dim) queries,
+        as two (Q, k) arrays, nearest first.  When there are fewer than k points, the missing
+        neighbours have distance inf and index len(self).
+        """
+        queries, blocks = self.queries(queries)
+        dist = np.full((len(queries), k), np.inf)
+        index = np.full((len(queries), k), len(self), dtype=np.int64)
+        for start in blocks:
+            block = queries[start:start+QUERYBLOCK]
+            found = list(self.candidates(block, self.knnBound(block, k)))
+            if not found:
+                continue
+            qidx, slot, d2 = [np.concatenate(a) for a in zip(*found)]
+            pidx = self.order[slot]
+            ordered = np.lexsort((pidx, d2, qidx))
+            qidx, pidx, d2 = qidx[ordered], pidx[ordered], d2[ordered]
+            rank = np.arange(len(qidx))-np.searchsorted(qidx, qidx)
+            keep = rank < k
+            dist[start+qidx[keep], rank[keep]] = np.sqrt(d2[keep])
+            index[start+qidx[keep], rank[keep]] = pidx[keep]
+        return dist, index
+
+    def knnBound(self, queries, k):
+        """
+        Return an upper bound for the squared distance of the k-th nearest point:
+        the k-th nearest point of the subtree on the side of the query, with room for 4k points.
+        """
+        if k > len(self):
+            return np.full(len(queries), np.inf)
+        level = 0
+        while level < self.depth and self.leafsize << (self.depth-level-1) >= max(4*k, 64):
+            level += 1
+        nodes = np.zeros(len(queries), dtype=np.int64)
+        for _ in range(level):
+            right = queries[np.arange(len(queries)), self.axis[nodes]] >= self.split[nodes]
+            nodes = 2*nodes+1+right
+        # the leaves below the nodes at this level
+        width = 1 << (self.depth-level)
+        leaves = ((nodes-((1 << level)-1))*width)[:, None]+np.arange(width)
+        d = queries.T[:, :, None, None]-self.leafcoords[:, leaves]
+        d2 = np.nan_to_num((d*d).sum(axis=0).reshape(len(queries), -1), nan=np.inf)
+        return np.partition(d2, k-1, axis=1)[:, k-1]
+
+    def radiusPairs(self, queries, r):
+        """ return an (M, 2) array of (query index, point index) pairs within distance r, sorted """
+        queries, blocks = self.queries(queries)
+        found = [np.zeros((0, 2), dtype=np.int64)]
+        for start in blocks:
+            block = queries[start:start+QUERYBLOCK]
+            for qidx, slot, d2 in self.candidates(block, np.full(len(block), r*r)):
+                found.append(np.column_stack([start+qidx, self.order[slot]]))
+        pairs = np.vstack(found)
+        return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+    def queryRadius(self, queries, r):
+        """ return for each of the (Q, dim) queries a sorted array with the indices of the points within distance r """
+        pairs = self.radiusPairs(queries, r)
+        nqueries = len(np.asarray(queries).reshape(-1, self.dim()))
+        return np.split(pairs[:, 1], np.searchsorted(pairs[:, 0], np.arange(1, nqueries)))
+
+    def queryPairs(self, r):
+        """ return an (M, 2) array of all point index pairs a, b within distance r, with b < a, sorted """
+        # the leaves are the queries, each pair of leaves is compared once
+        leaves = np.arange(self.firstleaf, len(self.lo))
+        qleaf, leaf = self.leafPairs(self.lo[leaves], self.hi[leaves], np.full(len(leaves), r*r))
+        qleaf, leaf = qleaf[qleaf >= leaf], leaf[qleaf >= leaf]
+        found = [np.zeros((0, 2), dtype=np.int64)]
+        step = max(1, (1 << 18)//self.leafsize**2)
+        for start in range(0, len(qleaf), step):
+            q, p = qleaf[start:start+step], leaf[start:start+step]
+            d = self.leafcoords[:, q, :, None]-self.leafcoords[:, p, None, :]
+            pair, a, b = np.nonzero((d*d).sum(axis=0) <= r*r)
+            # within a leaf, each pair is found twice
+            once = (q[pair] != p[pair]) | (a > b)
+            a = self.order[q[pair]*self.leafsize+a][once]
+            b = self.order[p[pair]*self.leafsize+b][once]
+            found.append(np.column_stack([np.maximum(a, b), np.minimum(a, b)]))
+        pairs = np.vstack(found)
+        return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+import unittest
+class TestKDTree(unittest.TestCase):
+    """ tests for the kd-tree, against brute force distances """
+    def setUp(self):
+        rnd = np.random.RandomState(3)
+        self.points = rnd.normal(size=(500, 3))
+        self.queries = rnd.normal(size=(50, 3))
+        self.dist = np.sqrt(((self.queries[:, None, :]-self.points[None])**2).sum(axis=2))
+
+    def test_knn(self):
+        """ k nearest neighbours, also when there are fewer than k points """
+        for k, leafsize in ((1, 32), (5, 8), (40, 8)):
+            dist, idx = KDTree(self.points, leafsize).query(self.queries, k)
+            expected = np.argsort(self.dist, axis=1, kind='stable')[:, :k]
+            self.assertEqual(idx.tolist(), expected.tolist())
+            self.assertTrue(np.allclose(dist, np.take_along_axis(self.dist, expected, axis=1)))
+
+        dist, idx = KDTree(self.points[:3]).query(self.queries[:2], k=4)
+        self.assertEqual(idx[:, 3].tolist(), [3, 3])
+        self.assertTrue(np.isinf(dist[:, 3]).all())
+
+    def test_radius(self):
+        """ the points within a radius of each query """
+        tree = KDTree(self.points, leafsize=8)
+        found = tree.queryRadius(self.queries, 0.5)
+        self.assertEqual(len(found), 50)
+        for row, indices in zip(self.dist, found):
+            self.assertEqual(indices.tolist(), np.nonzero(row <= 0.5)[0].tolist())
+
+    def test_pairs(self):
+        """ all pairs of points within a radius, also for an empty tree """
+        tree = KDTree(self.points)
+        d = np.sqrt(((self.points[:, None, :]-self.points[None])**2).sum(axis=2))
+        expected = [[a, b] for a in range(500) for b in range(a) if d[a, b] <= 0.3]
+        self.assertEqual(tree.queryPairs(0.3).tolist(), expected)
+        self.assertEqual(KDTree(np.zeros((0, 2))).queryPairs(1.0).shape, (0, 2))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
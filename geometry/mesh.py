@@ -0,0 +1,247 @@
+"""
+Meshes: the points, line segments and faces of a shape as numpy arrays.
+
+`shapeMesh(name, dim)` returns the mesh for any shape from geometry.SHAPES,
+generated once per (name, dim).  Meshes can be saved in a compact binary
+format, which `Mesh.load` memory-maps, and 3-d meshes can be exported as
+OBJ or PLY.
+
+The binary format is a 48 byte header, followed by the arrays, little endian:
+
+    magic "GMSH", version, dim             4s, u4, u8
+    points, lines, faces, face indices     4 x u8 counts
+    points                                 (points, dim) f8
+    lines                                  (lines, 2) i8
+    face offsets                           (faces+1) i8
+    face indices                           (face indices) i8
+"""
+from __future__ import division, print_function
+import struct
+import numpy as np
+import geometry
+from geometry.base import Point, Axis
+from geometry.platonic import faceCycles
+
+
+MAGIC = b"GMSH"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQQQQ")
+
+
+class Mesh(object):
+    """ vertex array, edge array and optional faces of a shape """
+    @staticmethod
+    def fromShape(shape, faces=True):
+        """ construct mesh from any object with `points` and `generateLines` """
+        points = np.array([p.coord for p in shape.points], dtype=float)
+        lines = np.array(list(shape.generateLines()), dtype=np.int64).reshape(-1, 2)
+        return Mesh(points, lines, list(faceCycles(lines.tolist())) if faces else None)
+
+    def __init__(self, points, lines, faces=None, faceoffsets=None):
+        """
+        Construct mesh from (V, dim) points and (E, 2) point index pairs.
+
+        faces is either a list of point index cycles, or, with faceoffsets, the
+        concatenated cycles with the start of each cycle.
+        """
+        self.points = points
+        self.lines = lines
+        if faces is not None and faceoffsets is None:
+            faceoffsets = np.cumsum([0]+[len(f) for f in faces]).astype(np.int64)
+            faces = np.array([i for f in faces for i in f], dtype=np.int64)
+        self.faceindices = faces
+        self.faceoffsets = faceoffsets
+
+    def dim(self):
+        """ return dimension of our space """
+        return self.points.shape[1]
+
+    def hasFaces(self):
+        """ return whether the mesh has faces """
+        return self.faceoffsets is not None
+
+    def faces(self):
+        """ return the faces as a list of point index arrays """
+        if not self.hasFaces():
+            return []
+        return np.split(self.faceindices, self.faceoffsets[1:-1])
+
+    def save(self, filename):
+        """ write the mesh in the binary mesh format """
+        offsets = self.faceoffsets if self.hasFaces() else np.zeros(1, dtype=np.int64)
+        indices = self.faceindices if self.hasFaces() else np.zeros(0, dtype=np.int64)
+        with open(filename, "wb") as fh:
+            fh.write(HEADER.pack(MAGIC, VERSION, self.dim(), len(self.points), len(self.lines), len(offsets)-1, len(indices)))
+            fh.write(np.ascontiguousarray(self.points, dtype='<f8').tobytes())
+            fh.write(np.ascontiguousarray(self.lines, dtype='<i8').tobytes())
+            fh.write(np.ascontiguousarray(offsets, dtype='<i8').tobytes())
+            fh.write(np.ascontiguousarray(indices, dtype='<i8').tobytes())
+
+    @staticmethod
+    def load(filename, mmap=True):
+        """ read a binary mesh, by default the arrays are read-only memory maps of the file """
+        with open(filename, "rb") as fh:
+            magic, version, dim, npoints, nlines, nfaces, nindices = HEADER.unpack(fh.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s: not a version %d mesh file" % (filename, VERSION))
+        shapes = [(npoints, dim), (nlines, 2), (nfaces+1,), (nindices,)]
+        dtypes = ['<f8', '<i8', '<i8', '<i8']
+        arrays = []
+        offset = HEADER.size
+        for shape, dtype in zip(shapes, dtypes):
+            count = int(np.prod(shape))
+            if mmap and count:
+                arrays.append(np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape))
+            else:
+                arrays.append(np.fromfile(filename, dtype=dtype, count=count, offset=offset).reshape(shape))
+            offset += 8*count
+        points, lines, offsets, indices = arrays
+        if nfaces == 0:
+            offsets = indices = None
+        return Mesh(points, lines, indices, offsets)
+
+    def writeOBJ(self, filename):
+        """ export a 3-d mesh as a wavefront OBJ file, with lines and faces """
+        self.check3d()
+        with open(filename, "w") as fh:
+            for x, y, z in self.points.tolist():
+                fh.write("v %r %r %r\n" % (x, y, z))
+            for a, b in (self.lines+1).tolist():
+                fh.write("l %d %d\n" % (a, b))
+            for face in self.faces():
+                fh.write("f %s\n" % " ".join(str(i+1) for i in face.tolist()))
+
+    def writePLY(self, filename):
+        """ export a 3-d mesh as a binary PLY file, with edges and faces """
+        self.check3d()
+        faces = self.faces()
+        header = ["ply", "format binary_little_endian 1.0",
+                  "element vertex %d" % len(self.points),
+                  "property double x", "property double y", "property double z",
+                  "element edge %d" % len(self.lines),
+                  "property int vertex1", "property int vertex2",
+                  "element face %d" % len(faces),
+                  "property list uchar int vertex_indices",
+                  "end_header"]
+        with open(filename, "wb") as fh:
+            fh.write(("\n".join(header)+"\n").encode("ascii"))
+            fh.write(np.ascontiguousarray(self.points, dtype='<f8').tobytes())
+            fh.write(np.ascontiguousarray(self.lines, dtype='<i4').tobytes())
+            for face in faces:
+                fh.write(struct.pack("<B", len(face)))
+                fh.write(np.asarray(face, dtype='<i4').tobytes())
+
+    def check3d(self):
+        """ raise ValueError when the mesh is not 3-d """
+        if self.dim() != 3:
+            raise ValueError("only 3-d meshes can be exported, this mesh is %d-d" % self.dim())
+
+
+_meshes = {}
+
+
+# the shapes which only exist in one dimension
+FIXEDDIMS = {
+    'Dodecaeder': 3,
+    'Icosaeder': 3,
+    'Cell24': 4,
+    'Cell120': 4,
+    'Cell600': 4,
+}
+
+
+def makeShape(name, dim):
+    """ construct the shape named in geometry.SHAPES, centered on the origin """
+    cls = geometry.shapeClass(name)
+    if dim < 1 or FIXEDDIMS.get(cls.__name__, dim) != dim:
+        raise ValueError("there is no %d-d %s" % (dim, name))
+    if cls is Axis:
+        return Axis(dim)
+    return cls(Point([0.0]*dim))
+
+
+def shapeMesh(name, dim, faces=True):
+    """
+    Return the mesh of a shape from geometry.SHAPES, it is generated only once.
+
+    When the on-disk cache from geometry.cache is enabled, the mesh is loaded from there.
+    """
+    key = name, dim, faces
+    if key not in _meshes:
+        from geometry import cache
+        if cache.cacheDir() is not None:
+            mesh = cache.cachedMesh(name, dim, faces)
+        else:
+            mesh = Mesh.fromShape(makeShape(name, dim), faces)
+        for a in (mesh.points, mesh.lines, mesh.faceindices, mesh.faceoffsets):
+            if a is not None:
+                a.setflags(write=False)
+        _meshes[key] = mesh
+    return _meshes[key]
+
+
+import unittest
+class TestMesh(unittest.TestCase):
+    """ tests for meshes and their file formats """
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir)
+
+    def test_registry(self):
+        """ meshes match their shape, and are only generated once """
+        from geometry.platonic import Cube
+        m = shapeMesh("cube", 4)
+        self.assertTrue(m is shapeMesh("cube", 4))
+        self.assertEqual(m.points.shape, (16, 4))
+        self.assertEqual(len(m.lines), 32)
+        self.assertEqual(len(m.faces()), 24)
+        self.assertEqual(m.lines.tolist(), [list(l) for l in Cube(Point(0,0,0,0)).generateLines()])
+        self.assertEqual(len(shapeMesh("axis", 3).lines), 3)
+        self.assertRaises(ValueError, shapeMesh, "dodeca", 4)
+        for name, dim in (("cell24", 3), ("icosa", 2), ("tetra", 0), ("cube", -1)):
+            self.assertRaises(ValueError, makeShape, name, dim)
+
+    def test_binary(self):
+        """ saved meshes load as memory maps """
+        import os
+        m = shapeMesh("dodeca", 3)
+        name = os.path.join(self.tmpdir, "dodeca.mesh")
+        m.save(name)
+        loaded = Mesh.load(name)
+        self.assertTrue(isinstance(loaded.points, np.memmap))
+        self.assertTrue(np.array_equal(loaded.points, m.points))
+        self.assertTrue(np.array_equal(loaded.lines, m.lines))
+        self.assertEqual([f.tolist() for f in loaded.faces()], [f.tolist() for f in m.faces()])
+
+        Mesh(np.zeros((2, 5)), np.array([[0, 1]])).save(name)
+        loaded = Mesh.load(name, mmap=False)
+        self.assertEqual(loaded.dim(), 5)
+        self.assertFalse(loaded.hasFaces())
+
+    def test_export(self):
+        """ OBJ and PLY files have all points, lines and faces """
+        import os
+        m = shapeMesh("icosa", 3)
+        name = os.path.join(self.tmpdir, "icosa.obj")
+        m.writeOBJ(name)
+        with open(name) as fh:
+            kinds = [line.split()[0] for line in fh]
+        self.assertEqual([kinds.count(k) for k in "vlf"], [12, 30, 20])
+
+        name = os.path.join(self.tmpdir, "icosa.ply")
+        m.writePLY(name)
+        with open(name, "rb") as fh:
+            data = fh.read()
+        header, body = data.split(b"end_header\n")
+        self.assertTrue(b"element face 20" in header)
+        self.assertEqual(len(body), 12*3*8 + 30*2*4 + 20*(1+3*4))
+        self.assertRaises(ValueError, shapeMesh("cube", 4).writeOBJ, name)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,208 @@
+"""
+Screen space index for finding the point or line segment nearest to the mouse.
+
+The projected points and line segments are put in a uniform grid of square
+cells, a query only looks at the cells around the query position.
+"""
+from __future__ import division, print_function
+import numpy as np
+from geometry.raster import clipSegments
+
+
+class GridIndex(object):
+    """ uniform grid over projected 2-d points and line segments """
+    def __init__(self, points, lines=None, cellsize=16, bounds=None):
+        """
+        Construct the index from an (N, 2) array of screen positions, and an (E, 2) array of
+        point index pairs.  Points which are not finite are left out.
+
+        With bounds=(width, height) the grid only covers the screen,
+        and only the on screen parts of lines are indexed.
+        """
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.lines = np.zeros((0, 2), dtype=int) if lines is None else np.asarray(lines, dtype=int).reshape(-1, 2)
+        self.cellsize = float(cellsize)
+
+        finite = np.isfinite(self.points).all(axis=1)
+        if bounds:
+            self.origin = np.zeros(2)
+            self.shape = tuple(int(x) for x in np.ceil(np.array(bounds)/self.cellsize))
+            finite &= (self.points >= 0).all(axis=1) & (self.points < bounds).all(axis=1)
+        elif finite.any():
+            self.origin = self.points[finite].min(axis=0)
+            self.shape = tuple(self.cellOf(self.points[finite]).max(axis=0)+1)
+        else:
+            self.origin = np.zeros(2)
+            self.shape = (1, 1)
+
+        ids = np.flatnonzero(finite)
+        self.pointcells = self.buildCells(self.cellId(self.cellOf(self.points[ids])), ids)
+
+        segments = self.points[self.lines].reshape(-1, 4)-np.tile(self.origin, 2)
+        size = np.array(self.shape)*self.cellsize
+        segments, t0, t1, keep = clipSegments(segments, size[0]+1, size[1]+1)
+        cells, owners = self.lineCells(segments+np.tile(self.origin, 2), np.flatnonzero(keep))
+        self.linecells = self.buildCells(cells, owners)
+
+    def cellOf(self, xy):
+        """ return the (N, 2) integer cell coordinates of positions """
+        return np.floor((xy-self.origin)/self.cellsize).astype(int)
+
+    def cellId(self, cell):
+        """ return flat cell numbers, cells outside the grid are clamped to its border """
+        cx = np.clip(cell[:, 0], 0, self.shape[0]-1)
+        cy = np.clip(cell[:, 1], 0, self.shape[1]-1)
+        return cx*self.shape[1]+cy
+
+    def buildCells(self, cells, items):
+        """ sort items by cell, returns start offsets per cell and the sorted items """
+        order = np.argsort(cells, kind='mergesort')
+        starts = np.searchsorted(cells[order], np.arange(self.shape[0]*self.shape[1]+1))
+        return starts, items[order]
+
+    def lineCells(self, segments, lines):
+        """ return (cell, line) pairs for all cells touched by the (N, 4) segments of the lines """
+        # in cell units, from left to right
+        c = (segments-np.tile(self.origin, 2))/self.cellsize
+        swap = c[:, 2] < c[:, 0]
+        c[swap] = c[swap][:, [2, 3, 0, 1]]
+        x0, y0, x1, y1 = c.T
+        dx = x1-x0
+        slope = np.where(dx > 0, (y1-y0)/np.where(dx > 0, dx, 1), 0)
+
+        # each column of cells the segment passes, with the segment's y range within that column
+        first = np.floor(x0).astype(int)
+        which, col = self.expand(first, np.floor(x1).astype(int)-first+1)
+        xa = np.maximum(col, x0[which])
+        xb = np.minimum(col+1, x1[which])
+        ya = np.where(dx[which] > 0, y0[which]+(xa-x0[which])*slope[which], y0[which])
+        yb = np.where(dx[which] > 0, y0[which]+(xb-x0[which])*slope[which], y1[which])
+
+        # and each cell in that y range
+        lo = np.floor(np.minimum(ya, yb)).astype(int)
+        rows, row = self.expand(lo, np.floor(np.maximum(ya, yb)).astype(int)-lo+1)
+        cells = self.cellId(np.column_stack([col[rows], row]))
+        pairs = np.unique(np.column_stack([cells, lines[which[rows]]]), axis=0).reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    @staticmethod
+    def expand(first, counts):
+        """ return (item, value) arrays, with first[i] .. first[i]+counts[i]-1 for each item i """
+        which = np.repeat(np.arange(len(first)), counts)
+        return which, np.arange(counts.sum())-np.repeat(np.cumsum(counts)-counts-first, counts)
+
+    def candidates(self, cells, pos, maxdist):
+        """ return the items in the cells within maxdist of pos """
+        starts, items = cells
+        lo = self.cellOf(np.asarray(pos, dtype=float)[None, :]-maxdist)[0]
+        hi = self.cellOf(np.asarray(pos, dtype=float)[None, :]+maxdist)[0]
+        # items outside the grid are in its border cells
+        lo = np.clip(lo, 0, np.array(self.shape)-1)
+        hi = np.clip(hi, 0, np.array(self.shape)-1)
+        found = []
+        for cx in range(lo[0], hi[0]+1):
+            first = cx*self.shape[1]
+            found.append(items[starts[first+lo[1]]:starts[first+hi[1]+1]])
+        return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=int)
+
+    def nearestPoint(self, pos, maxdist=8):
+        """ return the index of the point nearest to pos, None when none is within maxdist """
+        ids = self.candidates(self.pointcells, pos, maxdist)
+        if not len(ids):
+            return None
+        dist = np.sqrt(((self.points[ids]-pos)**2).sum(axis=1))
+        best = np.argmin(dist)
+        return int(ids[best]) if dist[best] <= maxdist else None
+
+    def nearestLine(self, pos, maxdist=4):
+        """ return the index of the line segment nearest to pos, None when none is within maxdist """
+        ids = self.candidates(self.linecells, pos, maxdist)
+        if not len(ids):
+            return None
+        dist = segmentDistance(self.points[self.lines[ids, 0]], self.points[self.lines[ids, 1]], pos)
+        best = np.argmin(dist)
+        return int(ids[best]) if dist[best] <= maxdist else None
+
+    def pick(self, pos, pointdist=6, linedist=4):
+        """ return ('point', index) or ('line', index) for the item under pos, points take precedence """
+        i = self.nearestPoint(pos, pointdist)
+        if i is not None:
+            return 'point', i
+        i = self.nearestLine(pos, linedist)
+        if i is not None:
+            return 'line', i
+
+
+def segmentDistance(p, q, pos):
+    """ return the distance of pos to each of the segments p-q """
+    v = q-p
+    u = np.asarray(pos, dtype=float)-p
+    vv = (v*v).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(np.where(vv > 0, (u*v).sum(axis=1)/vv, 0), 0, 1)
+    return np.sqrt(((u-v*t[:, None])**2).sum(axis=1))
+
+
+import unittest
+class TestGridIndex(unittest.TestCase):
+    """ tests for the picking index """
+    def test_points(self):
+        """ find the nearest point, compare with brute force """
+        pts = np.random.uniform(0, 500, (1000, 2))
+        idx = GridIndex(pts, cellsize=10)
+        for pos in np.random.uniform(-10, 510, (50, 2)):
+            d = np.sqrt(((pts-pos)**2).sum(axis=1))
+            found = idx.nearestPoint(pos, 8)
+            if d.min() <= 8:
+                self.assertEqual(found, np.argmin(d))
+            else:
+                self.assertEqual(found, None)
+
+    def test_lines(self):
+        """ find the nearest segment, compare with brute force """
+        pts = np.random.uniform(0, 300, (200, 2))
+        lines = np.random.randint(0, 200, (300, 2))
+        idx = GridIndex(pts, lines, cellsize=12)
+        for pos in np.random.uniform(0, 300, (50, 2)):
+            d = segmentDistance(pts[lines[:,0]], pts[lines[:,1]], pos)
+            found = idx.nearestLine(pos, 5)
+            if d.min() <= 5:
+                self.assertAlmostEqual(d[found], d.min())
+            else:
+                self.assertEqual(found, None)
+
+    def test_corner(self):
+        """ a segment clipping only the corner of a cell is indexed in that cell """
+        idx = GridIndex([[2, 11.95], [32, 41.95], [0, 0], [40, 40]], [(0, 1)], cellsize=10)
+        starts, items = idx.linecells
+        cell = idx.cellId(np.array([[1, 1]]))[0]
+        self.assertEqual(items[starts[cell]:starts[cell+1]].tolist(), [0])
+        # and only in the cells it touches
+        touched = [c for c in range(idx.shape[0]*idx.shape[1]) if starts[c+1] > starts[c]]
+        self.assertEqual(touched, sorted(idx.cellId(np.array([(0, 1), (1, 1), (1, 2), (2, 2), (2, 3), (3, 3), (3, 4)]))))
+
+        # a vertical segment, and a single point segment
+        idx = GridIndex([[5, 5], [5, 35], [25, 25], [0, 0], [40, 40]], [(0, 1), (2, 2)], cellsize=10)
+        cells, lines = idx.lineCells(idx.points[idx.lines].reshape(-1, 4), np.arange(2))
+        self.assertEqual(sorted(zip(lines.tolist(), cells.tolist())), [(0, c) for c in idx.cellId(np.array([(0, 0), (0, 1), (0, 2), (0, 3)]))]+[(1, idx.cellId(np.array([(2, 2)]))[0])])
+
+    def test_infinite(self):
+        """ points at infinity are ignored """
+        idx = GridIndex([[0,0], [np.inf, 0], [10,10]], [(0,1), (0,2)])
+        self.assertEqual(idx.nearestPoint((9,9)), 2)
+        self.assertEqual(idx.nearestLine((5,6)), 1)
+        self.assertEqual(idx.pick((5,6)), ('line', 1))
+        self.assertEqual(idx.pick((1,1)), ('point', 0))
+        self.assertEqual(idx.pick((50,50)), None)
+
+    def test_bounds(self):
+        """ only the on screen parts are indexed """
+        idx = GridIndex([[10,10], [1e12,10], [-5,-5], [30, 20]], [(0,1), (2,3)], bounds=(40,30))
+        self.assertEqual(idx.nearestPoint((-4,-4)), None)
+        self.assertEqual(idx.nearestPoint((29,19)), 3)
+        self.assertEqual(idx.nearestLine((35,11)), 0)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
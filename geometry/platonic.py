@@ -4,9 +4,61 @@ Generate the platonic solids.
 Copyright (C) 2016 Willem Hengeveld <itsme@xs4all.nl>
 """
 from __future__ import division, print_function
+import itertools
 import math
+from geometry import LazyModule
 from geometry.base import Point
 
+# numpy is only imported when the first shape is generated
+np = LazyModule('numpy')
+
+
+def signBits(count, nbits):
+    """
+    Return a (count, nbits) array with the sign patterns of the numbers 0 .. count-1:
+    -1.0 where bit j of i is set, otherwise 1.0.
+    """
+    return 1.0-2.0*((np.arange(count)[:, None] >> np.arange(nbits)) & 1)
+
+
+def positiveZeros(a):
+    """ replace negative zeros in a by 0.0, where the Point generators yielded integer zeros """
+    a[a==0] = 0.0
+    return a
+
+
+def arrayPoints(a):
+    """ yield the rows of an (N, dim) array as Points """
+    for row in a.tolist():
+        yield Point(row)
+
+
+def distancePairs(points, distance, tolerance=0.001):
+    """ yield the index pairs a, b with b < a, of the points at the given distance from each other """
+    from geometry.kdtree import KDTree
+    a = np.array([p.coord for p in points])
+    pairs = KDTree(a).queryPairs(distance+tolerance)
+    d = np.sqrt(((a[pairs[:, 0]]-a[pairs[:, 1]])**2).sum(axis=1))
+    for i, j in pairs[np.abs(d-distance) < tolerance].tolist():
+        yield i, j
+
+
+def adjacencyOf(shape):
+    """ return the edge graph of a shape in CSR form, it is generated only once """
+    if getattr(shape, 'graph', None) is None:
+        from geometry.graph import Graph
+        from geometry import stream
+        if type(shape).__name__ in stream.STREAMS:
+            lines = np.concatenate([np.zeros((0, 2), dtype=np.int64)]+list(stream.lineBlocks(type(shape), shape.p0)))
+        else:
+            lines = np.fromiter(itertools.chain.from_iterable(shape.generateLines()), dtype=np.int64).reshape(-1, 2)
+        shape.graph = Graph.fromLines(lines, len(shape.points))
+    return shape.graph
+
+
+# the even permutations of 4 elements
+EVENPERMS = ((0,1,2,3), (0,2,3,1), (0,3,1,2), (1,0,3,2), (1,2,0,3), (1,3,2,0), (2,0,1,3), (2,1,3,0), (2,3,0,1), (3,0,2,1), (3,1,0,2), (3,2,1,0))
+
 
 class Tetraeder(object):
     """
@@ -20,28 +72,33 @@ class Tetraeder(object):
     """
     def __init__(self, p0):
         """ construct n-tetraeder starting from point p0 """
-        self.points = []
         self.p0 = p0
-        for p in self.generatePoints(p0.dim()):
-            self.points.append(p+p0)
+        self.points = list(arrayPoints(self.generateArray(p0.dim())+p0.coord))
 
     def dim(self):
         """ return dimension of our space """
         return self.p0.dim()
 
+    adjacency = adjacencyOf
+
     @staticmethod
     def generatePoints(dim):
         """ generate base points for n-tetraeder """
+        return arrayPoints(Tetraeder.generateArray(dim))
 
+    @staticmethod
+    def generateArray(dim, start=0, stop=None):
+        """ return the base points for n-tetraeder as a (dim+1, dim) array, or its rows start:stop """
         CENTER = (1.0+dim+math.sqrt(1.0+dim))/((1.0+dim)*dim)
+        rows = np.arange(dim+1)[start:stop]
 
-        p0= Point(CENTER for _ in range(dim))
-
-        # first points along axis
-        for i in range(dim):
-            yield Point(1 if i==j else 0 for j in range(dim))-p0
+        # first points along axis,
         # and a single point at equal distance from others
-        yield Point((1+math.sqrt(dim+1))/dim  for j in range(dim))-p0
+        a = np.zeros((len(rows), dim))
+        axis = rows < dim
+        a[np.nonzero(axis)[0], rows[axis]] = 1.0
+        a[~axis] = (1+math.sqrt(dim+1))/dim
+        return a-CENTER
 
     def generateLines(self):
         """
@@ -66,15 +123,15 @@ class Cube(object):
     """
     def __init__(self, p0):
         """ construct n-cube starting from point p0 """
-        self.points = []
         self.p0 = p0
-        for p in self.generatePoints(p0.dim()):
-            self.points.append(p+p0)
+        self.points = list(arrayPoints(self.generateArray(p0.dim())+p0.coord))
 
     def dim(self):
         """ return dimension of our space """
         return self.p0.dim()
 
+    adjacency = adjacencyOf
+
     @staticmethod
     def generatePoints(dim):
         """
@@ -83,10 +140,12 @@ class Cube(object):
         Each point is assigned a binary number,
         the bits form the coordinates.
         """
-        def bit(x,i):
-            return -1.0 if x&(1<<i) else 1.0
-        for i in range(1<<dim):
-            yield Point(bit(i,j)*0.5 for j in range(dim))
+        return arrayPoints(Cube.generateArray(dim))
+
+    @staticmethod
+    def generateArray(dim):
+        """ return the base points for n-cube as a (2**dim, dim) array """
+        return signBits(1<<dim, dim)*0.5
 
     def generateLines(self):
         """ 
@@ -115,6 +174,86 @@ class Cube(object):
         return x==0
 
 
+class PackedCube(object):
+    """
+    n-cube for very high dimensions, with the vertices stored bit-packed.
+
+    The vertices are not stored at all: vertex i is the integer i, with
+    coordinate j at -0.5 when bit j is set, and at +0.5 otherwise, offset by p0.
+    Same numbering as Cube, so `edgeBlocks` yields the same line segments
+    as `Cube.generateLines`.
+
+    Projections are computed from the packed form, using for each byte of
+    the vertex number a table with the projected sum of the bits in that byte.
+    """
+    def __init__(self, p0):
+        """ construct n-cube starting from point p0 """
+        assert p0.dim() < 63
+        self.p0 = p0
+
+    def dim(self):
+        """ return dimension of our space """
+        return self.p0.dim()
+
+    def __len__(self):
+        """ return the number of vertices """
+        return 1<<self.dim()
+
+    def codes(self, start=0, stop=None):
+        """ return the packed vertices start .. stop as an int64 array """
+        return np.arange(start, len(self) if stop is None else stop, dtype=np.int64)
+
+    def decode(self, start=0, stop=None):
+        """ return the vertices start .. stop as a (N, dim) float array """
+        codes = self.codes(start, stop)
+        return 0.5-((codes[:, None] >> np.arange(self.dim())) & 1) + np.asarray(self.p0.coord, dtype=float)
+
+    def projectionTables(self, matrix):
+        """ return (nbytes, 256, k) tables with the sum of the columns of the (k, dim) matrix selected by each byte value """
+        dim = self.dim()
+        nbytes = (dim+7)//8
+        columns = np.zeros((8*nbytes, len(matrix)))
+        columns[:dim] = np.asarray(matrix, dtype=float).T
+        bits = (np.arange(256)[:, None] >> np.arange(8)) & 1
+        return np.array([bits.dot(columns[8*i:8*i+8]) for i in range(nbytes)])
+
+    def project(self, matrix, offset=None, start=0, stop=None, tables=None):
+        """
+        Return the vertices start .. stop mapped as `points.dot(matrix.T)+offset`,
+        as a (N, k) array, without decoding the vertices.
+        """
+        matrix = np.asarray(matrix, dtype=float)
+        if tables is None:
+            tables = self.projectionTables(matrix)
+        codes = self.codes(start, stop)
+        base = matrix.dot(np.asarray(self.p0.coord, dtype=float)+0.5)
+        if offset is not None:
+            base = base+offset
+        result = np.empty((len(codes), len(matrix)))
+        result[:] = base
+        for i, table in enumerate(tables):
+            result -= table[(codes >> 8*i) & 255]
+        return result
+
+    def projectBlocks(self, matrix, offset=None, blocksize=1<<16):
+        """ yield (start, projected vertices) for consecutive blocks of vertices """
+        tables = self.projectionTables(matrix)
+        for start in range(0, len(self), blocksize):
+            yield start, self.project(matrix, offset, start, min(start+blocksize, len(self)), tables)
+
+    def edgeBlocks(self, blocksize=1<<16):
+        """
+        Yield the line segments as (E, 2) arrays of point indices, for the vertices
+        in consecutive blocks of vertices, in the order of `Cube.generateLines`.
+        """
+        bits = np.int64(1) << np.arange(self.dim()-1, -1, -1, dtype=np.int64)
+        for start in range(0, len(self), blocksize):
+            a = self.codes(start, min(start+blocksize, len(self)))
+            connected = (a[:, None] & bits) != 0
+            yield np.stack([np.broadcast_to(a[:, None], connected.shape)[connected],
+                            (a[:, None] ^ bits)[connected]], axis=1)
+
+
 class Octaeder(object):
     """
     Generate n-octaeder points and line segments.
@@ -126,15 +265,15 @@ class Octaeder(object):
     """
     def __init__(self, p0):
         """ construct n-octaeder starting from point p0 """
-        self.points = []
         self.p0 = p0
-        for p in self.generatePoints(p0.dim()):
-            self.points.append(p+p0)
+        self.points = list(arrayPoints(self.generateArray(p0.dim())+p0.coord))
 
     def dim(self):
         """ return dimension of our space """
         return self.p0.dim()
 
+    adjacency = adjacencyOf
+
     @staticmethod
     def generatePoints(dim):
         """
@@ -145,9 +284,15 @@ class Octaeder(object):
         Points are yielded such that p[2*i] and p[2*i+1] are on the
         same axis.
         """
-        for i in range(dim):
-            yield Point(1 if i==j else 0 for j in range(dim))
-            yield Point(-1 if i==j else 0 for j in range(dim))
+        return arrayPoints(Octaeder.generateArray(dim))
+
+    @staticmethod
+    def generateArray(dim, start=0, stop=None):
+        """ return the base points for n-octaeder as a (2*dim, dim) array, or its rows start:stop """
+        rows = np.arange(2*dim)[start:stop]
+        a = np.zeros((len(rows), dim))
+        a[np.arange(len(rows)), rows//2] = 1.0-2.0*(rows & 1)
+        return a
 
     def generateLines(self):
         """ 
@@ -163,6 +308,18 @@ class Octaeder(object):
                     yield a, b
 
 
+def cyclicRectangles(phi, size):
+    """
+    Return the (12, 3) corners of three rectangles in the cyclic permutations of the
+    coordinate planes: coordinate k of corner i of rectangle j is +-size*phi[(k+j)%3].
+    """
+    i = np.arange(4)[None, :, None]
+    j = np.arange(3)[:, None, None]
+    k = np.arange(3)[None, None, :]
+    sign = np.where((i>>((k+j-1)%3))&1, size, -size)
+    return (sign*np.array(phi, dtype=float)[(k+j)%3]).reshape(-1, 3)
+
+
 class Dodecaeder(object):
     """
     Generate dodecaeder points and line segments
@@ -175,38 +332,33 @@ class Dodecaeder(object):
     def __init__(self, p0):
         """ construct dodecaeder starting from point p0 """
         assert(p0.dim()==3)
-        self.points = []
         self.p0 = p0
-        for p in self.generatePoints(p0.dim()):
-            self.points.append(p+p0)
+        self.points = list(arrayPoints(self.generateArray(p0.dim())+p0.coord))
 
     def dim(self):
         """ return dimension of our space """
         return self.p0.dim()
 
+    adjacency = adjacencyOf
+
     @staticmethod
     def generatePoints(dim):
         """ generate base points for dodecaeder """
-        pm = (-1, 1)
-        PHI=(1+math.sqrt(5))/2
-        phi = [0, 1/PHI, PHI]
+        return arrayPoints(Dodecaeder.generateArray(dim))
 
-        for i in range(8):
-            yield Point(pm[(i>>j)&1] for j in range(3))
-        for j in range(3):
-            for i in range(4):
-                yield Point(pm[(i>>((k+j-1)%3))&1]*phi[(k+j)%3] for k in range(3))
+    @staticmethod
+    def generateArray(dim):
+        """ return the base points for dodecaeder as a (20, 3) array """
+        PHI=(1+math.sqrt(5))/2
+        # the corners of a cube, and three rectangles
+        return np.vstack([-signBits(8, 3), positiveZeros(cyclicRectangles([0, 1/PHI, PHI], 1.0))])
 
     def generateLines(self):
         """ Enumerate the line segments for the dodecaeder """
         EDGELEN = 4/(1+math.sqrt(5))
 
-        # basically brute forcing lines, as those points which are
-        # EDGELEN distant from each other.
-        for a in range(1, 20):
-            for b in range(0, a):
-                if abs(self.points[a].distance(self.points[b]) - EDGELEN) < 0.001:
-                    yield a, b
+        # lines are between those points which are EDGELEN distant from each other.
+        return distancePairs(self.points, EDGELEN)
 
 
 class Icosaeder(object):
@@ -220,36 +372,46 @@ class Icosaeder(object):
     def __init__(self, p0):
         """ construct icosaeder starting from point p0 """
         assert(p0.dim()==3)
-        self.points = []
         self.p0 = p0
-        for p in self.generatePoints(p0.dim()):
-            self.points.append(p+p0)
+        self.points = list(arrayPoints(self.generateArray(p0.dim())+p0.coord))
 
     def dim(self):
         """ return dimension of our space """
         return self.p0.dim()
 
+    adjacency = adjacencyOf
+
     @staticmethod
     def generatePoints(dim):
         """ generate base points for icosaeder """
-        pm = (-0.5, 0.5)
-        PHI=(1+math.sqrt(5))/2
-        phi = [0, 1.0, PHI]
+        return arrayPoints(Icosaeder.generateArray(dim))
 
-        for j in range(3):
-            for i in range(4):
-                yield Point(pm[(i>>((k+j-1)%3))&1]*phi[(k+j)%3] for k in range(3))
+    @staticmethod
+    def generateArray(dim):
+        """ return the base points for icosaeder as a (12, 3) array """
+        PHI=(1+math.sqrt(5))/2
+        # three golden rectangles
+        return cyclicRectangles([0, 1.0, PHI], 0.5)
 
     def generateLines(self):
         """ Enumerate the line segments for the icosaeder """
         EDGELEN = 1.0
 
-        # basically brute forcing lines, as those points which are
-        # EDGELEN distant from each other.
-        for a in range(1, 12):
-            for b in range(0, a):
-                if abs(self.points[a].distance(self.points[b]) - EDGELEN) < 0.001:
-                    yield a, b
+        # lines are between those points which are EDGELEN distant from each other.
+        return distancePairs(self.points, EDGELEN)
+
+
+def pairPoints(values):
+    """
+    Return (24, 4) points with two non zero coordinates, for each pair of axes a > b,
+    and each of the four rows of values: p[a] = values[i,0], p[b] = values[i,1].
+    """
+    pairs = np.array([(a, b) for a in range(1,4) for b in range(a)])
+    rows = np.arange(24)
+    p = np.zeros((24, 4))
+    p[rows, np.repeat(pairs[:, 0], 4)] = np.tile(values[:, 0], 6)
+    p[rows, np.repeat(pairs[:, 1], 4)] = np.tile(values[:, 1], 6)
+    return p
 
 
 class Cell24(object):
@@ -260,15 +422,15 @@ class Cell24(object):
     def __init__(self, p0):
         """ construct 24-cell starting from point p0 """
         assert(p0.dim()==4)
-        self.points = []
         self.p0 = p0
-        for p in self.generatePoints(p0.dim()):
-            self.points.append(p+p0)
+        self.points = list(arrayPoints(self.generateArray(p0.dim())+p0.coord))
 
     def dim(self):
         """ return dimension of our space """
         return self.p0.dim()
 
+    adjacency = adjacencyOf
+
 
     @staticmethod
     def generatePoints1(dim):
@@ -287,29 +449,21 @@ class Cell24(object):
 
     @staticmethod
     def generatePoints(dim):
-        assert(dim==4)
-        def bit(x,i):
-            return -1.0 if x&(1<<i) else 1.0
+        return arrayPoints(Cell24.generateArray(dim))
 
+    @staticmethod
+    def generateArray(dim):
+        """ return the base points for the 24-cell as a (24, 4) array """
+        assert(dim==4)
         # (1,1,0,0)                -> 4 * 6
-        for a in range(1,4):
-            for b in range(a):
-                for i in range(4):
-                    p= [0 for _ in range(4)]
-                    p[a]= bit(i,0)/math.sqrt(2.0)
-                    p[b]= bit(i,1)/math.sqrt(2.0)
-                    yield Point(p)
+        return pairPoints(signBits(4, 2)/math.sqrt(2.0))
 
     def generateLines(self):
         """ Enumerate the line segments for the 24-cell """
         EDGELEN = 1.0
 
-        # basically brute forcing lines, as those points which are
-        # EDGELEN distant from each other.
-        for a in range(1, 24):
-            for b in range(0, a):
-                if abs(self.points[a].distance(self.points[b]) - EDGELEN) < 0.001:
-                    yield a, b
+        # lines are between those points which are EDGELEN distant from each other.
+        return distancePairs(self.points, EDGELEN)
 
 
 
@@ -322,72 +476,65 @@ class Cell120(object):
     def __init__(self, p0):
         """ construct 120-cell starting from point p0 """
         assert(p0.dim()==4)
-        self.points = []
         self.p0 = p0
-        for p in self.generatePoints(p0.dim()):
-            self.points.append(p+p0)
+        self.points = list(arrayPoints(self.generateArray(p0.dim())+p0.coord))
 
     def dim(self):
         """ return dimension of our space """
         return self.p0.dim()
 
+    adjacency = adjacencyOf
+
 
     @staticmethod
     def generatePoints(dim):
+        return arrayPoints(Cell120.generateArray(dim))
+
+    @staticmethod
+    def generateArray(dim):
+        """ return the base points for the 120-cell as a (600, 4) array """
         assert(dim==4)
         SQ5 = math.sqrt(5.0)
         PHI = (1.0+SQ5)/2.0
 
-        def bit(x,i):
-            return -1.0 if x&(1<<i) else 1.0
-
         # perms of:
         #  0022 0202 0220 2020 2200 2002
         # (0,0,2, 2)             -> 4*6
-        for a in range(1,4):
-            for b in range(a):
-                for i in range(4):
-                    p= [0 for _ in range(4)]
-                    p[a]= 2.0*bit(i,0)
-                    p[b]= 2.0*bit(i,1)
-                    yield Point(p)
+        part1 = pairPoints(2.0*signBits(4, 2))
 
         #  0001 0010 0100 1000
         # (1,1,1,SQ5)            -> 16*4
         # (PHI**-2, PHI,PHI,PHI) -> 16*4
         # (PHI**-1, PHI**-1,PHI**-1, PHI**2)  -> 16*4
-        for a in range(16):
-            for i in range(4):
-                yield Point(bit(a,j)*(SQ5 if i==j else 1.0) for j in range(4))
-                yield Point(bit(a,j)*(PHI**-2 if i==j else PHI) for j in range(4))
-                yield Point(bit(a,j)*(PHI**2 if i==j else PHI**-1) for j in range(4))
+        diagonal = np.array([SQ5, PHI**-2, PHI**2])
+        other = np.array([1.0, PHI, PHI**-1])
+        # size[i, t, j]: coordinate j of type t, with the odd coordinate at i
+        size = np.where(np.identity(4, dtype=bool)[:, None, :], diagonal[None, :, None], other[None, :, None])
+        part2 = (signBits(16, 4)[:, None, None, :]*size[None]).reshape(-1, 4)
 
         # even perms of:
         # 0123 0231 0312 1032 1203 1320 2013 2130 2301 3021 3102 3210
         # (0, PHI**-2, 1, PHI**2)  -> 12*8
         # (0, PHI**-1, PHI, SQ5)   -> 12*8
         # (PHI**-1, 1, PHI, 2)     -> 12*16
-        for a in range(16):
-            p0= (0, bit(a,2)*PHI**-2, bit(a,1), bit(a,0)*PHI**2)
-            p1= (0, bit(a,2)*PHI**-1, bit(a,1)*PHI, bit(a,0)*SQ5)
-            p2= (bit(a,3)*PHI**-1, bit(a,2), bit(a,1)*PHI, bit(a,0)*2.0)
-            for perm in ( (0,1,2,3), (0,2,3,1), (0,3,1,2), (1,0,3,2), (1,2,0,3), (1,3,2,0), (2,0,1,3), (2,1,3,0), (2,3,0,1), (3,0,2,1), (3,1,0,2), (3,2,1,0)):
-                if a<8:
-                    yield Point(p0[perm[0]], p0[perm[1]], p0[perm[2]], p0[perm[3]])
-                    yield Point(p1[perm[0]], p1[perm[1]], p1[perm[2]], p1[perm[3]])
-                yield Point(p2[perm[0]], p2[perm[1]], p2[perm[2]], p2[perm[3]])
+        bits = signBits(16, 4)
+        p0 = np.column_stack([np.zeros(16), bits[:, 2]*PHI**-2, bits[:, 1], bits[:, 0]*PHI**2])
+        p1 = np.column_stack([np.zeros(16), bits[:, 2]*PHI**-1, bits[:, 1]*PHI, bits[:, 0]*SQ5])
+        p2 = np.column_stack([bits[:, 3]*PHI**-1, bits[:, 2], bits[:, 1]*PHI, bits[:, 0]*2.0])
+        perms = np.array(EVENPERMS)
+        # the first 8 sign patterns yield all three points per permutation, the others only p2
+        first = np.stack([p0[:8, perms], p1[:8, perms], p2[:8, perms]], axis=2).reshape(-1, 4)
+        part3 = np.vstack([first, p2[8:, perms].reshape(-1, 4)])
+
+        return np.vstack([part1, part2, part3])
 
 
     def generateLines(self):
         """ Enumerate the line segments for the 120-cell """
         EDGELEN = 3.0-math.sqrt(5.0)
 
-        # basically brute forcing lines, as those points which are
-        # EDGELEN distant from each other.
-        for a in range(1, 600):
-            for b in range(0, a):
-                if abs(self.points[a].distance(self.points[b]) - EDGELEN) < 0.001:
-                    yield a, b
+        # lines are between those points which are EDGELEN distant from each other.
+        return distancePairs(self.points, EDGELEN)
 
 
 class Cell600(object):
@@ -397,52 +544,84 @@ class Cell600(object):
     def __init__(self, p0):
         """ construct 600-cell starting from point p0 """
         assert(p0.dim()==4)
-        self.points = []
         self.p0 = p0
-        for p in self.generatePoints(p0.dim()):
-            self.points.append(p+p0)
+        self.points = list(arrayPoints(self.generateArray(p0.dim())+p0.coord))
 
     def dim(self):
         """ return dimension of our space """
         return self.p0.dim()
 
+    adjacency = adjacencyOf
+
 
     @staticmethod
     def generatePoints(dim):
+        return arrayPoints(Cell600.generateArray(dim))
+
+    @staticmethod
+    def generateArray(dim):
+        """ return the base points for the 600-cell as a (120, 4) array """
         assert(dim==4)
         SQ5 = math.sqrt(5.0)
         PHI = (1.0+SQ5)/2.0
 
-        def bit(x,i):
-            return -1.0 if x&(1<<i) else 1.0
-
         # (0.5,0.5,0.5,0.5)        -> 1 * 16
-        for i in range(16):
-            yield Point(0.5*bit(i,j) for j in range(4))
+        part1 = 0.5*signBits(16, 4)
 
         # (0,0,0,1)                -> 4 * 2
-        for i in range(4):
-            for b in range(2):
-                yield Point(bit(b,0) if i==j else 0 for j in range(4))
+        part2 = Octaeder.generateArray(4)
 
         # even perms of:
         # (PHI, 1, 1/PHI, 0)/2     -> 12 * 8
-        for a in range(8):
-            p0= (0, bit(a,2)*PHI/2.0, bit(a,1)/2.0, bit(a,0)/2.0/PHI)
-            for perm in ( (0,1,2,3), (0,2,3,1), (0,3,1,2), (1,0,3,2), (1,2,0,3), (1,3,2,0), (2,0,1,3), (2,1,3,0), (2,3,0,1), (3,0,2,1), (3,1,0,2), (3,2,1,0)):
-                yield Point(p0[perm[0]], p0[perm[1]], p0[perm[2]], p0[perm[3]])
+        bits = signBits(8, 3)
+        p0 = np.column_stack([np.zeros(8), bits[:, 2]*PHI/2.0, bits[:, 1]/2.0, bits[:, 0]/2.0/PHI])
+        part3 = p0[:, np.array(EVENPERMS)].reshape(-1, 4)
+
+        return np.vstack([part1, part2, part3])
 
     def generateLines(self):
         """ Enumerate the line segments for the 600-cell """
         PHI = (1.0+math.sqrt(5.0))/2.0
         EDGELEN = 1.0/PHI
 
-        # basically brute forcing lines, as those points which are
-        # EDGELEN distant from each other.
-        for a in range(1, 120):
-            for b in range(0, a):
-                if abs(self.points[a].distance(self.points[b]) - EDGELEN) < 0.001:
-                    yield a, b
+        # lines are between those points which are EDGELEN distant from each other.
+        return distancePairs(self.points, EDGELEN)
+
+
+
+def faceCycles(lines):
+    """
+    Enumerate the 2-d faces of a regular polytope from its line segments.
+
+    The faces are the shortest cycles in the graph formed by the line segments,
+    each face is yielded as a tuple of point indices, in order around the face.
+    """
+    neighbours = {}
+    for a, b in lines:
+        neighbours.setdefault(a, set()).add(b)
+        neighbours.setdefault(b, set()).add(a)
+
+    def extend(path, length):
+        """ yield cycles of `length` starting with path, all points larger than path[0] """
+        last = path[-1]
+        if len(path)==length:
+            # each cycle is found in two directions, keep only one
+            if path[0] in neighbours[last] and path[1] < last:
+                yield tuple(path)
+            return
+        for n in neighbours[last]:
+            if n > path[0] and n not in path:
+                for cycle in extend(path+[n], length):
+                    yield cycle
+
+    for length in range(3, len(neighbours)+1):
+        found = False
+        for start in sorted(neighbours):
+            for cycle in extend([start], length):
+                found = True
+                yield cycle
+        if found:
+            return
 
 
 
@@ -489,6 +668,54 @@ class TestShape(unittest.TestCase):
             self.assertAlmostEqual(t.points[a].distance(t.points[b]), edgelen)
         self.assertEqual(count, nlines)
 
+    def test_arrays(self):
+        """ the array generators give the points of the original point generators, in the same order """
+        import hashlib
+        self.assertEqual(Tetraeder.generateArray(3).tolist(), [[0.5, -0.5, -0.5], [-0.5, 0.5, -0.5], [-0.5, -0.5, 0.5], [0.5, 0.5, 0.5]])
+        self.assertEqual(Octaeder.generateArray(3).tolist(), [[1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]])
+        self.assertEqual(Cube.generateArray(3).tolist(), [[x, y, z] for z in (0.5, -0.5) for y in (0.5, -0.5) for x in (0.5, -0.5)])
+
+        # sha1 of the coordinates rounded to 6 decimals, one line per point
+        for cls, dim, npoints, digest in (
+                (Tetraeder, 3, 4, "e393ccfc2557a8e2406f4cd96bf07c0a5b7da6fc"),
+                (Tetraeder, 5, 6, "ed241c5a62e11c3978c8b755ca012125afd9c8c4"),
+                (Cube, 3, 8, "d88f15a208a140b803c29d4c300d7ee69a320593"),
+                (Cube, 5, 32, "051d99c60e51a963011f806e8e964847f395f8ea"),
+                (Octaeder, 3, 6, "32cc5f87c0accab4855deb8f069b81ea387f0bab"),
+                (Octaeder, 5, 10, "318b99cfcca4c32c13313aabd3fc4c8f401cfc52"),
+                (Dodecaeder, 3, 20, "452248c81d448f311a2517733cf89c32103f0cd0"),
+                (Icosaeder, 3, 12, "c6873c42419b50c66b20fc45f7e1985e4dcd79c3"),
+                (Cell24, 4, 24, "15fcf86d3ec52c347538bb1c018636144dbc763f"),
+                (Cell120, 4, 600, "17b16a1bf785cf57832a492b18dd5033524b2105"),
+                (Cell600, 4, 120, "0092ba63b25fd8686a04c226acd8ebf727eafec2")):
+            a = cls.generateArray(dim)
+            self.assertEqual(a.shape, (npoints, dim))
+            text = "\n".join(",".join("%.6f" % x for x in row) for row in np.round(a, 6)+0.0)
+            self.assertEqual(hashlib.sha1(text.encode()).hexdigest(), digest, cls.__name__)
+
+    def test_faces(self):
+        """ count the 2-d faces of the 3 and 4d shapes """
+        for cls, dim, nfaces in ((Tetraeder, 3, 4), (Cube, 3, 6), (Octaeder, 3, 8), (Dodecaeder, 3, 12), (Icosaeder, 3, 20),
+                                 (Tetraeder, 4, 10), (Cube, 4, 24), (Octaeder, 4, 32), (Cell24, 4, 96), (Cell120, 4, 720), (Cell600, 4, 1200),
+                                 (Cube, 2, 1)):
+            t = cls(Point(0 for x in range(dim)))
+            self.assertEqual(len(list(faceCycles(t.generateLines()))), nfaces)
+
+    def test_packed(self):
+        """ the packed cube matches Cube, also when projected and in blocks """
+        p0 = Point(1, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+        cube, packed = Cube(p0), PackedCube(p0)
+        self.assertEqual(packed.decode().tolist(), [list(p.coord) for p in cube.points])
+        self.assertEqual(np.concatenate(list(packed.edgeBlocks(100))).tolist(), [list(l) for l in cube.generateLines()])
+
+        matrix = np.random.RandomState(1).normal(size=(3, 10))
+        expected = packed.decode().dot(matrix.T)+[1, 2, 3]
+        self.assertTrue(np.allclose(packed.project(matrix, [1, 2, 3]), expected))
+        blocks = list(packed.projectBlocks(matrix, [1, 2, 3], blocksize=300))
+        self.assertEqual([start for start, block in blocks], [0, 300, 600, 900])
+        self.assertTrue(np.allclose(np.concatenate([block for start, block in blocks]), expected))
+        self.assertEqual(len(PackedCube(Point([0.0]*40))), 1<<40)
+
 
 if __name__ == '__main__':
     import sys
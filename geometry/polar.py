@@ -142,6 +142,21 @@ def fromNSpherical(r, *phi):
 
     return (r*math.cos(theta), ) + tuple(r*math.sin(theta)*x for x in fromNSpherical(1.0, *phi[1:]))
 
+
+def fromNSphericalArray(r, phi):
+    """
+    Convert an (N, n-1) array of n-spherical angles to an (N, n) array of cartesian coordinates.
+
+    `r` is either a scalar or an (N,) array of radii.
+    """
+    # numpy is only needed for the array version
+    import numpy as np
+    phi = np.asarray(phi, dtype=float)
+    ones = np.ones((len(phi), 1))
+    sines = np.hstack([ones, np.cumprod(np.sin(phi), axis=1)])
+    cosines = np.hstack([np.cos(phi), ones])
+    return np.reshape(r, (-1, 1))*sines*cosines
+
 # phi1 = arccos(x1/r)
 # phi2 = arccos(x2/(r*sin(phi1))) = arccos(x2/sqrt(r^2-x1^2))
 # phi3 = arccos(x3/(r*sin(phi1)*sin(phi2)))
@@ -196,6 +211,15 @@ class TestNSpherical(unittest.TestCase):
         for i in range(200):
             self._test(*tuple(random.uniform(0, 180) for x in range(2+int(i/10))) + (random.uniform(-180, 180), ))
 
+    def test_array(self):
+        """ the array version matches the scalar conversion """
+        for n in range(2, 7):
+            phi = [[random.uniform(0, math.pi) for _ in range(n-1)] for _ in range(10)]
+            p = fromNSphericalArray(2.0, phi)
+            for row, angles in zip(p, phi):
+                for a, b in zip(row, fromNSpherical(2.0, *angles)):
+                    self.assertAlmostEqual(a, b)
+
     def _test(self, *phi):
         """ handle the actual test """
         p = fromNSpherical(1.0, *(torad(x) for x in phi))
@@ -0,0 +1,155 @@
+"""
+Vectorized projections from n-d to (n-1)-d, and from 3-d onto a viewport.
+
+All functions take an (N, dim) array of points, and project all points
+in a single pass.
+"""
+from __future__ import division, print_function
+import math
+import numpy as np
+from geometry.base import Point, Line, Parallelogram
+
+
+def pointArray(points):
+    """ convert a list of Points to an (N, dim) array """
+    return np.array([p.coord for p in points], dtype=float)
+
+
+def perspective(points, distance):
+    """
+    Project points on the hyperplane x[n-1]==0, as seen from a viewpoint
+    on the last axis at `distance` from the origin.
+    """
+    points = np.asarray(points, dtype=float)
+    with np.errstate(divide='ignore'):
+        scale = distance/(distance-points[:, -1])
+    return points[:, :-1]*scale[:, None]
+
+
+def schlegel(points, margin=0.05):
+    """
+    Schlegel-style projection: the viewpoint is placed on the last axis,
+    just outside the nearest part of the shape, so the rest of the shape
+    is projected inside the part closest to the viewer.
+    """
+    points = np.asarray(points, dtype=float)
+    radius = np.sqrt((points**2).sum(axis=1)).max()
+    return perspective(points, points[:, -1].max()+margin*radius)
+
+
+class Camera(object):
+    """
+    Projects 3-d points onto the plane of a viewport parallelogram.
+
+    With perspective, points are projected along the line towards the viewpoint,
+    this is the same as `viewport.intersectionParams(Line(pt, viewpoint))`.
+    Without perspective points are projected orthogonally onto the viewport plane.
+
+    The result are the viewport parameters of the projected points.
+    """
+    @staticmethod
+    def orbit(distance, latitude, longitude, portdistance):
+        """
+        Construct a camera looking at the origin, from a viewpoint at `distance`,
+        the viewport is placed at fraction `portdistance` between origin and viewpoint.
+        """
+        vp = Point.PointFromNSpherical(distance, latitude, longitude)
+        p1 = Point(-vp.y, vp.x, 0)
+        p2 = Point(0, -vp.z, vp.y)
+        return Camera(vp, Parallelogram.fromPointAndVectors(vp*portdistance, p1, p2))
+
+    def __init__(self, viewpoint, viewport, perspective=True):
+        """ construct camera from viewpoint and viewport """
+        self.viewpoint = np.array(viewpoint.coord, dtype=float)
+        self.viewport = viewport
+        self.origin = np.array(viewport.p1.coord, dtype=float)
+        u = np.array((viewport.p2-viewport.p1).coord, dtype=float)
+        v = np.array((viewport.p3-viewport.p1).coord, dtype=float)
+        self.normal = np.cross(u, v)
+        # maps vectors in the viewport plane to viewport params
+        self.inverse = np.linalg.pinv(np.column_stack([u, v]))
+        self.perspective = perspective
+
+    def project(self, points):
+        """ return (N, 2) array of viewport params for the (N, 3) points """
+        points = np.asarray(points, dtype=float)
+        if self.perspective:
+            d = points-self.viewpoint
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = self.normal.dot(self.origin-self.viewpoint)/d.dot(self.normal)
+            points = self.viewpoint+d*t[:, None]
+        return (points-self.origin).dot(self.inverse.T)
+
+    def depth(self, points):
+        """
+        Return the distance of (N, 3) points to the viewer: the distance to the viewpoint
+        with perspective, otherwise the distance to the plane through the viewpoint.
+        """
+        points = np.asarray(points, dtype=float)
+        if self.perspective:
+            return np.sqrt(((points-self.viewpoint)**2).sum(axis=1))
+        n = self.normal/np.sqrt(self.normal.dot(self.normal))
+        if n.dot(self.viewpoint-self.origin) < 0:
+            n = -n
+        return (self.viewpoint-points).dot(n)
+
+
+def edgeDepths(depth, lines):
+    """ return the depth of each line segment, the mean depth of its endpoints """
+    lines = np.asarray(lines, dtype=int).reshape(-1, 2)
+    return (depth[lines[:, 0]]+depth[lines[:, 1]])/2
+
+
+def painterOrder(depth, lines):
+    """ return the line segment indices ordered from far to near, for drawing back to front """
+    return np.argsort(-edgeDepths(depth, lines), kind='mergesort')
+
+
+import unittest
+class TestProjection(unittest.TestCase):
+    """ tests for projections """
+    def test_perspective(self):
+        """ points on the hyperplane stay put, points further away shrink """
+        p = perspective([[1,2,3,0], [1,1,1,-2]], 2.0)
+        self.assertTrue(np.allclose(p, [[1,2,3], [0.5,0.5,0.5]]))
+
+    def test_schlegel(self):
+        """ the nearest point is projected furthest out """
+        p = schlegel([[0,0,1,0], [0,0,1,1], [0,0,1,-1]])
+        self.assertTrue(np.argmax(abs(p[:,2]))==1)
+
+    def test_camera(self):
+        """ compare with the parallelogram intersection """
+        vp = Point(8,8,8)
+        v = Parallelogram.fromPointAndVectors(Point(4,4,4), Point(-1,-1,2), Point(1,-1,0))
+        cam = Camera(vp, v)
+        pts = [Point(0,0,0), Point(0,1,1), Point(2,-1,3)]
+        ab = cam.project(pointArray(pts))
+        for pt, (a, b) in zip(pts, ab):
+            a1, b1 = v.intersectionParams(Line(pt, vp))
+            self.assertAlmostEqual(a, a1.item())
+            self.assertAlmostEqual(b, b1.item())
+
+    def test_orthographic(self):
+        """ orthographic projection yields the point closest to the viewport plane """
+        v = Parallelogram.fromPointAndVectors(Point(4,4,4), Point(-1,-1,2), Point(1,-1,0))
+        cam = Camera(Point(8,8,8), v, perspective=False)
+        a, b = cam.project([[1,2,3]])[0]
+        q = v.pointForParams(a, b)
+        self.assertAlmostEqual((Point(1,2,3)-q).inner(v.p2-v.p1), 0)
+        self.assertAlmostEqual((Point(1,2,3)-q).inner(v.p3-v.p1), 0)
+
+    def test_depth(self):
+        """ lines are ordered far to near """
+        cam = Camera.orbit(10, math.pi/2, 0.0, 0.5)
+        pts = [[0,10,0], [0,-10,0], [0,0,0], [0,5,0]]
+        for persp in (True, False):
+            cam.perspective = persp
+            d = cam.depth(pts)
+            self.assertTrue(np.allclose(d, [0, 20, 10, 5]))
+            self.assertEqual(list(painterOrder(d, [(0,3), (1,2), (2,3)])), [1, 2, 0])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,306 @@
+"""
+Software rasterizing of projected line segments and faces.
+
+Used for drawing without a gui library, and for hidden line removal
+with a depth buffer.  Screen coordinates are in pixels, with (0,0) in the
+top left corner.  Segments are passed as (N, 4) arrays of x1, y1, x2, y2.
+"""
+from __future__ import division, print_function
+import numpy as np
+
+
+def clipSegments(segments, width, height):
+    """
+    Clip segments to the screen rectangle, using the Liang-Barsky algorithm.
+
+    Returns the clipped segments, the start and end params of the clipped part
+    on the original segments, and a mask of segments which are (partly) on screen.
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    x1, y1 = segments[:, 0], segments[:, 1]
+    dx = segments[:, 2]-x1
+    dy = segments[:, 3]-y1
+    p = np.stack([-dx, dx, -dy, dy], axis=1)
+    q = np.stack([x1, width-1-x1, y1, height-1-y1], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = q/p
+    t0 = np.where(p < 0, r, 0).max(axis=1)
+    t1 = np.where(p > 0, r, 1).min(axis=1)
+    outside = ((p==0) & (q < 0)).any(axis=1)
+    keep = np.isfinite(segments).all(axis=1) & ~outside & (t0 <= t1)
+    t0 = t0[keep]
+    t1 = t1[keep]
+    s = segments[keep]
+    d = s[:, 2:]-s[:, :2]
+    clipped = np.hstack([s[:, :2]+d*t0[:, None], s[:, :2]+d*t1[:, None]])
+    return clipped, t0, t1, keep
+
+
+def sampleSegments(segments):
+    """
+    Sample segments at one point per pixel step.
+
+    Returns for each sample the segment index, and the param along the segment.
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    length = np.abs(segments[:, 2:]-segments[:, :2]).max(axis=1)
+    counts = np.ceil(length).astype(int)+1
+    which = np.repeat(np.arange(len(segments)), counts)
+    step = np.arange(counts.sum())-np.repeat(np.cumsum(counts)-counts, counts)
+    return which, step/np.maximum(counts-1, 1)[which]
+
+
+def sampleTriangles(triangles):
+    """
+    Sample (T, 3, 2) triangles on a grid fine enough to cover every pixel.
+
+    Returns for each sample the triangle index, and (K, 3) barycentric coordinates.
+    """
+    triangles = np.asarray(triangles, dtype=float)
+    edges = triangles-np.roll(triangles, 1, axis=1)
+    sizes = np.ceil(np.abs(edges).max(axis=(1, 2))).astype(int)+1
+    which = []
+    bary = []
+    # triangles of equal size share the same grid of samples
+    for n in np.unique(sizes):
+        i, j = np.nonzero(np.add.outer(np.arange(n), np.arange(n)) < n)
+        grid = np.column_stack([i, j, n-1-i-j])/max(n-1, 1)
+        tris = np.flatnonzero(sizes==n)
+        which.append(np.repeat(tris, len(grid)))
+        bary.append(np.tile(grid, (len(tris), 1)))
+    if not which:
+        return np.zeros(0, dtype=int), np.zeros((0, 3))
+    return np.concatenate(which), np.vstack(bary)
+
+
+def triangulate(faces):
+    """ split faces, given as cycles of point indices, in a fan of triangles """
+    return np.array([(f[0], f[i], f[i+1]) for f in faces for i in range(1, len(f)-1)], dtype=int).reshape(-1, 3)
+
+
+class LineZBuffer(object):
+    """
+    A depth buffer for drawing line segments with hidden parts removed.
+
+    Faces added with addFaces hide the lines behind them, except the lines
+    on their own boundary.  With lines written to the buffer as well, lines also
+    hide the lines just behind them where they cross on screen.
+
+    The cost is linear in the number of pixels covered by the lines and faces.
+    """
+    # faces per buffer, used for encoding (line, face) pairs
+    MAXFACES = 1<<24
+    # owner value for pixels which are nearest on a line
+    LINE = -2
+
+    def __init__(self, width, height):
+        """ construct an empty depth buffer """
+        self.width = int(width)
+        self.height = int(height)
+        self.depth = np.full(self.width*self.height, np.inf)
+        # the face nearest at each pixel
+        self.owner = np.full(self.width*self.height, -1, dtype=np.int64)
+        self.nfaces = 0
+        # sorted (line, face) keys of the lines on the boundary of each face
+        self.boundary = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def lineKeys(a, b, npoints):
+        """ encode the point index pairs of lines, independent of direction """
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        return np.minimum(a, b)*npoints+np.maximum(a, b)
+
+    def index(self, xy):
+        """ return flat buffer indices for (N, 2) pixel positions, and a mask of those on screen """
+        ix = np.floor(xy[:, 0]+0.5).astype(int)
+        iy = np.floor(xy[:, 1]+0.5).astype(int)
+        inside = (ix >= 0) & (ix < self.width) & (iy >= 0) & (iy < self.height)
+        return (iy*self.width+ix)[inside], inside
+
+    def addFaces(self, screen, depth, faces):
+        """
+        Write faces to the depth buffer.
+
+        screen is an (N, 2) array of pixel positions, depth an (N,) array with
+        the distance to the viewer, faces a list of point index cycles.
+        """
+        faces = list(faces)
+        faceids = np.arange(self.nfaces, self.nfaces+len(faces))
+        self.nfaces += len(faces)
+
+        # remember which lines bound which face
+        a = np.concatenate([f for f in faces]+[[]]).astype(int)
+        b = np.concatenate([np.roll(f, -1) for f in faces]+[[]]).astype(int)
+        owners = np.repeat(faceids, [len(f) for f in faces])
+        keys = self.lineKeys(a, b, len(screen))*self.MAXFACES+owners
+        self.boundary = np.union1d(self.boundary, keys)
+
+        tri = triangulate(faces)
+        triface = np.repeat(faceids, [max(len(f)-2, 0) for f in faces])
+        ok = np.isfinite(screen[tri]).all(axis=(1, 2))
+        tri, triface = tri[ok], triface[ok]
+        which, bary = sampleTriangles(screen[tri])
+        corners = tri[which]
+        xy = (screen[corners]*bary[:, :, None]).sum(axis=1)
+        d = (depth[corners]*bary).sum(axis=1)
+        idx, inside = self.index(xy)
+        d = d[inside]
+        np.minimum.at(self.depth, idx, d)
+        nearest = d==self.depth[idx]
+        self.owner[idx[nearest]] = triface[which[inside][nearest]]
+
+    def tolerance(self, screen, depth):
+        """
+        Estimate the depth difference between neighbouring pixels on a face:
+        depth range divided by the size on screen, with some margin.
+        """
+        ok = np.isfinite(depth) & np.isfinite(screen).all(axis=1)
+        if not ok.any():
+            return 0
+        size = max(np.ptp(screen[ok], axis=0).max(), 1)
+        return np.ptp(depth[ok])*(0.01+2.0/size)
+
+    def sampleLines(self, screen, depth, lines):
+        """ return line index, pixel position and depth for each sample of the on screen part of the lines """
+        lines = np.asarray(lines, dtype=int).reshape(-1, 2)
+        clipped, t0, t1, keep = clipSegments(screen[lines].reshape(-1, 4), self.width, self.height)
+        kept = np.flatnonzero(keep)
+        which, t = sampleSegments(clipped)
+        xy = clipped[which, :2]*(1-t)[:, None]+clipped[which, 2:]*t[:, None]
+        # depth at the sample, interpolated using the param on the unclipped line
+        u = t0[which]+(t1[which]-t0[which])*t
+        ends = lines[kept[which]]
+        d = depth[ends[:, 0]]*(1-u)+depth[ends[:, 1]]*u
+        return kept[which], xy, d
+
+    def visibleSegments(self, screen, depth, lines, eps=None, write=True):
+        """
+        Return the visible parts of the lines as (R, 4) segments, and the index of
+        the line each segment belongs to.
+
+        With write=True the lines are first written to the buffer themselves.
+        Samples within `eps` of the nearest depth count as visible,
+        by default the depth difference over a few pixels, see `tolerance`.
+        """
+        lines = np.asarray(lines, dtype=int).reshape(-1, 2)
+        which, xy, d = self.sampleLines(screen, depth, lines)
+        idx, inside = self.index(xy)
+        which, xy, d = which[inside], xy[inside], d[inside]
+        if write:
+            np.minimum.at(self.depth, idx, d)
+            self.owner[idx[d==self.depth[idx]]] = self.LINE
+        if eps is None:
+            eps = self.tolerance(screen, depth)
+
+        # lines are never hidden by the faces they bound
+        owner = self.owner[idx]
+        keys = self.lineKeys(lines[which, 0], lines[which, 1], len(screen))*self.MAXFACES+owner
+        ownface = (owner >= 0) & np.isin(keys, self.boundary)
+        visible = ownface | (d <= self.depth[idx]+eps)
+
+        # find runs of visible samples belonging to the same line
+        same = np.zeros(len(which), dtype=bool)
+        same[1:] = which[1:]==which[:-1]
+        prev = np.zeros(len(which), dtype=bool)
+        prev[1:] = visible[:-1]
+        nxt = np.zeros(len(which), dtype=bool)
+        nxt[:-1] = visible[1:]
+        samenext = np.zeros(len(which), dtype=bool)
+        samenext[:-1] = same[1:]
+        starts = np.flatnonzero(visible & ~(prev & same))
+        ends = np.flatnonzero(visible & ~(nxt & samenext))
+        return np.hstack([xy[starts], xy[ends]]), which[starts]
+
+
+class Canvas(object):
+    """ an rgb image, on which line segments can be drawn """
+    def __init__(self, width, height, background=(255, 255, 255)):
+        """ construct canvas filled with the background color """
+        self.width = int(width)
+        self.height = int(height)
+        self.pixels = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.pixels[:] = background
+
+    def drawSegments(self, segments, color):
+        """ draw (N, 4) segments in color """
+        clipped = clipSegments(segments, self.width, self.height)[0]
+        which, t = sampleSegments(clipped)
+        xy = clipped[which, :2]*(1-t)[:, None]+clipped[which, 2:]*t[:, None]
+        ix = np.floor(xy+0.5).astype(int)
+        self.pixels[ix[:, 1], ix[:, 0]] = color
+
+    def tobytes(self):
+        """ return the raw rgb pixel data """
+        return self.pixels.tobytes()
+
+    def writePPM(self, filename):
+        """ save the canvas as a binary PPM image """
+        with open(filename, "wb") as fh:
+            fh.write(("P6\n%d %d\n255\n" % (self.width, self.height)).encode("ascii"))
+            fh.write(self.tobytes())
+
+
+import unittest
+class TestRaster(unittest.TestCase):
+    """ tests for the rasterizer """
+    def test_clip(self):
+        """ clip segments to the screen """
+        c, t0, t1, keep = clipSegments([[-10,5,20,5], [-5,-5,-1,-1], [2,2,3,3]], 11, 11)
+        self.assertEqual(list(keep), [True, False, True])
+        self.assertTrue(np.allclose(c, [[0,5,10,5], [2,2,3,3]]))
+        self.assertTrue(np.allclose(t0, [1/3, 0]))
+
+    def test_samples(self):
+        """ one sample per pixel step """
+        which, t = sampleSegments([[0,0,3,1], [5,5,5,5]])
+        self.assertEqual(list(which), [0,0,0,0,1])
+        self.assertTrue(np.allclose(t[:4], [0, 1/3, 2/3, 1]))
+
+    def test_triangles(self):
+        """ triangle samples cover every pixel of the triangle """
+        which, bary = sampleTriangles([[[0,0], [10,0], [0,10]]])
+        xy = bary.dot([[0,0], [10,0], [0,10]])
+        covered = set(map(tuple, np.floor(xy+0.5).astype(int)))
+        self.assertTrue(all((x, y) in covered for x in range(11) for y in range(11) if x+y<=10))
+
+    def test_canvas(self):
+        """ draw a line on the canvas """
+        c = Canvas(5, 3)
+        c.drawSegments([[0,1,4,1]], (255,0,0))
+        self.assertTrue((c.pixels[1,:,1]==0).all())
+        self.assertTrue((c.pixels[0,:,1]==255).all())
+
+    def test_hidden(self):
+        """ a line behind a face is hidden, a line in front is not """
+        zb = LineZBuffer(20, 20)
+        screen = np.array([[0,0], [19,0], [19,19], [0,19], [0,10], [19,10]], dtype=float)
+        depth = np.array([5, 5, 5, 5, 1, 9], dtype=float)
+        zb.addFaces(screen, depth, [(0,1,2,3)])
+        segs, which = zb.visibleSegments(screen, depth, [(4,5), (0,1)], eps=0.01, write=False)
+        # the front half of line 0 is visible, and the face edge
+        self.assertEqual(sorted(which), [0, 1])
+        seg = segs[list(which).index(0)]
+        self.assertTrue(seg[2] < 10)
+
+    def test_cube(self):
+        """ from a general viewpoint 9 of the 12 lines of a cube are visible """
+        from geometry.base import Point
+        from geometry.platonic import Cube, faceCycles
+        from geometry.projection import Camera, pointArray
+        c = Cube(Point(0,0,0))
+        pts = pointArray(c.points)
+        lines = np.array(list(c.generateLines()))
+        cam = Camera.orbit(6, 1.0, 0.7, 0.5)
+        params = cam.project(pts)
+        screen = 100+(params-params.mean(axis=0))*1000
+        zb = LineZBuffer(200, 200)
+        zb.addFaces(screen, cam.depth(pts), faceCycles(lines.tolist()))
+        segs, which = zb.visibleSegments(screen, cam.depth(pts), lines)
+        length = np.hypot(segs[:,2]-segs[:,0], segs[:,3]-segs[:,1])
+        self.assertEqual(len(set(which[length > 3])), 9)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
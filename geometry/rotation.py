@@ -0,0 +1,168 @@
+"""
+Rotations in n-dimensional space.
+
+A rotation is specified by the plane it rotates, given as a pair of
+axis indices, and an angle.  Points are stored as rows of an (N, dim)
+array, a rotation matrix `m` is applied as `points.dot(m.T)`.
+"""
+from __future__ import division, print_function
+import math
+import numpy as np
+
+
+AXISNAMES = "xyzw"
+
+
+def parsePlanes(spec, dim=None):
+    """
+    Convert a plane specification like "xw,yw,zw" to a list of axis index pairs.
+
+    Axes are named x, y, z, w, or by their index: "03" is the same as "xw".
+    When dim is given, the axes must be less than dim.
+    """
+    planes = []
+    for name in spec.split(","):
+        name = name.strip()
+        if len(name)!=2 or not all(c.isdigit() or c in AXISNAMES for c in name):
+            raise ValueError("invalid plane: %s" % name)
+        axes = tuple(int(c) if c.isdigit() else AXISNAMES.index(c) for c in name)
+        if axes[0]==axes[1] or dim is not None and max(axes)>=dim:
+            raise ValueError("invalid plane: %s" % name)
+        planes.append(axes)
+    return planes
+
+
+def planeName(plane):
+    """ return the name of a plane, as used by parsePlanes """
+    return "".join(AXISNAMES[i] if i<len(AXISNAMES) else str(i) for i in plane)
+
+
+def planeRotation(dim, i, j, angle):
+    """ return the matrix rotating the (i,j) plane over angle """
+    m = np.identity(dim)
+    c, s = math.cos(angle), math.sin(angle)
+    m[i, i] = c
+    m[j, j] = c
+    m[i, j] = -s
+    m[j, i] = s
+    return m
+
+
+def rotationMatrix(dim, planes, angles):
+    """ compose the plane rotations, the first plane is rotated first """
+    m = np.identity(dim)
+    for (i, j), angle in zip(planes, angles):
+        m = planeRotation(dim, i, j, angle).dot(m)
+    return m
+
+
+def rotatePoints(points, planes, angles):
+    """ rotate an (N, dim) array of points """
+    points = np.asarray(points, dtype=float)
+    return points.dot(rotationMatrix(points.shape[-1], planes, angles).T)
+
+
+def frameAngles(planes, angles):
+    """
+    Return angles as an (F, P) array for P planes.
+
+    `angles` is either an (F, P) array, or an (F,) series used for all planes.
+    """
+    angles = np.asarray(angles, dtype=float)
+    if angles.ndim==1:
+        angles = np.repeat(angles[:, None], len(planes), axis=1)
+    if angles.ndim!=2 or angles.shape[1]!=len(planes):
+        raise ValueError("need one angle per plane per frame")
+    return angles
+
+
+def rotationMatrices(dim, planes, angles):
+    """
+    Compose the plane rotations for a series of frames, returns an (F, dim, dim) array.
+
+    Each plane is applied to all frames at once, as a Givens rotation on
+    two rows of the stacked matrices.
+    """
+    angles = frameAngles(planes, angles)
+    m = np.tile(np.identity(dim), (len(angles), 1, 1))
+    for (i, j), phi in zip(planes, angles.T):
+        c = np.cos(phi)[:, None]
+        s = np.sin(phi)[:, None]
+        mi = m[:, i, :].copy()
+        mj = m[:, j, :]
+        m[:, i, :] = c*mi-s*mj
+        m[:, j, :] = s*mi+c*mj
+    return m
+
+
+def rotationFrames(points, planes, angles, out=None, blocksize=256):
+    """
+    Rotate (V, dim) points for each frame in the angle series.
+
+    Returns a (F, V, dim) array.  When `out` is given, for example a numpy.memmap,
+    the frames are written there, `blocksize` frames at a time.
+    """
+    points = np.asarray(points, dtype=float)
+    angles = frameAngles(planes, angles)
+    if out is None:
+        out = np.empty((len(angles),)+points.shape)
+    for first in range(0, len(angles), blocksize):
+        m = rotationMatrices(points.shape[-1], planes, angles[first:first+blocksize])
+        np.matmul(points, m.transpose(0, 2, 1), out=out[first:first+len(m)])
+    return out
+
+
+def iterRotationFrames(points, planes, angles, blocksize=256):
+    """ stream the rotated (V, dim) points, one frame at a time """
+    points = np.asarray(points, dtype=float)
+    angles = frameAngles(planes, angles)
+    for first in range(0, len(angles), blocksize):
+        for frame in rotationFrames(points, planes, angles[first:first+blocksize]):
+            yield frame
+
+
+import unittest
+class TestRotation(unittest.TestCase):
+    """ tests for n-d rotations """
+    def test_planes(self):
+        """ test plane name parsing """
+        self.assertEqual(parsePlanes("xw, yw,zw"), [(0,3), (1,3), (2,3)])
+        self.assertEqual(parsePlanes("01"), [(0,1)])
+        self.assertEqual(planeName((1,3)), "yw")
+        self.assertRaises(ValueError, parsePlanes, "xx")
+        self.assertRaises(ValueError, parsePlanes, "xq")
+        self.assertEqual(parsePlanes("05", 6), [(0,5)])
+        self.assertRaises(ValueError, parsePlanes, "05", 4)
+
+    def test_quarter(self):
+        """ rotating the xy plane a quarter turn maps x to y """
+        p = rotatePoints([[1,0,0,0]], [(0,1)], [math.pi/2])
+        self.assertTrue(np.allclose(p, [[0,1,0,0]]))
+
+    def test_orthogonal(self):
+        """ composed rotations preserve lengths """
+        m = rotationMatrix(5, [(0,4), (1,3), (2,4)], [0.3, 1.2, -2.0])
+        self.assertTrue(np.allclose(m.dot(m.T), np.identity(5)))
+
+    def test_frames(self):
+        """ batched frames match rotating frame by frame """
+        pts = np.random.uniform(-1, 1, (7, 4))
+        planes = [(0,3), (1,2)]
+        angles = np.random.uniform(-math.pi, math.pi, (10, 2))
+        frames = rotationFrames(pts, planes, angles, blocksize=3)
+        self.assertEqual(frames.shape, (10, 7, 4))
+        for frame, phi in zip(frames, angles):
+            self.assertTrue(np.allclose(frame, rotatePoints(pts, planes, phi)))
+        for frame, streamed in zip(frames, iterRotationFrames(pts, planes, angles, blocksize=4)):
+            self.assertTrue(np.allclose(frame, streamed))
+
+    def test_series(self):
+        """ a single angle series is applied to all planes """
+        m = rotationMatrices(3, [(0,1), (1,2)], [0.0, 0.5])
+        self.assertTrue(np.allclose(m[1], rotationMatrix(3, [(0,1), (1,2)], [0.5, 0.5])))
+        self.assertRaises(ValueError, rotationMatrices, 3, [(0,1)], [[0.1, 0.2]])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,157 @@
+"""
+Uniform random points on n-spheres, and on the edges and 2-d faces of shapes.
+
+The samplers yield (N, dim) arrays of at most `blocksize` points, until
+`count` points have been produced.  They use numpy's default generator,
+seeded with `seed`: the same seed and blocksize give the same points.
+
+    from geometry.sampling import sphereBlocks, faceBlocks
+    for block in sphereBlocks(4, 10**6, seed=1):
+        ...
+    points = np.concatenate(list(faceBlocks(Cube(Point(0,0,0)), 1000, seed=2)))
+"""
+from __future__ import division, print_function
+import numpy as np
+from geometry.mesh import Mesh
+
+
+BLOCKSIZE = 1<<16
+
+
+def blockSizes(count, blocksize):
+    """ yield the sizes of the blocks for count points """
+    for start in range(0, count, blocksize):
+        yield min(blocksize, count-start)
+
+
+def sphereBlocks(dim, count, radius=1.0, center=None, seed=None, blocksize=BLOCKSIZE):
+    """
+    Yield points uniformly distributed on the (dim-1)-sphere in dim dimensions:
+    normally distributed vectors, scaled to the radius.
+    """
+    rng = np.random.default_rng(seed)
+    center = np.zeros(dim) if center is None else np.asarray(center, dtype=float)
+    for n in blockSizes(count, blocksize):
+        v = rng.standard_normal((n, dim))
+        yield v*(radius/np.sqrt((v*v).sum(axis=1)))[:, None] + center
+
+
+def weightedBlocks(weights, count, seed, blocksize, place):
+    """
+    Yield blocks of points on items chosen with probability proportional to their weight,
+    place(items, rng) returns the points on the chosen items.  Raises ValueError when
+    there are no items, or their weights sum to zero.
+    """
+    cumulative = np.cumsum(weights)
+    if not len(cumulative) or not cumulative[-1] > 0:
+        raise ValueError("nothing to sample: %d items with total weight %g" % (len(cumulative), cumulative[-1] if len(cumulative) else 0))
+    def blocks():
+        rng = np.random.default_rng(seed)
+        for n in blockSizes(count, blocksize):
+            items = np.searchsorted(cumulative, rng.random(n)*cumulative[-1], side='right')
+            yield place(np.minimum(items, len(weights)-1), rng)
+    return blocks()
+
+
+def shapeMeshOf(shape, faces):
+    """ return the mesh of a shape object, or the shape itself when it is a Mesh """
+    return shape if isinstance(shape, Mesh) else Mesh.fromShape(shape, faces)
+
+
+def edgeBlocks(shape, count, seed=None, blocksize=BLOCKSIZE):
+    """ yield points uniformly distributed over the line segments of a shape or mesh """
+    mesh = shapeMeshOf(shape, faces=False)
+    a = mesh.points[mesh.lines[:, 0]]
+    b = mesh.points[mesh.lines[:, 1]]
+    lengths = np.sqrt(((b-a)**2).sum(axis=1))
+    def place(items, rng):
+        t = rng.random(len(items))[:, None]
+        return a[items] + t*(b[items]-a[items])
+    return weightedBlocks(lengths, count, seed, blocksize, place)
+
+
+def faceTriangles(mesh):
+    """ return the faces of a mesh as a fan of triangles, an (T, 3) array of point indices, skipping faces of less than 3 points """
+    triangles = [np.column_stack([np.full(len(f)-2, f[0]), f[1:-1], f[2:]]) for f in mesh.faces() if len(f) >= 3]
+    return np.vstack(triangles) if triangles else np.zeros((0, 3), dtype=np.int64)
+
+
+def faceBlocks(shape, count, seed=None, blocksize=BLOCKSIZE):
+    """ yield points uniformly distributed over the 2-d faces of a shape or mesh """
+    mesh = shapeMeshOf(shape, faces=True)
+    triangles = faceTriangles(mesh)
+    a, b, c = (mesh.points[triangles[:, i]] for i in range(3))
+    u, v = b-a, c-a
+    uu, vv, uv = (u*u).sum(axis=1), (v*v).sum(axis=1), (u*v).sum(axis=1)
+    areas = 0.5*np.sqrt(np.maximum(uu*vv-uv*uv, 0))
+    def place(items, rng):
+        # the square root makes the points uniform over the triangle
+        r = rng.random((2, len(items)))
+        s = np.sqrt(r[0])[:, None]
+        t = r[1][:, None]
+        return a[items] + s*(1-t)*u[items] + s*t*v[items]
+    return weightedBlocks(areas, count, seed, blocksize, place)
+
+
+import unittest
+class TestSampling(unittest.TestCase):
+    """ tests for the samplers """
+    def test_sphere(self):
+        """ points are on the sphere, evenly spread, and reproducible """
+        blocks = list(sphereBlocks(4, 10000, radius=2.0, center=[1, 1, 1, 1], seed=5, blocksize=3000))
+        self.assertEqual([len(b) for b in blocks], [3000, 3000, 3000, 1000])
+        p = np.concatenate(blocks)
+        self.assertTrue(np.allclose(np.sqrt(((p-1)**2).sum(axis=1)), 2.0))
+        self.assertTrue(np.allclose(p.mean(axis=0), 1.0, atol=0.05))
+        self.assertTrue(np.array_equal(p, np.concatenate(list(sphereBlocks(4, 10000, 2.0, [1, 1, 1, 1], seed=5, blocksize=3000)))))
+
+    def test_edges(self):
+        """ points on the cube edges, each edge gets its share """
+        from geometry.base import Point
+        from geometry.platonic import Cube
+        p = np.concatenate(list(edgeBlocks(Cube(Point(0, 0, 0)), 12000, seed=1, blocksize=5000)))
+        self.assertEqual(p.shape, (12000, 3))
+        # on an edge, two coordinates are at +-0.5
+        self.assertTrue(((np.abs(np.abs(p)-0.5) < 1e-12).sum(axis=1) >= 2).all())
+        along = np.argmin(np.abs(np.abs(p)-0.5) < 1e-12, axis=1)
+        self.assertTrue(np.allclose(np.bincount(along), 4000, rtol=0.1))
+
+    def test_faces(self):
+        """ points on the faces of the octaeder and 120-cell, uniform over the area """
+        from geometry.base import Point
+        from geometry.platonic import Octaeder, Cell120
+        p = np.concatenate(list(faceBlocks(Octaeder(Point(0, 0, 0)), 8000, seed=2)))
+        self.assertTrue(np.allclose(np.abs(p).sum(axis=1), 1.0))
+        octants = (p > 0).dot([1, 2, 4])
+        self.assertTrue(np.allclose(np.bincount(octants), 1000, rtol=0.15))
+
+        p = np.concatenate(list(faceBlocks(Cell120(Point(0, 0, 0, 0)), 1000, seed=3, blocksize=300)))
+        self.assertEqual(p.shape, (1000, 4))
+        self.assertTrue((np.sqrt((p*p).sum(axis=1)) <= np.sqrt(8)+1e-9).all())
+
+    def test_weights(self):
+        """ segments and triangles are chosen in proportion to their length and area """
+        mesh = Mesh(np.array([[0, 0], [1, 0], [0, 1], [0, 4]], dtype=float), np.array([[1, 0], [3, 2]]))
+        p = np.concatenate(list(edgeBlocks(mesh, 8000, seed=4)))
+        self.assertTrue(np.allclose(np.bincount((p[:, 1] > 0).astype(int)), [2000, 6000], rtol=0.05))
+
+        points = np.array([[0, 0, 0], [2, 0, 0], [0, 1, 0], [0, 0, 1], [4, 0, 1], [0, 2, 1]], dtype=float)
+        mesh = Mesh(points, np.zeros((0, 2), dtype=np.int64), [[0, 1, 2], [3, 4, 5]])
+        p = np.concatenate(list(faceBlocks(mesh, 10000, seed=5)))
+        self.assertTrue(np.allclose(np.bincount(p[:, 2].astype(int)), [2000, 8000], rtol=0.05))
+        # uniform within the triangle: a quarter of the points is beyond the midline
+        top = p[p[:, 2] == 1]
+        self.assertTrue(np.allclose((top[:, 0]/4+top[:, 1]/2 > 0.5).mean(), 0.75, atol=0.02))
+
+    def test_empty(self):
+        """ shapes without edges or faces have nothing to sample """
+        from geometry.base import Point
+        from geometry.platonic import Cube
+        self.assertRaises(ValueError, faceBlocks, Cube(Point([0.0])), 100)
+        self.assertRaises(ValueError, edgeBlocks, Mesh(np.zeros((1, 3)), np.zeros((0, 2), dtype=np.int64)), 100)
+        self.assertRaises(ValueError, edgeBlocks, Mesh(np.zeros((2, 3)), np.array([[1, 0]])), 100)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,240 @@
+"""
+A scene: a list of shape instances, each with a transform and a drawing style.
+
+Instances of the same shape class and dimension share one canonical
+copy of the points, line segments and faces.  Per frame the instances
+are transformed group by group, and concatenated into a single vertex
+buffer, so a viewer projects the whole scene in one pass.
+"""
+from __future__ import division, print_function
+import numpy as np
+from geometry.base import Point
+from geometry.platonic import faceCycles
+
+
+class Transform(object):
+    """ affine transform, points are mapped as `points.dot(matrix.T)+offset` """
+    @staticmethod
+    def identity(dim):
+        """ return the transform leaving points in place """
+        return Transform(np.identity(dim))
+
+    @staticmethod
+    def translation(offset):
+        """ return the transform moving points over offset """
+        if isinstance(offset, Point):
+            offset = offset.coord
+        offset = np.asarray(offset, dtype=float)
+        return Transform(np.identity(len(offset)), offset)
+
+    @staticmethod
+    def scaling(factor, dim):
+        """ return the transform scaling points relative to the origin """
+        return Transform(np.identity(dim)*factor)
+
+    def __init__(self, matrix, offset=None):
+        """ construct transform from a (dim, dim) matrix and an optional offset """
+        self.matrix = np.asarray(matrix, dtype=float)
+        self.offset = np.zeros(len(self.matrix)) if offset is None else np.asarray(offset, dtype=float)
+
+    def dim(self):
+        """ return dimension of our space """
+        return len(self.matrix)
+
+    def then(self, other):
+        """ return the transform applying self first, then other """
+        return Transform(other.matrix.dot(self.matrix), other.matrix.dot(self.offset)+other.offset)
+
+    def apply(self, points):
+        """ transform an (N, dim) array of points """
+        return np.asarray(points, dtype=float).dot(self.matrix.T)+self.offset
+
+
+class Geometry(object):
+    """ the canonical points and line segments shared by instances """
+    def __init__(self, points, lines):
+        self.points = np.array(points, dtype=float)
+        self.lines = np.array(lines, dtype=int).reshape(-1, 2)
+        self.points.setflags(write=False)
+        self.lines.setflags(write=False)
+        self._faces = None
+
+    def faces(self):
+        """ return the 2-d faces as point index cycles, enumerated on first use """
+        if self._faces is None:
+            self._faces = list(faceCycles(self.lines.tolist()))
+        return self._faces
+
+
+class SceneEntry(object):
+    """ a shape instance in a scene """
+    def __init__(self, shape, geometry, transform, style):
+        self.shape = shape
+        self.geometry = geometry
+        self.transform = transform
+        self.style = style
+
+
+class Scene(object):
+    """ shape instances, drawn from a single vertex and line buffer """
+    def __init__(self, dim):
+        self._dim = dim
+        self.entries = []
+        self.geometries = {}
+        # buffers, rebuilt when the scene changes
+        self._layout = None
+        self._vertices = None
+
+    def dim(self):
+        """ return dimension of our space """
+        return self._dim
+
+    def geometryFor(self, shape):
+        """
+        Return the canonical geometry for shape, and the transform placing it.
+
+        Shapes with a base point `p0` (the platonic shapes) share their geometry per class and dimension,
+        other shapes get a geometry of their own.
+        """
+        p0 = shape.__dict__.get('p0')
+        key = (type(shape), shape.dim()) if p0 is not None else id(shape)
+        placement = Transform.translation(p0) if p0 is not None else Transform.identity(shape.dim())
+        if key not in self.geometries:
+            points = np.array([p.coord for p in shape.points], dtype=float)
+            if p0 is not None:
+                points -= p0.coord
+            self.geometries[key] = Geometry(points, list(shape.generateLines()))
+        return self.geometries[key], placement
+
+    def add(self, shape, transform=None, style=None):
+        """ add shape, placed at its own position, then transformed.  returns the entry index """
+        if shape.dim() != self.dim():
+            raise ValueError("shape dimension does not match the scene")
+        geometry, placement = self.geometryFor(shape)
+        if transform is not None:
+            placement = placement.then(transform)
+        self.entries.append(SceneEntry(shape, geometry, placement, style))
+        self._layout = None
+        self._vertices = None
+        return len(self.entries)-1
+
+    def setTransform(self, i, transform):
+        """ replace the complete transform of entry i, including the shape's own position """
+        self.entries[i].transform = transform
+        self._vertices = None
+
+    def styles(self):
+        """ return the style of each entry """
+        return [e.style for e in self.entries]
+
+    def layout(self):
+        """
+        Return the buffer layout: the first point of each entry, the concatenated
+        line segments, faces, and for each line and point the index of its entry.
+        """
+        if self._layout is None:
+            firsts, lines, lineowner, pointowner = [], [], [], []
+            first = 0
+            for i, e in enumerate(self.entries):
+                firsts.append(first)
+                lines.append(e.geometry.lines+first)
+                lineowner.append(np.full(len(e.geometry.lines), i, dtype=int))
+                pointowner.append(np.full(len(e.geometry.points), i, dtype=int))
+                first += len(e.geometry.points)
+            self._layout = dict(
+                firsts=np.array(firsts, dtype=int),
+                lines=np.vstack(lines) if lines else np.zeros((0, 2), dtype=int),
+                lineowner=np.concatenate(lineowner) if lineowner else np.zeros(0, dtype=int),
+                pointowner=np.concatenate(pointowner) if pointowner else np.zeros(0, dtype=int),
+                size=first)
+        return self._layout
+
+    def lines(self):
+        """ return all line segments, as an (E, 2) array of vertex indices """
+        return self.layout()['lines']
+
+    def lineOwner(self):
+        """ return for each line segment the index of its entry """
+        return self.layout()['lineowner']
+
+    def pointOwner(self):
+        """ return for each vertex the index of its entry """
+        return self.layout()['pointowner']
+
+    def faces(self):
+        """ return all 2-d faces, as vertex index cycles """
+        layout = self.layout()
+        if 'faces' not in layout:
+            layout['faces'] = [[int(first)+j for j in cycle] for e, first in zip(self.entries, layout['firsts']) for cycle in e.geometry.faces()]
+        return layout['faces']
+
+    def vertices(self):
+        """
+        Return the transformed points of all entries as an (N, dim) array.
+
+        Entries sharing a geometry are transformed together, as one batched matrix product.
+        """
+        if self._vertices is None:
+            layout = self.layout()
+            out = np.empty((layout['size'], self.dim()))
+            groups = {}
+            for i, e in enumerate(self.entries):
+                groups.setdefault(id(e.geometry), []).append(i)
+            for ids in groups.values():
+                geometry = self.entries[ids[0]].geometry
+                matrices = np.array([self.entries[i].transform.matrix for i in ids])
+                offsets = np.array([self.entries[i].transform.offset for i in ids])
+                pts = np.matmul(geometry.points, matrices.transpose(0, 2, 1))+offsets[:, None, :]
+                dest = layout['firsts'][ids][:, None]+np.arange(len(geometry.points))
+                out[dest.reshape(-1)] = pts.reshape(-1, self.dim())
+            self._vertices = out
+        return self._vertices
+
+
+import unittest
+class TestScene(unittest.TestCase):
+    """ tests for the scene buffers """
+    def test_shared(self):
+        """ instances of a class share geometry, and keep their points """
+        from geometry.platonic import Cube, Tetraeder
+        shapes = [Cube(Point(0,0,1)), Tetraeder(Point(0,1,0)), Cube(Point(3,2,1))]
+        scene = Scene(3)
+        for s in shapes:
+            scene.add(s, style=s)
+        self.assertEqual(len(scene.geometries), 2)
+        self.assertTrue(scene.entries[0].geometry is scene.entries[2].geometry)
+
+        vertices = scene.vertices()
+        expected = np.vstack([[p.coord for p in s.points] for s in shapes])
+        self.assertTrue(np.allclose(vertices, expected))
+        self.assertEqual(len(scene.lines()), 12+6+12)
+        self.assertEqual(list(scene.lines()[-1]), [a+12 for a in list(shapes[2].generateLines())[-1]])
+        self.assertEqual(list(np.bincount(scene.lineOwner())), [12, 6, 12])
+        self.assertEqual(len(scene.faces()), 6+4+6)
+
+    def test_transform(self):
+        """ transforms are applied after the shape's own placement """
+        from geometry.platonic import Cube
+        scene = Scene(3)
+        scene.add(Cube(Point(0,0,0)))
+        i = scene.add(Cube(Point(1,0,0)), Transform.scaling(2, 3).then(Transform.translation([0,0,5])))
+        v = scene.vertices()[scene.pointOwner()==i]
+        self.assertTrue(np.allclose(v.mean(axis=0), [2,0,5]))
+        self.assertTrue(np.allclose(abs(v-[2,0,5]), 1))
+
+        scene.setTransform(i, Transform.identity(3))
+        self.assertTrue(np.allclose(scene.vertices()[8:], scene.vertices()[:8]))
+
+    def test_other(self):
+        """ shapes without base point are used as is """
+        from geometry.base import Parallelogram
+        scene = Scene(3)
+        pgm = Parallelogram(Point(1,1,1), Point(2,4,1), Point(5,2,1))
+        scene.add(pgm)
+        self.assertTrue(np.allclose(scene.vertices(), [p.coord for p in pgm.points]))
+        self.assertRaises(ValueError, scene.add, Parallelogram(Point(1,1), Point(2,4), Point(5,2)))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
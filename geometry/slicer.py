@@ -0,0 +1,130 @@
+"""
+Cross sections of shapes with a family of parallel hyperplanes.
+
+A hyperplane cuts a convex polytope in a polytope of one dimension lower:
+its points are where the hyperplane crosses the line segments of the shape,
+and its line segments are where the hyperplane crosses the 2-d faces.
+"""
+from __future__ import division, print_function
+import numpy as np
+from geometry.base import Point, Hyperplane
+from geometry.platonic import faceCycles
+
+
+class Slicer(object):
+    """ intersects a shape with hyperplanes perpendicular to `normal` """
+    def __init__(self, shape, normal):
+        """ construct slicer for shape, enumerating its line segments and faces once """
+        if not isinstance(normal, Point):
+            normal = Point(normal)
+        self.plane = Hyperplane(normal)
+        self.points = np.array([p.coord for p in shape.points], dtype=float)
+        self.lines = np.array(list(shape.generateLines()), dtype=int).reshape(-1, 2)
+
+        # faces as (F, k) array of line indices
+        index = dict(((min(a, b), max(a, b)), i) for i, (a, b) in enumerate(self.lines.tolist()))
+        faces = []
+        for cycle in faceCycles(self.lines.tolist()):
+            faces.append([index[min(a, b), max(a, b)] for a, b in zip(cycle, cycle[1:]+cycle[:1])])
+        self.faces = np.array(faces, dtype=int).reshape(len(faces), -1)
+
+    def dim(self):
+        """ return dimension of our space """
+        return self.plane.dim()
+
+    def offsetRange(self):
+        """ return the range of offsets for which the hyperplane cuts the shape """
+        d = self.points.dot(np.array(self.plane.normal.coord, dtype=float))
+        return d.min(), d.max()
+
+    def slices(self, offsets, local=True, decimals=9):
+        """
+        Calculate the cross sections for all offsets.
+
+        Returns a list with for each offset a tuple (points, lines): an (N, dim) array
+        of cross section points, and an (M, 2) array of point index pairs.
+        With local=True the points are expressed in an orthonormal basis of the
+        hyperplane, so a 4-d shape results in 3-d slices.
+        Points are rounded to `decimals` to merge the points where the
+        hyperplane passes through a point of the shape.
+        """
+        p1 = self.points[self.lines[:, 0]]
+        p2 = self.points[self.lines[:, 1]]
+        params = self.plane.segmentParams(p1, p2, offsets)
+        crossing = ~np.isnan(params)
+
+        if local:
+            basis = self.plane.basis()
+            p1 = p1.dot(basis.T)
+            p2 = p2.dot(basis.T)
+
+        # faces crossed by the hyperplane have exactly two crossing lines
+        facecross = crossing[:, self.faces]
+
+        result = []
+        for t in range(len(params)):
+            lines = np.flatnonzero(crossing[t])
+            a = params[t, lines][:, None]
+            pts = p1[lines]*(1-a)+p2[lines]*a
+
+            pts, inverse = np.unique(np.round(pts, decimals), axis=0, return_inverse=True)
+            pointindex = np.zeros(len(self.lines), dtype=int)
+            pointindex[lines] = inverse.reshape(-1)
+
+            faces = self.faces[facecross[t].sum(axis=1)==2]
+            mask = facecross[t][facecross[t].sum(axis=1)==2]
+            ends = faces[mask].reshape(-1, 2)
+            segs = np.sort(pointindex[ends], axis=1)
+            segs = np.unique(segs[segs[:, 0]!=segs[:, 1]], axis=0).reshape(-1, 2)
+            result.append((pts, segs))
+        return result
+
+    def sweep(self, count):
+        """ return the cross sections for `count` offsets evenly spread through the shape """
+        lo, hi = self.offsetRange()
+        offsets = np.linspace(lo, hi, count+2)[1:-1]
+        return offsets, self.slices(offsets)
+
+
+import unittest
+class TestSlicer(unittest.TestCase):
+    """ tests for the cross sections """
+    def test_cube(self):
+        """ a 4-cube sliced perpendicular to an axis gives a cube """
+        from geometry.platonic import Cube
+        s = Slicer(Cube(Point(0,0,0,0)), Point(0,0,0,1))
+        for pts, lines in s.slices([-0.25, 0.0, 0.3]):
+            self.assertEqual(len(pts), 8)
+            self.assertEqual(len(lines), 12)
+            for a, b in lines:
+                self.assertAlmostEqual(np.linalg.norm(pts[a]-pts[b]), 1.0)
+
+    def test_vertexfirst(self):
+        """ a 4-cube sliced near a corner gives a tetraeder """
+        from geometry.platonic import Cube
+        s = Slicer(Cube(Point(0,0,0,0)), Point(1,1,1,1))
+        (pts, lines), = s.slices([1.8])
+        self.assertEqual(len(pts), 4)
+        self.assertEqual(len(lines), 6)
+
+    def test_throughpoints(self):
+        """ slicing through points of the shape does not duplicate points """
+        from geometry.platonic import Cell24
+        s = Slicer(Cell24(Point(0,0,0,0)), Point(0,0,0,1))
+        for pts, lines in s.slices([0.0]):
+            self.assertEqual(len(pts), len(np.unique(np.round(pts, 6), axis=0)))
+            self.assertTrue(len(lines) > 0)
+
+    def test_sweep(self):
+        """ all slices of a 120-cell are non empty """
+        from geometry.platonic import Cell120
+        s = Slicer(Cell120(Point(0,0,0,0)), Point(0,0,0,1))
+        offsets, slices = s.sweep(10)
+        for pts, lines in slices:
+            self.assertEqual(pts.shape[1], 3)
+            self.assertTrue(len(lines) >= len(pts))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,150 @@
+"""
+Spheres and n-spheres, drawn as a mesh of meridians and parallels.
+
+The mesh of the unit sphere is generated once per (dim, resolution),
+a Sphere only scales and translates it.  The resolution is the number
+of steps from pole to pole, the last angle goes around in twice as many steps.
+"""
+from __future__ import division, print_function
+import math
+import numpy as np
+from geometry.base import Point
+from geometry.polar import fromNSphericalArray
+
+
+_meshes = {}
+
+
+def unitSphereMesh(dim, resolution):
+    """
+    Return the mesh of the unit (dim-1)-sphere in dim-d space:
+    an (N, dim) array of points, and an (E, 2) array of point index pairs.
+
+    The arrays are shared between all callers, and made read-only.
+    """
+    key = dim, resolution
+    if key not in _meshes:
+        _meshes[key] = generateSphereMesh(dim, resolution)
+    return _meshes[key]
+
+
+def generateSphereMesh(dim, resolution, decimals=9):
+    """ generate the unit sphere mesh, see `unitSphereMesh` """
+    if dim < 2 or resolution < 1:
+        raise ValueError("need dim >= 2, and resolution >= 1")
+    # the first angles go from pole to pole, the last angle around
+    axes = [np.linspace(0, math.pi, resolution+1)]*(dim-2) + [np.arange(2*resolution)*math.pi/resolution]
+    shape = tuple(len(a) for a in axes)
+    grid = np.meshgrid(*axes, indexing='ij')
+    points = fromNSphericalArray(1.0, np.column_stack([g.reshape(-1) for g in grid]))
+
+    # connect neighbours along each angle, the last angle wraps around
+    ids = np.arange(points.shape[0]).reshape(shape)
+    lines = []
+    for axis in range(dim-1):
+        if axis == dim-2:
+            a, b = ids, np.roll(ids, -1, axis=axis)
+        else:
+            a, b = np.delete(ids, -1, axis=axis), np.delete(ids, 0, axis=axis)
+        lines.append(np.column_stack([a.reshape(-1), b.reshape(-1)]))
+    lines = np.vstack(lines)
+
+    # at the poles many grid points coincide, merge them
+    points, inverse = np.unique(np.round(points, decimals), axis=0, return_inverse=True)
+    lines = np.sort(inverse.reshape(-1)[lines], axis=1)
+    lines = np.unique(lines[lines[:, 0] != lines[:, 1]], axis=0).reshape(-1, 2)
+
+    points.setflags(write=False)
+    lines.setflags(write=False)
+    return points, lines
+
+
+def screenResolution(project, origin, radius, pixelstep=8.0, minres=4, maxres=64):
+    """
+    Pick a mesh resolution for a sphere, so its line segments are about `pixelstep` pixels long.
+
+    `project` maps an (N, dim) array of points to (N, 2) screen positions.
+    The resolution is rounded up to a power of two, to limit the number of cached meshes.
+    """
+    origin = np.asarray(origin, dtype=float)
+    pts = np.vstack([origin, origin+radius*np.identity(len(origin))])
+    screen = project(pts)
+    with np.errstate(invalid='ignore'):
+        size = np.sqrt(((screen[1:]-screen[0])**2).sum(axis=1)).max()
+    if not np.isfinite(size):
+        return minres
+    # half the circumference is split in `resolution` steps
+    res = max(minres, int(math.ceil(math.pi*size/pixelstep)))
+    res = 1 << (res-1).bit_length()
+    return min(res, maxres)
+
+
+class Sphere(object):
+    """ n-sphere with origin and radius """
+    def __init__(self, origin, radius):
+        if not isinstance(origin, Point):
+            origin = Point(origin)
+        self.origin = origin
+        self.radius = radius
+
+    def dim(self):
+        """ return dimension of our space """
+        return self.origin.dim()
+
+    def mesh(self, resolution=12):
+        """ return the (N, dim) mesh points, and (E, 2) point index pairs """
+        points, lines = unitSphereMesh(self.dim(), resolution)
+        return points*self.radius+np.array(self.origin.coord, dtype=float), lines
+
+    def screenResolution(self, project, **kwargs):
+        """ return the mesh resolution for the sphere's size on screen """
+        return screenResolution(project, self.origin.coord, self.radius, **kwargs)
+
+
+import unittest
+class TestSphere(unittest.TestCase):
+    """ tests for the sphere mesh """
+    def test_circle(self):
+        """ a circle is a closed polygon """
+        pts, lines = unitSphereMesh(2, 6)
+        self.assertEqual(len(pts), 12)
+        self.assertEqual(len(lines), 12)
+        self.assertTrue(np.allclose(np.bincount(lines.reshape(-1)), 2))
+
+    def test_sphere(self):
+        """ meridians and parallels of a 2-sphere """
+        for res in (2, 3, 12):
+            pts, lines = unitSphereMesh(3, res)
+            self.assertEqual(len(pts), (res-1)*2*res+2)
+            self.assertEqual(len(lines), 2*res*(2*res-1))
+            self.assertTrue(np.allclose((pts**2).sum(axis=1), 1))
+
+    def test_nsphere(self):
+        """ a 3-sphere mesh has unit points, and lines of bounded length """
+        pts, lines = unitSphereMesh(4, 8)
+        self.assertTrue(np.allclose((pts**2).sum(axis=1), 1))
+        lengths = np.sqrt(((pts[lines[:, 0]]-pts[lines[:, 1]])**2).sum(axis=1))
+        self.assertTrue((lengths > 0).all())
+        self.assertTrue((lengths <= math.pi/8+1e-9).all())
+
+    def test_cache(self):
+        """ spheres share the unit mesh """
+        a = Sphere(Point(1,2,3), 2.0)
+        b = Sphere(Point(0,0,0), 5.0)
+        self.assertTrue(a.mesh(8)[1] is b.mesh(8)[1])
+        pts, lines = a.mesh(8)
+        self.assertTrue(np.allclose(np.sqrt(((pts-[1,2,3])**2).sum(axis=1)), 2))
+        self.assertRaises(ValueError, unitSphereMesh(3, 8)[0].__setitem__, 0, 0)
+
+    def test_resolution(self):
+        """ larger spheres on screen get a finer mesh """
+        s = Sphere(Point(0,0,0), 1.0)
+        self.assertEqual(s.screenResolution(lambda p: p[:, :2]*2), 4)
+        self.assertEqual(s.screenResolution(lambda p: p[:, :2]*50), 32)
+        self.assertEqual(s.screenResolution(lambda p: p[:, :2]*1e6), 64)
+        self.assertEqual(s.screenResolution(lambda p: np.full((len(p), 2), np.inf)), 4)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,189 @@
+"""
+Instrumentation for finding out where the time goes in the viewers.
+
+Timers measure named sections of code, counters count events.  Two
+counters are hooked in by `enable`: `Point` counts Point allocations,
+and `solve` counts calls to np.linalg.solve.  While disabled, timers
+and counters only cost a flag test, and the hooks are removed.
+
+    from geometry import stats
+    stats.enable(trace=True)
+    with stats.timer("projection"):
+        ...
+    print(stats.summary())
+    stats.dumpTrace("trace.json")
+
+The trace uses the chrome://tracing json format, the stats snapshot is
+stored along with it, for comparing runs offline.
+"""
+from __future__ import division, print_function
+import json
+import os
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+import numpy as np
+from geometry.base import Point
+
+
+enabled = False
+# name -> count
+counters = {}
+# name -> [calls, total seconds, max seconds]
+timers = {}
+# trace events, when tracing
+events = None
+
+_lock = threading.Lock()
+_t0 = default_timer()
+_hooks = []
+
+
+def count(name, n=1):
+    """ add n to counter `name` """
+    if not enabled:
+        return
+    with _lock:
+        counters[name] = counters.get(name, 0)+n
+
+
+def addTime(name, start, elapsed):
+    """ record a timed section, which started at `start` and took `elapsed` seconds """
+    with _lock:
+        t = timers.get(name)
+        if t is None:
+            t = timers[name] = [0, 0.0, 0.0]
+        t[0] += 1
+        t[1] += elapsed
+        t[2] = max(t[2], elapsed)
+        if events is not None:
+            events.append(dict(name=name, ph="X", ts=1e6*(start-_t0), dur=1e6*elapsed,
+                               pid=os.getpid(), tid=threading.current_thread().ident))
+
+
+@contextmanager
+def timer(name):
+    """ time the code in the with block """
+    if not enabled:
+        yield
+        return
+    start = default_timer()
+    try:
+        yield
+    finally:
+        addTime(name, start, default_timer()-start)
+
+
+def _hook(owner, attr, name):
+    """ replace owner.attr with a wrapper counting calls as `name` """
+    orig = getattr(owner, attr)
+    def counted(*args, **kwargs):
+        count(name)
+        return orig(*args, **kwargs)
+    setattr(owner, attr, counted)
+    _hooks.append((owner, attr, orig))
+
+
+def enable(on=True, trace=False):
+    """ switch instrumentation on or off, with trace=True timed sections are also kept as trace events """
+    global enabled, events
+    if on and not _hooks:
+        _hook(Point, '__init__', 'Point')
+        _hook(np.linalg, 'solve', 'solve')
+    elif not on:
+        while _hooks:
+            setattr(*_hooks.pop())
+    enabled = on
+    if on:
+        events = (events if events is not None else []) if trace else None
+
+
+def reset():
+    """ clear all counters, timers and trace events """
+    with _lock:
+        counters.clear()
+        timers.clear()
+        if events is not None:
+            del events[:]
+
+
+def snapshot():
+    """ return the current counters and timers as a dict, times are in milliseconds """
+    with _lock:
+        return dict(
+            counters=dict(counters),
+            timers=dict((name, dict(calls=calls, total=1000*total, mean=1000*total/calls, max=1000*longest))
+                        for name, (calls, total, longest) in timers.items()))
+
+
+def summary():
+    """ return the stats as lines of text, for an on screen overlay """
+    s = snapshot()
+    lines = ["%-20s %6d x %7.2f ms" % (name, t['calls'], t['mean']) for name, t in sorted(s['timers'].items())]
+    lines += ["%-20s %8d" % (name, n) for name, n in sorted(s['counters'].items())]
+    return lines
+
+
+def dumpTrace(filename):
+    """ save the trace events and a stats snapshot as json """
+    with _lock:
+        traceEvents = list(events or [])
+    with open(filename, "w") as fh:
+        json.dump(dict(traceEvents=traceEvents, displayTimeUnit="ms", stats=snapshot()), fh, indent=1)
+
+
+import unittest
+class TestStats(unittest.TestCase):
+    """ tests for the instrumentation """
+    def tearDown(self):
+        enable(False)
+        reset()
+
+    def test_disabled(self):
+        """ nothing is recorded while disabled """
+        with timer("a"):
+            count("b")
+        self.assertEqual(snapshot(), dict(counters={}, timers={}))
+        self.assertFalse(Point.__init__.__name__ == 'counted')
+
+    def test_counters(self):
+        """ Point allocations and solve calls are counted """
+        from geometry.base import Parallelogram
+        enable()
+        pgm = Parallelogram(Point(1,1), Point(2,4), Point(5,2))
+        reset()
+        pgm.paramsForPoint(Point(3,3))
+        c = snapshot()['counters']
+        self.assertEqual(c['solve'], 1)
+        self.assertTrue(c['Point'] > 0)
+        enable(False)
+        self.assertEqual(Point(1,2).coord, (1,2))
+        self.assertFalse(np.linalg.solve.__name__ == 'counted')
+
+    def test_trace(self):
+        """ timed sections are traced, and dumped as json """
+        import tempfile
+        enable(trace=True)
+        for _ in range(3):
+            with timer("frame"):
+                with timer("draw"):
+                    pass
+        s = snapshot()
+        self.assertEqual(s['timers']['frame']['calls'], 3)
+        self.assertTrue(s['timers']['frame']['total'] >= s['timers']['draw']['total'])
+        self.assertEqual(len(summary()), 2)
+        fd, name = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            dumpTrace(name)
+            with open(name) as fh:
+                data = json.load(fh)
+        finally:
+            os.remove(name)
+        self.assertEqual(len(data['traceEvents']), 6)
+        self.assertEqual(data['stats']['timers']['draw']['calls'], 3)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,245 @@
+"""
+Chunked generation of the points and line segments of a shape.
+
+`pointBlocks` and `lineBlocks` yield numpy arrays of at most `blocksize`
+rows, without ever holding the whole shape in memory: (N, dim) point
+coordinates, and (N, 2) point index pairs, in the order of
+`generatePoints` and `generateLines`.  Cube, Tetraeder and Octaeder are
+generated block by block for any dimension, the other shapes only exist
+in 3 or 4 dimensions, and are generated whole and then split.
+
+`writeShape` streams the blocks into memory mapped .npy files:
+
+    from geometry.platonic import Cube
+    writeShape("cube24", Cube, Point([0.0]*24))
+    lines = np.load("cube24.lines.npy", mmap_mode='r')
+"""
+from __future__ import division, print_function
+import itertools
+import numpy as np
+from geometry.base import Point
+from geometry.platonic import Tetraeder, Cube, PackedCube, Octaeder
+
+
+BLOCKSIZE = 1<<16
+
+
+def rechunk(blocks, blocksize):
+    """ regroup the rows of a sequence of arrays into arrays of exactly blocksize rows, except the last """
+    pending = []
+    count = 0
+    for block in blocks:
+        pending.append(block)
+        count += len(block)
+        if count < blocksize:
+            continue
+        merged = np.concatenate(pending)
+        for start in range(0, count-blocksize+1, blocksize):
+            yield merged[start:start+blocksize]
+        rest = count % blocksize
+        pending = [merged[count-rest:]] if rest else []
+        count = rest
+    if count:
+        yield np.concatenate(pending)
+
+
+def rowBlocks(nrows, blocksize):
+    """ yield (start, stop) for consecutive blocks of rows """
+    for start in range(0, nrows, blocksize):
+        yield start, min(start+blocksize, nrows)
+
+
+def arrayBlocks(a, blocksize):
+    """ yield consecutive blocks of rows of an array """
+    return (a[start:stop] for start, stop in rowBlocks(len(a), blocksize))
+
+
+def cubeCounts(dim):
+    """ return the number of points and line segments of the n-cube """
+    return 1<<dim, dim<<(dim-1)
+
+
+def cubePoints(p0, blocksize):
+    """ yield the n-cube points, decoded from the bit-packed cube """
+    packed = PackedCube(p0)
+    for start, stop in rowBlocks(len(packed), blocksize):
+        yield packed.decode(start, stop)
+
+
+def cubeLines(p0, blocksize):
+    """ yield the n-cube line segments, from the bit-packed cube """
+    return PackedCube(p0).edgeBlocks(max(1, blocksize//p0.dim()))
+
+
+def tetraCounts(dim):
+    """ return the number of points and line segments of the n-tetraeder """
+    return dim+1, dim*(dim+1)//2
+
+
+def tetraPoints(p0, blocksize):
+    """ yield the n-tetraeder points, block by block from Tetraeder.generateArray """
+    dim = p0.dim()
+    origin = np.asarray(p0.coord, dtype=float)
+    for start, stop in rowBlocks(dim+1, blocksize):
+        block = Tetraeder.generateArray(dim, start, stop)
+        block += origin
+        yield block
+
+
+def tetraLines(p0, blocksize):
+    """ yield the n-tetraeder line segments, a, b for every b < a """
+    def rows():
+        for a in range(1, p0.dim()+1):
+            yield np.stack([np.full(a, a, dtype=np.int64), np.arange(a, dtype=np.int64)], axis=1)
+    return rows()
+
+
+def octaCounts(dim):
+    """ return the number of points and line segments of the n-octaeder """
+    return 2*dim, 2*dim*(dim-1)
+
+
+def octaPoints(p0, blocksize):
+    """ yield the n-octaeder points, block by block from Octaeder.generateArray """
+    dim = p0.dim()
+    origin = np.asarray(p0.coord, dtype=float)
+    for start, stop in rowBlocks(2*dim, blocksize):
+        block = Octaeder.generateArray(dim, start, stop)
+        block += origin
+        yield block
+
+
+def octaLines(p0, blocksize):
+    """ yield the n-octaeder line segments, a, b for every b > a, except the point on the same axis """
+    def rows():
+        n = 2*p0.dim()
+        for a in range(n-1):
+            b = np.arange(a+1, n, dtype=np.int64)
+            b = b[b != a^1]
+            yield np.stack([np.full(len(b), a, dtype=np.int64), b], axis=1)
+    return rows()
+
+
+# class name -> (counts, points, lines) generators
+STREAMS = {
+    'Cube': (cubeCounts, cubePoints, cubeLines),
+    'Tetraeder': (tetraCounts, tetraPoints, tetraLines),
+    'Octaeder': (octaCounts, octaPoints, octaLines),
+}
+
+
+def counts(cls, dim):
+    """ return the number of points and line segments of a shape """
+    if cls.__name__ in STREAMS:
+        return STREAMS[cls.__name__][0](dim)
+    shape = cls(Point([0.0]*dim))
+    return len(shape.points), sum(1 for _ in shape.generateLines())
+
+
+def pointBlocks(cls, p0, blocksize=BLOCKSIZE):
+    """ yield the points of the shape of class cls at p0, as (N, dim) arrays """
+    if cls.__name__ in STREAMS:
+        return rechunk(STREAMS[cls.__name__][1](p0, blocksize), blocksize)
+    return arrayBlocks(cls.generateArray(p0.dim())+p0.coord, blocksize)
+
+
+def lineBlocks(cls, p0, blocksize=BLOCKSIZE):
+    """ yield the line segments of the shape of class cls at p0, as (N, 2) arrays of point indices """
+    if cls.__name__ in STREAMS:
+        return rechunk(STREAMS[cls.__name__][2](p0, blocksize), blocksize)
+    lines = iter(cls(p0).generateLines())
+    def blocks():
+        while True:
+            flat = np.fromiter(itertools.chain.from_iterable(itertools.islice(lines, blocksize)), dtype=np.int64)
+            if not len(flat):
+                return
+            yield flat.reshape(-1, 2)
+    return blocks()
+
+
+def writeBlocks(filename, blocks, shape, dtype):
+    """ write the blocks to a .npy file holding an array of the given shape, returns the number of rows written """
+    out = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape)
+    count = 0
+    for block in blocks:
+        out[count:count+len(block)] = block
+        count += len(block)
+    if count != shape[0]:
+        raise ValueError("%s: expected %d rows, got %d" % (filename, shape[0], count))
+    out.flush()
+    del out
+    return count
+
+
+def writeShape(prefix, cls, p0, blocksize=BLOCKSIZE):
+    """ write the points and lines of a shape to prefix.points.npy and prefix.lines.npy """
+    npoints, nlines = counts(cls, p0.dim())
+    writeBlocks(prefix+".points.npy", pointBlocks(cls, p0, blocksize), (npoints, p0.dim()), np.float64)
+    writeBlocks(prefix+".lines.npy", lineBlocks(cls, p0, blocksize), (nlines, 2), np.int64)
+
+
+import unittest
+class TestStream(unittest.TestCase):
+    """ tests for the chunked shape generation """
+    def test_blocks(self):
+        """ the blocks match the shape, and have the requested size """
+        from geometry import platonic
+        for cls, dim in ((Cube, 6), (Tetraeder, 7), (Octaeder, 6), (platonic.Dodecaeder, 3), (platonic.Cell120, 4)):
+            p0 = Point([0.5*i for i in range(dim)])
+            shape = cls(p0)
+            points = list(pointBlocks(cls, p0, 7))
+            lines = list(lineBlocks(cls, p0, 7))
+            self.assertTrue(all(len(b) == 7 for b in points[:-1] + lines[:-1]))
+            self.assertTrue(np.allclose(np.concatenate(points), [p.coord for p in shape.points]))
+            self.assertEqual(np.concatenate(lines).tolist(), [list(l) for l in shape.generateLines()])
+            self.assertEqual(counts(cls, dim), (len(shape.points), len(np.concatenate(lines))))
+
+    def test_large(self):
+        """ a high dimensional tetraeder and octaeder are streamed in small blocks """
+        dim = 3000
+        p0 = Point([1.0]*dim)
+        for cls in (Tetraeder, Octaeder):
+            count = 0
+            for block in pointBlocks(cls, p0, 16):
+                self.assertTrue(len(block) <= 16)
+                self.assertTrue(np.array_equal(block, cls.generateArray(dim, count, count+len(block))+1.0))
+                count += len(block)
+            self.assertEqual(count, counts(cls, dim)[0])
+
+        # the memory used does not grow with the number of points
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            for block in pointBlocks(Octaeder, p0, 16):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertTrue(peak < 2*dim*dim*8/20, peak)
+
+    def test_rechunk(self):
+        """ blocks of any size, including empty ones, are regrouped in order """
+        blocks = [np.arange(n) for n in (3, 0, 9, 1, 1)]
+        self.assertEqual([len(b) for b in rechunk(blocks, 4)], [4, 4, 4, 2])
+        self.assertEqual(np.concatenate(list(rechunk(blocks, 4))).tolist(), np.concatenate(blocks).tolist())
+
+    def test_write(self):
+        """ written shapes load as memory maps """
+        import os, shutil, tempfile
+        tmpdir = tempfile.mkdtemp()
+        try:
+            prefix = os.path.join(tmpdir, "cube")
+            writeShape(prefix, Cube, Point([0.0]*10), blocksize=100)
+            points = np.load(prefix+".points.npy", mmap_mode='r')
+            lines = np.load(prefix+".lines.npy", mmap_mode='r')
+            self.assertEqual(points.shape, (1024, 10))
+            self.assertEqual(lines.shape, (5120, 2))
+            self.assertTrue(np.all(np.abs(points[lines[:, 0]]-points[lines[:, 1]]).sum(axis=1) == 1))
+            self.assertRaises(ValueError, writeBlocks, prefix+".x.npy", iter([np.zeros((2, 2))]), (3, 2), float)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
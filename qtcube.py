@@ -1,11 +1,22 @@
 """ display platonic shapes using various python graphics libraries """
 from __future__ import division, print_function
 import math
-
-from geometry.base import *
-from geometry.platonic import *
-from geometry.other import *
-from geometry.polar import *
+import sys
+import threading
+import traceback
+from collections import deque
+import numpy as np
+from timeit import default_timer
+
+import geometry
+from geometry.base import Point, Line, Parallelogram, Axis
+from geometry.platonic import Tetraeder, Cube, Octaeder, Dodecaeder, Icosaeder
+from geometry.projection import Camera, painterOrder
+from geometry.raster import Canvas, LineZBuffer
+from geometry.picking import GridIndex
+from geometry.sphere import Sphere
+from geometry.scene import Scene, Transform
+from geometry import stats
 
 ################# controls for use with qt #######################
 
@@ -28,35 +39,299 @@ class Slider:
         self.cur = self.line.paramsForPoint(pt)
 
 
-class Sphere(object):
-    def __init__(self, origin, radius):
-        self.origin = origin
-        self.radius = radius
-
-    def dim(self):
-        return self.origin.dim()
-
-
-class Axis(object):
-    def __init__(self, dim):
-        self.points = []
-        self._dim = dim
-        for i in range(dim):
-            self.points.append(Point(-10 if j==i else 0 for j in range(dim)))
-            self.points.append(Point(10 if j==i else 0 for j in range(dim)))
-
-    def dim(self):
-        return self._dim
-
-    def generateLines(self):
-        for i in range(self.dim()):
-            yield 2*i, 2*i+1
+class FrameStats:
+    """ keeps track of the time spent producing frames """
+    def __init__(self, history=60):
+        self.count = 0
+        self.last = 0.0
+        self.times = deque(maxlen=history)
+        self.t0 = None
+    def start(self):
+        """ mark the start of a frame """
+        self.t0 = default_timer()
+    def stop(self):
+        """ mark the end of a frame, and record its time """
+        self.last = default_timer()-self.t0
+        self.times.append(self.last)
+        self.count += 1
+    def average(self):
+        """ average frame time in seconds over the recent history """
+        if not self.times:
+            return 0.0
+        return sum(self.times)/len(self.times)
+    def fps(self):
+        """ frames per second, from the average frame time """
+        avg = self.average()
+        return 1.0/avg if avg else 0.0
+
+
+class FrameWorker:
+    """
+    Prepares frames on a background thread.
+
+    `request` replaces any request not yet started, so stale slider positions
+    are skipped.  The latest completed frame is kept in `latest`, and `done` is
+    called from the worker thread each time a frame completes.  When computing
+    a frame fails, the traceback is printed and kept in `error`, until a later
+    frame succeeds, and the worker keeps serving requests.
+    """
+    def __init__(self, compute, done=None):
+        self.compute = compute
+        self.done = done
+        self.latest = None
+        self.error = None
+        self.pending = None
+        self.stopped = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+    def request(self, *args):
+        """ ask for a frame computed from args, replacing any pending request """
+        with self.cond:
+            self.pending = args
+            self.cond.notify()
+    def stop(self):
+        """ stop the worker thread, and wait for it to finish """
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        self.thread.join()
+    def run(self):
+        """ the worker thread: compute the requested frames """
+        while True:
+            with self.cond:
+                while self.pending is None and not self.stopped:
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                args, self.pending = self.pending, None
+            try:
+                self.latest = self.compute(*args)
+                self.error = None
+            except Exception:
+                self.error = traceback.format_exc()
+                sys.stderr.write(self.error)
+            if self.done:
+                self.done()
+
+
+def cubeScene():
+    """ the scene shown by CubeView and the offscreen renderer, styled with rgb colors """
+    scene = Scene(3)
+    scene.add(Axis(3),                  style=(128, 128, 128))
+    scene.add(Cube(Point(0,0,1)),       style=(255,   0,   0))
+    scene.add(Tetraeder(Point(0,1,0)),  style=(  0, 255,   0))
+    scene.add(Octaeder(Point(1,0,0)),   style=(  0,   0, 255))
+    scene.add(Dodecaeder(Point(1,1,1)), style=(  0, 255, 255))
+    scene.add(Icosaeder(Point(2,2,2)),  style=(  0, 255, 255))
+    return scene
+
+def cubeScreen(params):
+    """ map viewport params to the window coordinates used by CubeView """
+    return np.column_stack([100+params[:,0]*50, 400-params[:,1]*50])
+
+def projectScene(camera, scene, toscreen):
+    """
+    Project the vertices of all scene entries in one pass.
+
+    Returns screen positions and depths of all vertices, the lines as vertex index pairs,
+    the faces as vertex index cycles, and for each line the index of its entry.
+    """
+    with stats.timer("projection"):
+        points = scene.vertices()
+        screen, depth = toscreen(camera.project(points)), camera.depth(points)
+    with stats.timer("edges"):
+        lines, faces, owner = scene.lines(), scene.faces(), scene.lineOwner()
+    return screen, depth, lines, faces, owner
+
+def visibleLines(screen, depth, lines, faces, width, height, hidden):
+    """
+    Return the (N, 4) screen segments to draw, back to front, and the index of the line each belongs to.
+
+    In hidden line mode the parts of lines behind faces or other lines are left out.
+    """
+    if hidden:
+        zbuf = LineZBuffer(width, height)
+        zbuf.addFaces(screen, depth, faces)
+        return zbuf.visibleSegments(screen, depth, lines)
+    order = painterOrder(depth, lines)
+    segments = screen[lines[order]].reshape(-1, 4)
+    ok = np.isfinite(segments).all(axis=1)
+    return segments[ok], order[ok]
+
+def drawFrame(camera, vertices, lines, faces, owner, colors, width, height, hidden):
+    """ draw the lines of a vertex buffer, as seen by camera, on a new Canvas """
+    with stats.timer("projection"):
+        screen, depth = cubeScreen(camera.project(vertices)), camera.depth(vertices)
+    with stats.timer("visibility"):
+        segments, which = visibleLines(screen, depth, lines, faces, width, height, hidden)
+    canvas = Canvas(width, height)
+    with stats.timer("draw"):
+        for i, color in enumerate(colors):
+            canvas.drawSegments(segments[owner[which]==i], color)
+    return canvas
+
+def renderOffscreen(filename, width=640, height=480, hidden=False):
+    """ render the CubeView scene, with its sliders at their initial position, to a PPM image """
+    scene = cubeScene()
+    camera = Camera.orbit(7.5, 0.5, 0.5, 0.5)
+    canvas = drawFrame(camera, scene.vertices(), scene.lines(), scene.faces(), scene.lineOwner(), scene.styles(), width, height, hidden)
+    canvas.writePPM(filename)
+
+################# batch rendering of animations #######################
+
+def orbitPath(frames, distance=7.5, latitude=0.5, portdistance=0.5, turns=1.0):
+    """
+    Return a camera path circling the origin, as an (F, 4) array
+    of (distance, latitude, longitude, portdistance) per frame.
+    """
+    path = np.empty((frames, 4))
+    path[:, 0] = distance
+    path[:, 1] = latitude
+    path[:, 2] = np.arange(frames)*2*math.pi*turns/frames
+    path[:, 3] = portdistance
+    return path
+
+def loadCameraPath(filename):
+    """ read a camera path: one line of 'distance latitude longitude portdistance' per frame """
+    return np.loadtxt(filename, ndmin=2).reshape(-1, 4)
+
+class SharedArrays:
+    """ numpy arrays copied to one shared memory block, so worker processes can map them instead of unpickling """
+    def __init__(self, arrays):
+        from multiprocessing import shared_memory
+        self.layout = []
+        offset = 0
+        for name, a in arrays.items():
+            a = np.ascontiguousarray(a)
+            self.layout.append((name, a.dtype.str, a.shape, offset))
+            # keep all arrays 8 byte aligned
+            offset += (a.nbytes+7)&~7
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, a in self.attach(self.shm, self.layout).items():
+            a[...] = arrays[name]
+
+    def spec(self):
+        """ the picklable description needed by `SharedArrays.open` """
+        return self.shm.name, self.layout
+
+    @staticmethod
+    def attach(shm, layout):
+        """ return dict of array views on the shared memory block """
+        return dict((name, np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)) for name, dtype, shape, offset in layout)
+
+    @staticmethod
+    def open(spec):
+        """ map the shared arrays in another process, returns the block and the arrays """
+        from multiprocessing import shared_memory
+        name, layout = spec
+        shm = shared_memory.SharedMemory(name=name)
+        return shm, SharedArrays.attach(shm, layout)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+# the shared scene of a batch worker process, set by batchInit
+batchScene = None
+
+def batchInit(spec, colors, width, height, hidden, pattern):
+    """ process pool initializer: map the shared scene arrays """
+    global batchScene
+    shm, arrays = SharedArrays.open(spec)
+    # faces are stored as concatenated cycles, with the length of each cycle
+    ends = np.cumsum(arrays['facesizes'])
+    faces = [cycle.tolist() for cycle in np.split(arrays['faces'], ends[:-1])] if len(ends) else []
+    batchScene = dict(shm=shm, arrays=arrays, faces=faces, colors=colors, width=width, height=height, hidden=hidden, pattern=pattern)
+
+def batchFrame(job):
+    """ render frame `i` of the camera path, write it to a numbered image, or return its pixels """
+    i, (distance, latitude, longitude, portdistance) = job
+    b = batchScene
+    a = b['arrays']
+    camera = Camera.orbit(distance, latitude, longitude, portdistance)
+    canvas = drawFrame(camera, a['vertices'], a['lines'], b['faces'], a['owner'], b['colors'], b['width'], b['height'], b['hidden'])
+    if b['pattern']:
+        canvas.writePPM(b['pattern'] % i)
+        return b''
+    return canvas.tobytes()
+
+def renderBatch(path, output, width=640, height=480, hidden=False, jobs=None):
+    """
+    Render the CubeView scene for each camera position in path, using a pool of `jobs` processes.
+
+    When output contains a '%' format, each frame is written to a numbered PPM image,
+    otherwise the raw rgb frames are written one after the other to output, '-' is stdout.
+    Returns the number of frames per second.
+    """
+    import sys
+    import multiprocessing
+
+    scene = cubeScene()
+    faces = scene.faces()
+    shared = SharedArrays(dict(
+        vertices=scene.vertices(),
+        lines=scene.lines(),
+        owner=scene.lineOwner(),
+        faces=np.array([i for cycle in faces for i in cycle], dtype=int),
+        facesizes=np.array([len(cycle) for cycle in faces], dtype=int)))
+
+    pattern = output if '%' in output else None
+    initargs = (shared.spec(), scene.styles(), width, height, hidden, pattern)
+    frames = list(enumerate(path.tolist()))
+    stream = None
+    if not pattern:
+        stream = sys.stdout.buffer if output=='-' else open(output, 'wb')
+
+    t0 = default_timer()
+    pool = None
+    try:
+        if jobs==1:
+            batchInit(*initargs)
+            results = map(batchFrame, frames)
+        else:
+            pool = multiprocessing.Pool(jobs, batchInit, initargs)
+            results = pool.imap(batchFrame, frames, chunksize=max(1, len(frames)//(4*(jobs or multiprocessing.cpu_count()))))
+        # imap returns the frames in order, so the stream can be written as they come
+        for data in results:
+            if stream:
+                stream.write(data)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if stream and output!='-':
+            stream.close()
+        shared.close()
+    elapsed = default_timer()-t0
+    fps = len(frames)/elapsed if elapsed else 0.0
+    print("rendered %d frames of %dx%d in %.2f s, %.1f frames/sec" % (len(frames), width, height, elapsed, fps), file=sys.stderr)
+    return fps
+
+class CubeFrame:
+    """ a CubeView frame, ready to draw """
+    def __init__(self, scene, key):
+        # key holds the four slider values, the toggle states and the window size
+        dist, port, lat, lon, flat, hidden, width, height = key
+        self.key = key
+        camera = Camera.orbit(5*(1.0+dist), lat, lon, port)
+        camera.perspective = not flat
+        self.screen, depth, self.lines, faces, owner = projectScene(camera, scene, cubeScreen)
+        with stats.timer("visibility"):
+            self.segments, which = visibleLines(self.screen, depth, self.lines, faces, width, height, hidden)
+        self.owner = owner[which]
+        with stats.timer("picking index"):
+            self.index = GridIndex(self.screen, self.lines, bounds=(width, height))
 
 ################# 3d display using qt #######################
 
 def runqt3d():
     from PySide import QtGui, QtCore
     class CubeView(QtGui.QWidget):
+        # emitted from the worker thread, delivered on the gui thread
+        frameReady = QtCore.Signal()
+
         def __init__(self):
             super(CubeView, self).__init__()
 
@@ -64,24 +339,33 @@ def runqt3d():
             
             self.defineObjects()
 
+            # highlight the point or line under the mouse
+            self.setMouseTracking(True)
+
+            # frames are prepared on a worker thread, paintEvent only draws the latest one.
+            self.frameReady.connect(self.update)
+            self.worker = FrameWorker(lambda key: CubeFrame(self.scene, key), self.frameReady.emit)
+
             self.setGeometry(300, 300, 640, 480)
             self.setWindowTitle('cube')
             self.show()
             self.raise_()
 
         def defineObjects(self):
-            self.cube = Cube(Point(0,0,1))
-            self.tetra = Tetraeder(Point(0,1,0))
-            self.octa = Octaeder(Point(1,0,0))
-            self.dode = Dodecaeder(Point(1,1,1))
-            self.ico = Icosaeder(Point(2,2,2))
-            self.axis = Axis(3)
+            self.scene = cubeScene()
+            self.colors = [QtGui.QColor(*color) for color in self.scene.styles()]
+            self.timernames = ["draw " + type(e.shape).__name__ for e in self.scene.entries]
 
-            # set in drawItems
-            self.viewport = None
-            self.viewpoint = None
+            # the view last requested from the worker
+            self.requested = None
+            # the point or line under the mouse, and the frame it was picked in
+            self.hover = None
+            self.hoverframe = None
 
+            # the toggle switches from perspective to non-perspective view.
             self.toggle = Toggle(Point(100,100))
+            # the second toggle switches hidden line removal on.
+            self.hidden = Toggle(Point(100,130))
             self.sl1 = Slider(Point(100, 10), Point(200, 10))  # viewpoint distance
             self.sl2 = Slider(Point(100, 20), Point(200, 20))  # viewport distance
             self.sl3 = Slider(Point(100, 30), Point(200, 30))  # viewpoint rho
@@ -93,9 +377,10 @@ def runqt3d():
                 self.update()
                 self.captured = None
                 return
-            if self.toggle.contains(Point(e.x(), e.y())):
-                self.toggle.state = not self.toggle.state
-                self.update()
+            for t in [self.toggle, self.hidden]:
+                if t.contains(Point(e.x(), e.y())):
+                    t.state = not t.state
+                    self.update()
         def mousePressEvent(self, e):
             self.captured = None
             for o in [self.sl1, self.sl2, self.sl3, self.sl4]:
@@ -106,14 +391,41 @@ def runqt3d():
             if self.captured:
                 self.captured.update(Point(e.x(), e.y()))
                 self.update()
-            
+            elif self.worker.latest:
+                frame = self.worker.latest
+                hover = frame.index.pick((e.x(), e.y()))
+                if hover != self.hover or frame is not self.hoverframe:
+                    self.hover = hover
+                    self.hoverframe = frame
+                    self.update()
+
+        def closeEvent(self, e):
+            self.worker.stop()
+
+        def viewKey(self):
+            return tuple(s.cur for s in [self.sl1, self.sl2, self.sl3, self.sl4]) + (self.toggle.state, self.hidden.state, self.width(), self.height())
 
         def paintEvent(self, e):
+            key = self.viewKey()
+            if key != self.requested:
+                self.requested = key
+                self.worker.request(key)
+
             qp = QtGui.QPainter()
             qp.begin(self)
-            self.drawItems(qp)
+            with stats.timer("paint"):
+                self.drawItems(qp)
+            if stats.enabled:
+                self.drawStats(qp)
             qp.end()
 
+        def drawStats(self, qp):
+            # profiling overlay, in the bottom left corner
+            qp.setPen(QtCore.Qt.darkGray)
+            lines = stats.summary()
+            for i, line in enumerate(lines):
+                qp.drawText(10, self.height()-10-14*(len(lines)-1-i), line)
+
         @staticmethod
         def qpt(*arg):
             if len(arg)==1 and isinstance(arg[0], Point):
@@ -131,34 +443,41 @@ def runqt3d():
                 return QtCore.QPoint(arg[0],arg[1])
 
         def drawItems(self, qp):
-            vp = self.viewpoint = Point.PointFromNSpherical(5*(1.0+self.sl1.cur), self.sl3.cur, self.sl4.cur)
-            p1 = Point(-vp.y,vp.x,0)
-            p2 = Point(0,-vp.z,vp.y)
-            #p2 = p1.cross(vp)
-            self.viewport = Parallelogram.fromPointAndVectors(vp*self.sl2.cur, p1, p2)
-            self.drawObject(qp, self.axis, QtCore.Qt.gray)
-            self.drawObject(qp, self.cube, QtCore.Qt.red)
-            self.drawObject(qp, self.tetra, QtCore.Qt.green)
-            self.drawObject(qp, self.octa, QtCore.Qt.blue)
-            self.drawObject(qp, self.dode, QtCore.Qt.cyan)
-            self.drawObject(qp, self.ico, QtCore.Qt.cyan)
+            frame = self.worker.latest
+            if frame:
+                self.drawSegments(qp, frame.segments, frame.owner)
+                if frame is self.hoverframe:
+                    self.drawHover(qp, frame)
+            if self.worker.error:
+                qp.setPen(QtCore.Qt.red)
+                qp.drawText(10, 70, self.worker.error.strip().splitlines()[-1])
 
             self.drawToggle(qp, self.toggle)
+            self.drawToggle(qp, self.hidden)
             self.drawSlider(qp, self.sl1, "vp distance")
             self.drawSlider(qp, self.sl2, "port distance")
             self.drawSlider(qp, self.sl3, "latitude")   # elevation, -90 .. 90
             self.drawSlider(qp, self.sl4, "longitude")  # azimuth, -180 .. 180
 
-        def projectOnView(self, pt):
-            if self.toggle.state:
-                # todo -- this gives the wrong result
-                return Point(self.viewport.projectionParams(pt))
+        def drawSegments(self, qp, segments, owner):
+            # segments are in drawing order, the pen only changes where the owning object changes
+            if not len(owner):
+                return
+            changes = np.flatnonzero(np.diff(owner))+1
+            for first, last in zip(np.r_[0, changes], np.r_[changes, len(owner)]):
+                with stats.timer(self.timernames[owner[first]]):
+                    qp.setPen(self.colors[owner[first]])
+                    qp.drawLines([QtCore.QLineF(*seg) for seg in segments[first:last].tolist()])
+
+        def drawHover(self, qp, frame):
+            if not self.hover:
+                return
+            kind, i = self.hover
+            qp.setPen(QtGui.QPen(QtCore.Qt.black, 3))
+            if kind=='point':
+                qp.drawEllipse(QtCore.QPointF(*frame.screen[i]), 4, 4)
             else:
-                return Point(self.viewport.intersectionParams(Line(pt, self.viewpoint)))
-
-        def drawObject(self, qp, obj, color):
-            for a,b in obj.generateLines():
-                self.drawLine(qp, self.projectOnView(obj.points[a]), self.projectOnView(obj.points[b]), color)
+                qp.drawLine(QtCore.QLineF(*frame.screen[frame.lines[i]].reshape(4)))
 
         def drawDot(self, qp, p):
             qp.fillRect(QtCore.QRect(self.qpt(p), QtCore.QSize(2,2)), QtCore.Qt.blue)
@@ -186,6 +505,171 @@ def runqt3d():
     ex = CubeView()
     app.exec_()
 
+################# 4d display using qt #######################
+
+# the shapes which can be shown by --hyper, see geometry.SHAPES
+HYPERSHAPES = ['tetra', 'cube', 'octa', 'cell24', 'cell120', 'cell600']
+
+def runqt4d(shapename, planes):
+    from PySide import QtGui, QtCore
+    from geometry.rotation import parsePlanes, planeName, rotationMatrix
+    from geometry.projection import perspective, schlegel
+    class HyperView(QtGui.QWidget):
+        # rotates a 4-d shape, projects it to 3-d, then uses the 3-d camera of CubeView.
+        def __init__(self):
+            super(HyperView, self).__init__()
+
+            self.captured = None
+
+            self.defineObjects()
+
+            # highlight the point or line under the mouse
+            self.setMouseTracking(True)
+
+            self.setGeometry(300, 300, 640, 480)
+            self.setWindowTitle(shapename)
+            self.show()
+            self.raise_()
+
+        def defineObjects(self):
+            shape = geometry.shapeClass(shapename)(Point(0,0,0,0))
+            self.scene = Scene(4)
+            self.scene.add(shape)
+            # all shapes are scaled to unit radius, before rotating
+            radius = np.sqrt((self.scene.vertices()**2).sum(axis=1)).max()
+            self.scaling = Transform.scaling(1.0/radius, 4)
+            self.lines = self.scene.lines()
+
+            self.planes = parsePlanes(planes, 4)
+
+            # picking index, rebuilt when the view changes
+            self.screen = None
+            self.index = None
+            self.indexkey = None
+            self.hover = None
+
+            # the toggle switches between perspective and schlegel projection
+            self.toggle = Toggle(Point(100,100))
+            self.sl1 = Slider(Point(100, 10), Point(200, 10))  # viewpoint distance
+            self.sl2 = Slider(Point(100, 20), Point(200, 20))  # viewport distance
+            self.sl3 = Slider(Point(100, 30), Point(200, 30))  # viewpoint rho
+            self.sl4 = Slider(Point(100, 40), Point(200, 40))  # viewpoint phi
+            # one slider per rotation plane
+            self.rotsliders = []
+            for i in range(len(self.planes)):
+                sl = Slider(Point(100, 60+10*i), Point(200, 60+10*i))
+                sl.cur = 0.0
+                self.rotsliders.append(sl)
+
+        def sliders(self):
+            return [self.sl1, self.sl2, self.sl3, self.sl4] + self.rotsliders
+
+        def mouseReleaseEvent(self, e):
+            if self.captured:
+                self.captured.update(Point(e.x(), e.y()))
+                self.update()
+                self.captured = None
+                return
+            if self.toggle.contains(Point(e.x(), e.y())):
+                self.toggle.state = not self.toggle.state
+                self.update()
+        def mousePressEvent(self, e):
+            self.captured = None
+            for o in self.sliders():
+                if o.current().distance(Point(e.x(), e.y()))<5:
+                    self.captured = o
+                    return
+        def mouseMoveEvent(self, e):
+            if self.captured:
+                self.captured.update(Point(e.x(), e.y()))
+                self.update()
+            elif self.index:
+                hover = self.index.pick((e.x(), e.y()))
+                if hover != self.hover:
+                    self.hover = hover
+                    self.update()
+
+        def viewKey(self):
+            return tuple(s.cur for s in self.sliders()) + (self.toggle.state, self.width(), self.height())
+
+        def paintEvent(self, e):
+            qp = QtGui.QPainter()
+            qp.begin(self)
+            self.drawItems(qp)
+            qp.end()
+
+        @staticmethod
+        def pt(*arg):
+            if len(arg)==1 and isinstance(arg[0], Point):
+                return HyperView.pt(arg[0].x, arg[0].y)
+            if len(arg)==2:
+                return QtCore.QPoint(arg[0],arg[1])
+
+        def projectVertices(self):
+            """ rotate in 4-d, project to 3-d, then onto the viewport, all in one pass """
+            angles = [2*math.pi*sl.cur for sl in self.rotsliders]
+            self.scene.setTransform(0, self.scaling.then(Transform(rotationMatrix(4, self.planes, angles))))
+            v4 = self.scene.vertices()
+            if self.toggle.state:
+                v3 = schlegel(v4)
+            else:
+                v3 = perspective(v4, 3.0)
+            camera = Camera.orbit(5*(1.0+self.sl1.cur), self.sl3.cur, self.sl4.cur, self.sl2.cur)
+            v2 = camera.project(v3)
+
+            # map viewport params to window coordinates
+            scale = min(self.width(), self.height())/4.0
+            return np.column_stack([self.width()/2.0+v2[:,0]*scale, self.height()/2.0-v2[:,1]*scale])
+
+        def drawItems(self, qp):
+            key = self.viewKey()
+            if key != self.indexkey:
+                self.screen = self.projectVertices()
+                self.index = GridIndex(self.screen, self.lines, bounds=(self.width(), self.height()))
+                self.indexkey = key
+                self.hover = None
+            scr = self.screen
+            segments = scr[self.lines].reshape(-1, 4)
+            segments = segments[np.isfinite(segments).all(axis=1)]
+            qp.setPen(QtCore.Qt.red)
+            qp.drawLines([QtCore.QLineF(*seg) for seg in segments.tolist()])
+
+            if self.hover:
+                kind, i = self.hover
+                qp.setPen(QtGui.QPen(QtCore.Qt.black, 3))
+                if kind=='point':
+                    qp.drawEllipse(QtCore.QPointF(*scr[i]), 4, 4)
+                else:
+                    qp.drawLine(QtCore.QLineF(*scr[self.lines[i]].reshape(4)))
+
+            self.drawToggle(qp, self.toggle)
+            self.drawSlider(qp, self.sl1, "vp distance")
+            self.drawSlider(qp, self.sl2, "port distance")
+            self.drawSlider(qp, self.sl3, "latitude")
+            self.drawSlider(qp, self.sl4, "longitude")
+            for plane, sl in zip(self.planes, self.rotsliders):
+                self.drawSlider(qp, sl, "rotate " + planeName(plane))
+
+        def drawToggle(self, qp, t):
+            if t.state:
+                qp.fillRect(QtCore.QRect(*t.rect()), QtCore.Qt.black)
+            else:
+                qp.setPen(QtCore.Qt.black)
+                qp.drawRect(QtCore.QRect(*t.rect()))
+
+        def drawSlider(self, qp, s, desc):
+            qp.setPen(QtCore.Qt.black)
+            qp.drawLine(self.pt(s.line.p1), self.pt(s.line.p2))
+            qp.drawText(self.pt(s.line.p2), desc)
+
+            pt = s.current()
+            qp.setPen(QtCore.Qt.blue)
+            qp.drawLine(self.pt(pt-Point(0,5)), self.pt(pt+Point(0,5)))
+
+    app = QtGui.QApplication([])
+    ex = HyperView()
+    app.exec_()
+
 ################# 2d display using qt #######################
 
 def runqt2d():
@@ -263,7 +747,7 @@ def runqt2d():
 
 ################# display using pygame #######################
 
-def rungame():
+def rungame(fps=60):
     import pygame
     class PygameView:
         BLACK = (  0,   0,   0)
@@ -275,16 +759,22 @@ def rungame():
         CYAN  = (  0, 255, 255)
 
 
-        def __init__(self):
+        def __init__(self, fps):
             pygame.init()
             pygame.font.init()
 
             self.defineObjects()
 
+            # target frame rate while dragging, 0 means uncapped.
+            self.fps = fps
+            # time spent in drawItems + flip, for monitoring.
+            self.stats = FrameStats()
+
             self.screen = pygame.display.set_mode((640,480), pygame.RESIZABLE)
         def run(self):
             clock = pygame.time.Clock()
             done = False
+            dirty = True
 
             grabbed_item = None
 
@@ -292,9 +782,16 @@ def rungame():
             grababels = [self.sl1, self.sl2]
 
             while not done:
-                clock.tick(10)
-
-                for event in pygame.event.get(): # User did something
+                if dirty:
+                    events = pygame.event.get()
+                else:
+                    # nothing to draw: sleep until the user does something, also while
+                    # dragging, a still mouse sends no events.
+                    events = [pygame.event.wait()] + pygame.event.get()
+
+                # only the last motion event of a batch is used to move the slider
+                motion = None
+                for event in events: # User did something
                     if event.type == pygame.KEYUP:
                         if event.dict['key']==113 and event.dict['mod']&0xc00:
                             # Cmd-q
@@ -303,12 +800,18 @@ def rungame():
                         done = True # Flag that we are done so we exit this loop
                     elif event.type == pygame.VIDEORESIZE:
                         self.screen = pygame.display.set_mode(event.dict['size'], pygame.RESIZABLE)
+                        dirty = True
+                    elif event.type in (pygame.VIDEOEXPOSE, pygame.ACTIVEEVENT):
+                        dirty = True
                     elif event.type == pygame.MOUSEBUTTONUP:
                         if grabbed_item:
                             grabbed_item.update(Point(event.pos))
                             grabbed_item = None
+                            motion = None
+                            dirty = True
                         elif self.toggle.contains(event.pos):
                             self.toggle.state = not self.toggle.state
+                            dirty = True
                     elif event.type == pygame.MOUSEBUTTONDOWN:
                         for p in grababels:
                             if p.current().distance(Point(event.pos))<3:
@@ -316,23 +819,40 @@ def rungame():
                                 break
                     elif event.type == pygame.MOUSEMOTION:
                         if grabbed_item:
-                            grabbed_item.update(Point(event.pos))
+                            motion = event.pos
+
+                if motion and grabbed_item:
+                    grabbed_item.update(Point(motion))
+                    dirty = True
 
                 # All drawing code happens after the for loop and but
                 # inside the main while done==False loop.
 
-                # Clear the screen and set the screen background
-                self.screen.fill(PygameView.WHITE)
-                self.drawItems(self.screen)
-                pygame.display.flip()
+                if dirty and not done:
+                    self.stats.start()
+                    # Clear the screen and set the screen background
+                    self.screen.fill(PygameView.WHITE)
+                    with stats.timer("paint"):
+                        self.drawItems(self.screen)
+                    if stats.enabled:
+                        self.drawStats(self.screen)
+                    pygame.display.flip()
+                    self.stats.stop()
+                    pygame.display.set_caption("shapes - %.1f ms/frame" % (1000*self.stats.average()))
+                    dirty = False
+
+                if grabbed_item:
+                    # limit the frame rate while dragging
+                    clock.tick(self.fps)
 
         def defineObjects(self):
-            self.cube = Cube(Point(0,0,1))
-            self.tetra = Tetraeder(Point(0,0,3))
-            self.octa = Octaeder(Point(0,0,5))
-            self.dode = Dodecaeder(Point(0,0,8))
-            self.ico = Icosaeder(Point(0,4,0))
-            self.axis = Axis(3)
+            self.scene = Scene(3)
+            self.scene.add(Axis(3),                  style=PygameView.GRAY)
+            self.scene.add(Cube(Point(0,0,1)),       style=PygameView.RED)
+            self.scene.add(Tetraeder(Point(0,0,3)),  style=PygameView.GREEN)
+            self.scene.add(Octaeder(Point(0,0,5)),   style=PygameView.BLUE)
+            self.scene.add(Dodecaeder(Point(0,0,8)), style=PygameView.CYAN)
+            self.scene.add(Icosaeder(Point(0,4,0)),  style=PygameView.CYAN)
 
             # set in drawItems
             self.viewport = None
@@ -362,27 +882,32 @@ def rungame():
         def drawItems(self, qp):
             self.viewpoint = Point(5,5,5)*(1.0+self.sl1.cur)
             self.viewport = Parallelogram.fromPointAndVectors(Point(4,4,4)*(1.0+self.sl2.cur), Point(-1,-1,1), Point(1,-1,-1))
-            self.drawObject(qp, self.axis,  PygameView.GRAY)
-            self.drawObject(qp, self.cube,  PygameView.RED)
-            self.drawObject(qp, self.tetra, PygameView.GREEN)
-            self.drawObject(qp, self.octa,  PygameView.BLUE)
-            self.drawObject(qp, self.dode,  PygameView.CYAN)
-            self.drawObject(qp, self.ico,   PygameView.CYAN)
+            self.drawScene(qp, self.scene)
 
             self.drawToggle(qp, self.toggle)
             self.drawSlider(qp, self.sl1)
             self.drawSlider(qp, self.sl2)
 
-        def projectOnView(self, pt):
-            # transform 3d coord to 2d
-            if self.toggle.state:
-                return Point(self.viewport.projectionParams(pt))
-            else:
-                return Point(self.viewport.intersectionParams(Line(pt, self.viewpoint)))
-
-        def drawObject(self, qp, obj, color):
-            for a,b in obj.generateLines():
-                self.drawLine(qp, self.projectOnView(obj.points[a]), self.projectOnView(obj.points[b]), color)
+        def drawScene(self, qp, scene):
+            # project all vertices at once, the toggle selects the non-perspective view
+            camera = Camera(self.viewpoint, self.viewport, perspective=not self.toggle.state)
+            with stats.timer("projection"):
+                screen = cubeScreen(camera.project(scene.vertices()))
+            with stats.timer("edges"):
+                segments = screen[scene.lines()].reshape(-1, 4)
+                ok = (abs(segments) < 100000).all(axis=1)
+                owner = scene.lineOwner()
+            for i, e in enumerate(scene.entries):
+                with stats.timer("draw " + type(e.shape).__name__):
+                    for seg in segments[ok & (owner==i)].tolist():
+                        pygame.draw.line(qp, e.style, seg[:2], seg[2:], 1)
+
+        def drawStats(self, qp):
+            # profiling overlay, in the bottom left corner
+            font = pygame.font.SysFont("monospace", 12)
+            lines = stats.summary()
+            for i, line in enumerate(lines):
+                qp.blit(font.render(line, True, PygameView.GRAY), (10, qp.get_height()-20-14*(len(lines)-1-i)))
 
         ## primitive drawing functions
         def drawDot(self, qp, p):
@@ -401,7 +926,7 @@ def rungame():
 
             pt = s.current()
             pygame.draw.line(qp, PygameView.BLUE, self.pt(pt-Point(0,10)), self.pt(pt+Point(0,10)), 1)
-    PygameView().run()
+    PygameView(fps).run()
 
 
 ################# display using matplotlib #######################
@@ -412,12 +937,13 @@ class MatplotView:
     def __init__(self):
 
         # first define several objects, each with a position at which they are to be displayed.
-        self.aa = Axis(3)
-        self.c = Cube(Point(0,0,1))
-        self.t = Tetraeder(Point(0,0,3))
-        self.o = Octaeder(Point(0,0,5))
-        self.d = Dodecaeder(Point(0,0,8))
-        self.i = Icosaeder(Point(0,4,0))
+        self.scene = Scene(3)
+        self.scene.add(Axis(3),                  style='gray')
+        self.scene.add(Cube(Point(0,0,1)),       style='r')
+        self.scene.add(Tetraeder(Point(0,0,3)),  style='g')
+        self.scene.add(Octaeder(Point(0,0,5)),   style='b')
+        self.scene.add(Dodecaeder(Point(0,0,8)), style='c')
+        self.scene.add(Icosaeder(Point(0,4,0)),  style='c')
         self.sphere = Sphere(Point(4,0,0), 2.0)
 
         # the viewport
@@ -429,32 +955,29 @@ class MatplotView:
 
     def drawLine(self, ax, p, q):
         ax.plot((p.x, q.x), (p.y, q.y), (p.z, q.z))
-    def drawObject(self, ax, obj):
-        for p in obj.points:
-            ax.scatter(p.x, p.y, p.z, c='r', marker='o')
-        for a,b in obj.generateLines():
-            self.drawLine(ax, obj.points[a], obj.points[b])
+    def drawObject(self, ax, obj, color='k'):
+        from mpl_toolkits.mplot3d.art3d import Line3DCollection
+        coords = [p.coord for p in obj.points]
+        ax.add_collection3d(Line3DCollection([(coords[a], coords[b]) for a,b in obj.generateLines()], colors=color))
+    def drawScene(self, ax, scene):
+        # one scatter for all points, and one collection for all lines
+        from mpl_toolkits.mplot3d.art3d import Line3DCollection
+        vertices = scene.vertices()
+        styles = scene.styles()
+        ax.scatter(vertices[:,0], vertices[:,1], vertices[:,2], c='r', marker='o')
+        ax.add_collection3d(Line3DCollection(vertices[scene.lines()], colors=[styles[i] for i in scene.lineOwner()]))
+
+    def axesScreen(self, ax, pts):
+        """ map (N, 3) points to the pixel positions where the matplotlib axes draw them """
+        # the axes projection matrix maps data to projected 2-d data coordinates
+        h = np.column_stack([pts, np.ones(len(pts))]).dot(ax.get_proj().T)
+        return ax.transData.transform(h[:, :2]/h[:, 3:])
 
     def drawSphere(self, ax, s):
-        for phi in range(0,180,15):
-            lx, ly, lz = [], [], []
-            for rho in range(0,360,15):
-                # first inner loop var, then outer loop var: meridians are drawn
-                p = s.origin+Point.PointFromNSpherical(s.radius, rho*math.pi/180, phi*math.pi/180)
-                lx.append(p.x) ; ly.append(p.y) ; lz.append(p.z)
-
-            lx.append(lx[0]) ; ly.append(ly[0]) ; lz.append(lz[0])
-            ax.plot(lx, ly, lz)
-
-        for phi in range(0,180,15):
-            lx, ly, lz = [], [], []
-            for rho in range(0,360,15):
-                # first outer loop var, then inner loop var: parallels of sphere are drawn
-                p = s.origin+Point.PointFromNSpherical(s.radius, phi*math.pi/180, rho*math.pi/180)
-                lx.append(p.x) ; ly.append(p.y) ; lz.append(p.z)
-
-            lx.append(lx[0]) ; ly.append(ly[0]) ; lz.append(lz[0])
-            ax.plot(lx, ly, lz)
+        # meridians and parallels as one collection, finer when the sphere is larger on screen
+        from mpl_toolkits.mplot3d.art3d import Line3DCollection
+        points, lines = s.mesh(s.screenResolution(lambda pts: self.axesScreen(ax, pts)))
+        ax.add_collection3d(Line3DCollection(points[lines]))
 
 
     def pickevent(self, e):
@@ -465,13 +988,8 @@ class MatplotView:
         fig = plt.figure()
         ax = fig.add_subplot(111, projection='3d')
 
-        self.drawObject(ax, self.c)
-        self.drawObject(ax, self.v)
-        self.drawObject(ax, self.aa)
-        self.drawObject(ax, self.t)
-        self.drawObject(ax, self.o)
-        self.drawObject(ax, self.d)
-        self.drawObject(ax, self.i)
+        self.drawScene(ax, self.scene)
+        self.drawObject(ax, self.v, 'k')
 
         # draw lines from the viewport to two specific points
         # showing how the perspective and non-perspective views are constructed.
@@ -505,25 +1023,54 @@ def main():
     parser.add_argument('--test', action='store_true')
     parser.add_argument('--cube', action='store_true')
     parser.add_argument('--lines', action='store_true')
+    parser.add_argument('--hyper', action='store_true', help='rotate and project a 4-d shape using qt')
+    parser.add_argument('--shape', default='cell120', choices=sorted(HYPERSHAPES), help='shape for --hyper')
+    parser.add_argument('--planes', default='xw,yw,zw', help='rotation planes for --hyper')
     parser.add_argument('--matlib', action='store_true')
     parser.add_argument('--pygame', action='store_true')
+    parser.add_argument('--offscreen', metavar='FILE', help='render the --cube scene to a PPM image')
+    parser.add_argument('--hidden', action='store_true', help='remove hidden lines with --offscreen or --batch')
+    parser.add_argument('--batch', metavar='OUTPUT', help='render an animation of the --cube scene, to numbered PPM images when OUTPUT contains a %%d format, otherwise as a raw rgb stream, - for stdout')
+    parser.add_argument('--frames', type=int, default=72, help='number of frames in the orbit for --batch')
+    parser.add_argument('--path', metavar='FILE', help='camera path for --batch, one "distance latitude longitude portdistance" line per frame')
+    parser.add_argument('--jobs', '-j', type=int, help='number of processes for --batch, default: one per cpu')
+    parser.add_argument('--width', type=int, default=640, help='image width for --offscreen and --batch')
+    parser.add_argument('--height', type=int, default=480, help='image height for --offscreen and --batch')
+    parser.add_argument('--fps', type=int, default=60, help='frame rate limit while dragging, 0 for uncapped')
+    parser.add_argument('--stats', action='store_true', help='show timers and counters in the --cube and --pygame views')
+    parser.add_argument('--trace', metavar='FILE', help='save the timers, counters and a json trace when done')
     parser.add_argument('--verbose', '-v', action='count')
  
     args = parser.parse_args()
 
+    if args.stats or args.trace:
+        stats.enable(trace=bool(args.trace))
+
     if args.test:
         import sys
-        del sys.argv[1:]
         import unittest
-        unittest.main(verbosity=args.verbose)
+        import pkgutil
+        # run the tests of all geometry modules, and of the benchmark runner
+        names = ['geometry.'+name for _, name, _ in pkgutil.iter_modules(geometry.__path__)] + ['benchmark']
+        unittest.main(module=None, argv=sys.argv[:1]+names, verbosity=args.verbose or 1)
     elif args.matlib:
         MatplotView().display()
     elif args.pygame:
-        rungame()
+        rungame(args.fps)
+    elif args.offscreen:
+        renderOffscreen(args.offscreen, args.width, args.height, hidden=args.hidden)
+    elif args.batch:
+        path = loadCameraPath(args.path) if args.path else orbitPath(args.frames)
+        renderBatch(path, args.batch, args.width, args.height, args.hidden, args.jobs)
     elif args.cube:
         runqt3d()
     elif args.lines:
         runqt2d()
+    elif args.hyper:
+        runqt4d(args.shape, args.planes)
+
+    if args.trace:
+        stats.dumpTrace(args.trace)
 
 
 if __name__ == '__main__':
@@ -167,19 +167,24 @@ class noctagraph(graphbase):
         return mask==value==0 or (submask&mask == submask and value&submask == subvalue)
 
 
-parser = argparse.ArgumentParser(description='Draw shape dependency graphs: which face contains on which lines, etc.')
-parser.add_argument('--dim', type=int)
-parser.add_argument('--cube', action='store_true')
-parser.add_argument('--tetra', action='store_true')
-parser.add_argument('--octa', action='store_true')
-args = parser.parse_args()
-
-if args.dim is None:
-    args.dim = 3
-
-if args.cube:
-    ncubegraph(args.dim).writedot()
-elif args.tetra:
-    ntetragraph(args.dim).writedot()
-elif args.octa:
-    noctagraph(args.dim).writedot()
+def main():
+    parser = argparse.ArgumentParser(description='Draw shape dependency graphs: which face contains on which lines, etc.')
+    parser.add_argument('--dim', type=int)
+    parser.add_argument('--cube', action='store_true')
+    parser.add_argument('--tetra', action='store_true')
+    parser.add_argument('--octa', action='store_true')
+    args = parser.parse_args()
+
+    if args.dim is None:
+        args.dim = 3
+
+    if args.cube:
+        ncubegraph(args.dim).writedot()
+    elif args.tetra:
+        ntetragraph(args.dim).writedot()
+    elif args.octa:
+        noctagraph(args.dim).writedot()
+
+
+if __name__ == '__main__':
+    main()